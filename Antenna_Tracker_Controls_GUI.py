@@ -29,39 +29,32 @@ import serial.tools.list_ports
 from PySide2 import QtCore, QtGui, QtWidgets
 from PySide2.QtWidgets import *
 from PySide2.QtCore import Signal as pyqtSignal
-from PySide2.QtWebEngineWidgets import QWebEngineView as QWebView
 from PySide2.QtGui import QPixmap
 
 # Scientific libraries
 import math
-# database section, help from:
-# http://www.tutorialspoint.com/python/python_database_access.htm
-import MySQLdb
 import numpy as np
-import matplotlib
-import geomag
 import base64					   # = encodes an image in b64 Strings (and decodes)
 import hashlib					  # = generates hashes
 
 # Imports from files
 from ui_trackermain import Ui_MainWindow        # UI file import
 from ServoController import *			# Module for controlling Mini Maestro
+from ServoCalibration import *			# Angle to servo target calibration tables
 from StillImageSystem import *			# RFD based Still Image system
 from PointingMath import *			# Functions for calculating angles and distances
 from RfdControls import *			# RFD commands and listen
+from RfdLink import *				# Shared owner of the RFD serial port
+from SerialReader import *			# Serial devices and the background reader
+from TrackerEngine import *			# GUI-free tracking logic, shared with the daemon
 from BalloonUpdate import *			# Class to hold balloon info
 from GetData import *				# Module for tracking methods
 from Payloads import *				# Module for handling payloads
+from FlightTrack import *			# Columnar store for the flight history
 from MapHTML import *				# Module for generating Google Maps HTML and JavaScript
 from CommandEmailer import *        # Module for emailing Iridium commands
 from Interpolate import *           # Module for interpolating balloon pointing updates
-from UbiquitiSignalTracker import * # Module for adjusting the antenna based on signal strength
-from UbiquitiSignalScraper import * # Module for scraping the signal strength from the modem
-from VLCStreamer import *           # Module for streaming via VLC
-
-# Matplotlib setup
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
+from Subsystems import *            # Graphs, maps, Ubiquiti and video, imported when first enabled
 
 # https://developers.google.com/maps/documentation/javascript/get-api-key
 googleMapsApiKey = ''
@@ -71,39 +64,6 @@ class EventThread(QThread):
         self.exec_()
 
 
-class WebView(QWebView):
-    """ A class that allows messages from JavaScript being run in a QWebView to be printed """
-
-    def javaScriptConsoleMessage(self, message, line, source):
-        if source:
-            print('line(%s) source(%s): %s' % (line, source, message))
-        else:
-            print(message)
-
-
-class SerialDevice:
-    """ A class to manage serial devices """
-
-    def __init__(self, port, baud, timeout):
-        self.port = port
-        self.baud = baud
-        self.timeout = timeout
-        self.device = serial.Serial(
-            port=self.port, baudrate=self.baud, timeout=self.timeout)
-
-    def getPort(self):
-        return self.port
-
-    def getBaud(self):
-        return self.baud
-
-    def getTimeout(self):
-        return self.timeout
-
-    def getDevice(self):
-        return self.device
-
-
 class Unbuffered:
     """ A class to eliminate the serial buffer """
 
@@ -121,8 +81,37 @@ class Unbuffered:
         self.stream.close()
 
 
+def trackerSetting(name):
+    """ A MainWindow attribute that's kept on its TrackerEngine, so the two never disagree """
+
+    return property(lambda self: getattr(self.tracker, name),
+                    lambda self, value: setattr(self.tracker, name, value))
+
+
 class MainWindow(QMainWindow, Ui_MainWindow):
     """ The Main GUI Window """
+
+    # Tracking state lives on the engine; the GUI is one of its clients
+    useRFD = trackerSetting('useRFD')
+    useIridium = trackerSetting('useIridium')
+    useAPRS = trackerSetting('useAPRS')
+    groundLat = trackerSetting('groundLat')
+    groundLon = trackerSetting('groundLon')
+    groundAlt = trackerSetting('groundAlt')
+    antennaBear = trackerSetting('antennaBear')
+    antennaEle = trackerSetting('antennaEle')
+    centerBear = trackerSetting('centerBear')
+    panOffset = trackerSetting('panOffset')
+    tiltOffset = trackerSetting('tiltOffset')
+    servoCalibration = trackerSetting('servoCalibration')
+    servoScheduler = trackerSetting('servoScheduler')
+    servosAttached = trackerSetting('servosAttached')
+    saveData = trackerSetting('saveData')
+    currentBalloon = trackerSetting('currentBalloon')
+
+    # Still image transfer modes, in the order of the still image tab's transferModeBox
+    TRANSFER_MODES = ('stopAndWait', 'selectiveRepeat', 'adaptive')
+
     # Signals
     # RFD Command Signals
     commandFinished = pyqtSignal()
@@ -159,6 +148,9 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         # Uses the GUI built in QtCreator and interpreted using pyuic
         self.setupUi(self)
 
+        # Sources -> pointing -> servos, without any of the GUI
+        self.tracker = TrackerEngine()
+
         # Side Thread Setup
         # RFD Threads
         self.rfdListenThread = EventThread()
@@ -169,6 +161,8 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.rfdCommandThread.daemon = True
         self.stillImageThread = EventThread()
         self.stillImageThread.daemon = True
+        self.stillPreviewThread = EventThread()
+        self.stillPreviewThread.daemon = True
 
         # Data Threads
         self.iridiumThread = EventThread()
@@ -189,6 +183,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.rfdListenThread.start()
         self.rfdCommandThread.start()
         self.stillImageThread.start()
+        self.stillPreviewThread.start()
         self.iridiumThread.start()
         self.iridiumInterpolateThread.start()
         self.ubiquitiTrackerThread.start()
@@ -235,13 +230,10 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             self.getPiRuntimeDataButtonPress)
         self.requestStatusButton.clicked.connect(self.requestDeviceStatus)
 
-        # VLC Control Button Links
-        self.vlcStreamer = VLCStreamer() # Init the thread and object first
-        self.vlcStreamer.moveToThread(self.VLCStreamerThread)
-        self.vlcStreamer.start.connect(self.vlcStreamer.startVLCStream)
-        self.vlcStreamer.kill.connect(self.vlcStreamer.killVLCStream)
-        self.streamVLCButton.clicked.connect(self.vlcStreamer.start)
-        self.killVLCStreamButton.clicked.connect(self.vlcStreamer.kill)
+        # VLC Control Button Links (the streamer is made on the first press)
+        self.vlcStreamer = None
+        self.streamVLCButton.clicked.connect(self.streamVLC)
+        self.killVLCStreamButton.clicked.connect(self.killVLCStream)
 
         # Still Image Control Button Links
         self.mostRecentImageButton.clicked.connect(
@@ -257,6 +249,9 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             lambda: self.stillImageButtonPress('timeSync'))
         self.picHorizontalFlipButton.clicked.connect(
             lambda: self.stillImageButtonPress('HFlip'))
+        self.cancelImageButton.clicked.connect(self.cancelImageDownload)
+        self.transferModeBox.currentIndexChanged.connect(self.updateTransferSettings)
+        self.binaryTransferCheckbox.toggled.connect(self.updateTransferSettings)
         self.picVerticalFlipButton.clicked.connect(
             lambda: self.stillImageButtonPress('VFlip'))
 
@@ -273,9 +268,9 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
         # Initial Still Image System Picture Display Setup
         self.stillImageOnline = False
-        self.stillImageStall = False
         # The starting display photo is the logo of the MnSGC
         self.displayPhotoPath = "Images/MSGC.png"
+        self.picImage = None		# The picture on display, once one is received
         self.tabs.resizeEvent = self.resizePicture
         self.picLabel.setScaledContents(True)
         # Create a pixmap from the default image
@@ -285,6 +280,13 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.picLabel.setPixmap(scaledPm)		# Set the label to the map
         self.picLabel.show()		# Show the image
 
+        # Pictures are decoded off the GUI thread, including partial ones
+        # during a download
+        self.imagePreview = ImagePreview()
+        self.imagePreview.moveToThread(self.stillPreviewThread)
+        self.imagePreview.decodeStart.connect(self.imagePreview.decode)
+        self.imagePreview.newImage.connect(self.showPicture)
+
         # Picture Qualities
         self.picWidth = 650
         self.picHeight = 450
@@ -346,6 +348,9 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.centerBear = 0.00
         self.panOffset = 0.00
         self.tiltOffset = 0.00
+        # Angle to servo target calibration, by ground station (see mapCalc.py)
+        self.stationProfile = 'VLAD'
+        self.servoCalibration = StationCalibration.load('servoCalibration.json', self.stationProfile)
 
         # Save Data Boolean
         self.saveData = False
@@ -372,28 +377,12 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.currentBalloon = BalloonUpdate('', 0, 0, 0, 0, '', 0, 0, 0)
         self.tabs.setCurrentIndex(0)
 
-        # Graph Setup
-        self.figure = Figure()
-        self.canvas = FigureCanvas(self.figure)
-        layout = QVBoxLayout()
-        layout.addWidget(self.canvas)
-        self.graphWidget.setLayout(layout)
+        # The graphs are set up the first time graphing is enabled
+        self.graphsMade = False
 
         # Graphing Arrays
-        self.receivedTime = np.array([])
-        self.receivedLat = np.array([])
-        self.receivedLon = np.array([])
-        self.receivedAlt = np.array([])
-        self.losLog = np.array([])
-        self.elevationLog = np.array([])
-        self.bearingLog = np.array([])
+        self.flightTrack = FlightTrack()
 
-        # Ubiquiti Graph Setup
-        self.ubiFigure = Figure()
-        self.ubiCanvas = FigureCanvas(self.ubiFigure)
-        layout = QVBoxLayout()
-        layout.addWidget(self.ubiCanvas)
-        self.ubiquitiSignalStrengthGraph.setLayout(layout)
         # Ubiquiti Graphing Arrays
         self.signalStrengthTime = np.array([])
         self.signalStrength = np.array([])
@@ -426,6 +415,12 @@ class MainWindow(QMainWindow, Ui_MainWindow):
                         ',' + str(one.getMessage()) + '\n')
             f.close()
 
+        if self.servosStarted:
+            sent, suppressed, coalesced = self.servoScheduler.getStats()
+            print("Servo commands sent: " + str(sent) + ", repeats dropped: " + str(suppressed) +
+                  ", replaced by newer targets: " + str(coalesced))
+            self.servoScheduler.stop()
+
         event.accept()
 
     def setAutotrack(self):
@@ -446,42 +441,11 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             if not self.servosAttached:
                 self.createWarning('No servos attached')
 
-    def updateBalloonLocation(self, update):        
+    def updateBalloonLocation(self, update):
         """ Updates the tracker with the latest balloon location """
-        # Log the balloon location no matter what
-        self.logData("balloonLocation", update.getTrackingMethod() + ',' + str(update.getTime()) + ',' + str(update.getLat()) + ',' + str(
-            update.getLon()) + ',' + str(update.getAlt()) + ',' + str(update.getBear()) + ',' + str(update.getEle()) + ',' + str(update.getLOS()))
-
-        if update.getTrackingMethod() == 'RFD':
-            if not self.useRFD:
-                return
-        if update.getTrackingMethod() == 'Iridium':
-            if not self.useIridium:
-                return
-        if update.getTrackingMethod() == 'APRS':
-            if not self.useAPRS:
-                return
-
-        # Make sure it's a good location
-        # Don't consider updates with bad info to be new updates
-        if ((update.getLat() == 0.0) or (update.getLon() == 0.0) or (update.getAlt() == 0.0)):
-            return
-
-        # Makes sure it's the newest location
-        if update.getSeconds() <= self.currentBalloon.getSeconds():
+        # The engine logs the update and decides if it's the new location
+        if not self.tracker.accept(update):
             return
-            # Confirm that update matches a selected tracking method
-            # if self.currentBalloon.getTrackingMethod() == 'RFD':
-            # if (not self.useIridium or not self.useAPRS) and self.useRFD:
-            # return
-
-            # if self.currentBalloon.getTrackingMethod() == 'Iridium':
-            # if (not self.useRFD or not self.useAPRS) and self.useIridium:
-            # return
-
-            # if self.currentBalloon.getTrackingMethod() == 'APRS':
-            # if (not self.useIridium or not self.useRFD) and self.useAPRS:
-            # return
 
         # If you haven't returned by now, update the graphing arrays
         try:
@@ -492,32 +456,14 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
         self.antennaOnline(update)		# Move the tracker if tracking
         self.refresh(update)			# Update the tables
-        self.currentBalloon = update
         if self.internetAccess and self.mapMade:		# Update the map
             self.mapView.setHtml(getMapHtml(
                 update.getLat(), update.getLon(), googleMapsApiKey))
-            
-    def updateBalloonInterpolation(self, update):
-        # Make sure it's a good location
-        # Don't consider updates with bad info to be new updates
-        if ((update.getLat() == 0.0) or (update.getLon() == 0.0) or (update.getAlt() == 0.0)):
-            return
 
-        # Makes sure it's the newest location
-        if update.getSeconds() < self.currentBalloon.getSeconds():
+    def updateBalloonInterpolation(self, update):
+        # Bad or old predictions are dropped by the engine
+        if not self.tracker.acceptInterpolation(update):
             return
-            # Confirm that update matches a selected tracking method
-            # if self.currentBalloon.getTrackingMethod() == 'RFD':
-            # if (not self.useIridium or not self.useAPRS) and self.useRFD:
-            # return
-
-            # if self.currentBalloon.getTrackingMethod() == 'Iridium':
-            # if (not self.useRFD or not self.useAPRS) and self.useIridium:
-            # return
-
-            # if self.currentBalloon.getTrackingMethod() == 'APRS':
-            # if (not self.useIridium or not self.useRFD) and self.useAPRS:
-            # return
         self.antennaOnline(update)		# Move the tracker if tracking
         self.refresh(update)			# Update the tables
 
@@ -533,6 +479,30 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             #column, row, QtGui.QTableWidgetItem(str(value)))
             column, row, QtWidgets.QTableWidgetItem(str(value)))
 
+    def makeGraphs(self):
+        """ Sets up the tracking and Ubiquiti graphs, if matplotlib is available """
+
+        graphs = loadSubsystem('graphs')
+        if graphs is None:
+            self.createWarning('Graphing needs matplotlib, which is not installed')
+            self.graphReal.setChecked(False)
+            return
+
+        # Graph Setup
+        self.figure = graphs.Figure()
+        self.canvas = graphs.FigureCanvas(self.figure)
+        layout = QVBoxLayout()
+        layout.addWidget(self.canvas)
+        self.graphWidget.setLayout(layout)
+
+        # Ubiquiti Graph Setup
+        self.ubiFigure = graphs.Figure()
+        self.ubiCanvas = graphs.FigureCanvas(self.ubiFigure)
+        layout = QVBoxLayout()
+        layout.addWidget(self.ubiCanvas)
+        self.ubiquitiSignalStrengthGraph.setLayout(layout)
+        self.graphsMade = True
+
     def refresh(self, update):
         """ Refreshs the info grids and plots with the newest values """
         # Update the info grid with the newest balloon information
@@ -560,8 +530,10 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.updateGround(0, 7, self.antennaEle)
 
         # Update the Graphs in the Tracker Tab
-        if self.graphReal.isChecked():						# Check to see if you have the graph checkbox selected
-            if len(self.receivedAlt) > 0:
+        if self.graphReal.isChecked() and self.graphsMade:		# Check to see if you have the graph checkbox selected
+            if len(self.flightTrack) > 0:
+                track = self.flightTrack
+                elapsed = track.time - track.time[0]
 
                 # creates the 4 subplots
                 altPlot = self.figure.add_subplot(221)
@@ -577,17 +549,13 @@ class MainWindow(QMainWindow, Ui_MainWindow):
                 #bearPlot.hold(False)
 
                 # plot data
-                altPlot.plot(self.receivedTime -
-                             self.receivedTime[0], self.receivedAlt, 'r-')
+                altPlot.plot(elapsed, track.alt, 'r-')
                 altPlot.set_ylabel('Altitude (ft)')
-                losPlot.plot(self.receivedTime -
-                             self.receivedTime[0], self.losLog, 'g-')
+                losPlot.plot(elapsed, track.los, 'g-')
                 losPlot.set_ylabel('Line-of-Sight (km)')
-                elePlot.plot(self.receivedTime -
-                             self.receivedTime[0], self.elevationLog, 'b-')
+                elePlot.plot(elapsed, track.ele, 'b-')
                 elePlot.set_ylabel('Elevation Angle')
-                bearPlot.plot(self.receivedTime -
-                              self.receivedTime[0], self.bearingLog, 'y-')
+                bearPlot.plot(elapsed, track.bear, 'y-')
                 bearPlot.set_ylabel('Bearing Angle')
 
                 # refresh canvas
@@ -616,24 +584,8 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         # Determine whether or not to save the Data for this flight
         if self.saveDataCheckbox.isChecked():
             if not self.saveData:
-                self.saveData = True
-                timestamp = str(datetime.datetime.today().strftime("%m-%d-%Y %H-%M-%S"))
-
                 # Create the log files
-                if not os.path.exists("Logs/"):
-                    os.mkdir("Logs/")
-                self.rfdLog = "Logs/" + timestamp + ' ' + "RFDLOG.txt"
-                f = open(self.rfdLog, 'w+')
-                f.close()
-                self.stillImageLog = "Logs/" + timestamp + ' ' + "STILLIMAGELOG.txt"
-                f = open(self.stillImageLog, 'w+')
-                f.close()
-                self.balloonLocationLog = "Logs/" + timestamp + ' ' + "BALLOONLOCATIONLOG.txt"
-                f = open(self.balloonLocationLog, 'w+')
-                f.close()
-                self.pointingLog = "Logs/" + timestamp + ' ' + "POINTINGLOG.txt"
-                f = open(self.pointingLog, 'w+')
-                f.close()
+                self.tracker.startLogs("Logs/")
         elif not self.saveDataCheckbox.isChecked():
             self.saveData = False
 
@@ -641,15 +593,18 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         if self.internetCheckBox.isChecked():
             self.internetAccess = True
 
-            # Set up the Map View
-            if not self.mapMade:
-                self.mapView = QWebView();
+            # Set up the Map View, the first time maps are available
+            maps = loadSubsystem('maps')
+            if maps is None:
+                self.createWarning('Maps need PySide2 QtWebEngine, which is not installed')
+            elif not self.mapMade:
+                self.mapView = maps.QWebView();
                 self.mapView.setHtml(getMapHtml(45, -93, googleMapsApiKey))
                 self.mapViewGridLayout.addWidget(self.mapView)
-            self.mapMade = True
+                self.mapMade = True
             # Set up the Map View
-            if not self.suntableMade:
-                self.suntableView = QWebView();
+            if maps is not None and not self.suntableMade:
+                self.suntableView = maps.QWebView();
                 stUrl = QUrl("https://aa.usno.navy.mil/data/docs/AltAz.php")
                 self.suntableView.load(stUrl)
                 self.suntableViewGridLayout.addWidget(self.suntableView)
@@ -657,6 +612,10 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         else:
             self.internetAccess = False
 
+        # Set up the graphs the first time graphing is enabled
+        if self.graphReal.isChecked() and not self.graphsMade:
+            self.makeGraphs()
+
         # Check to see what COM ports are in use, and assign them their values
         # from the entry boxes
         self.servosAttached = self.servoAttached.isChecked()
@@ -674,6 +633,9 @@ class MainWindow(QMainWindow, Ui_MainWindow):
                         self.servos.getDevice())
                     self.servoController.setServoAccel(1, 1)
                     self.servoController.setServoSpeed(1, 1)
+                    # Every move goes through the scheduler, which drops
+                    # repeats and limits the command rate
+                    self.servoScheduler = ServoScheduler(self.servoController)
                     self.servosStarted = True
 
         if self.rfdAttached.isChecked():
@@ -682,11 +644,18 @@ class MainWindow(QMainWindow, Ui_MainWindow):
                     rfdCOM = str(self.rfdCOM.text())
                     self.RFD = SerialDevice(rfdCOM, 38400, 2)
 
+                    # One link owns the port, and each user gets its own channel
+                    # on it, so telemetry keeps flowing during image transfers
+                    self.rfdLink = RfdLink(self.RFD.getDevice(), self.RFD.getTimeout())
+                    self.rfdCommandChannel = self.rfdLink.channel('command', RfdLink.COMMAND)
+                    self.rfdImageChannel = self.rfdLink.channel('image', RfdLink.IMAGE)
+                    self.rfdLink.start()
+
                     # Prepare the RFD Controls and the Still Image System
-                    self.rfdListen = RfdListen(self, self.RFD.getDevice())
-                    self.rfdCommand = RfdCommand(self, self.RFD.getDevice())
+                    self.rfdListen = RfdListen(self, self.rfdLink)
+                    self.rfdCommand = RfdCommand(self, self.rfdCommandChannel)
                     self.stillImageSystem = StillImageSystem(
-                        self, self.RFD.getDevice())
+                        self, self.rfdImageChannel)
 
                     # Move them to the side threads
                     self.rfdListen.moveToThread(self.rfdListenThread)
@@ -732,6 +701,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
                         self.stillImageSystem.time_sync)
                     self.stillImageSystem.stillInterrupt.connect(
                         lambda: self.stillImageSystem.setInterrupt(True))
+                    self.updateTransferSettings()
 
                     self.rfdStarted = True
 
@@ -867,8 +837,10 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
         if self.useIridium and not self.iridiumStarted:					# Don't start it up again if it's already going
             if self.internetAccess:
+                # Optionally bring in the track so far from the database first
                 self.getIridium = GetIridium(
-                    self, self.dbHost, self.dbUser, self.dbPass, self.dbName, self.IMEI)
+                    self, self.dbHost, self.dbUser, self.dbPass, self.dbName, self.IMEI,
+                    backfill=self.iridiumBackfill.isChecked())
                 self.getIridium.moveToThread(self.iridiumThread)
                 self.getIridium.start.connect(self.getIridium.run)
                 self.getIridium.setInterrupt.connect(self.getIridium.interrupt)
@@ -893,8 +865,17 @@ class MainWindow(QMainWindow, Ui_MainWindow):
                 self.interpolateIridium.moveToThread(self.iridiumInterpolateThread)
                 self.interpolateIridium.start.connect(self.interpolateIridium.run)
                 self.interpolateIridium.setInterrupt.connect(self.interpolateIridium.interrupt)                
+                # Every source in use feeds the trajectory estimator. The
+                # flags are checked again for each fix, in case one is turned
+                # off while interpolating
                 self.iridiumNewLocation.connect(
                     self.interpolateIridium.addPosition)
+                if self.useRFD:
+                    self.rfdNewLocation.connect(
+                        self.interpolateIridium.addPosition)
+                if self.useAPRS:
+                    self.aprsNewLocation.connect(
+                        self.interpolateIridium.addPosition)
                 self.interpolateIridium.setPredictionUpdateSpeed.connect(
                     self.interpolateIridium.setUpdateSpeed)
                 self.interpolateIridium.start.emit()
@@ -922,15 +903,23 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
 ##SIGNAL SCRAPER TRACKING---------------------------------------------------------------------------------------------
         if self.useUbiquitiSignalTrack and not self.ubiquitiSignalTrackStarted:  # Don't start it up again if it's already going
-            if self.ubiAttached:
+            ubiquiti = loadSubsystem('ubiquiti')
+            if self.ubiAttached and ubiquiti is not None:
                 print("Starting Ubiquiti Signal Tracking")
-                self.ubiquitiSignalTracker = UbiquitiSignalTracker(self, self.ubiquitiIP, self.ubiquitiUser, self.ubiquitiPass)
+                self.ubiquitiSignalTracker = ubiquiti.UbiquitiSignalTracker(self, self.ubiquitiIP, self.ubiquitiUser, self.ubiquitiPass)
                 self.ubiquitiSignalTracker.moveToThread(self.ubiquitiTrackerThread)
                 self.ubiquitiSignalTracker.start.connect(self.ubiquitiSignalTracker.run)
                 self.ubiquitiSignalTracker.setInterrupt.connect(self.ubiquitiSignalTracker.interrupt)
                 self.ubiquitiSignalTracker.start.emit()
                 self.ubiquitiSignalTrackStarted = True
 
+            elif ubiquiti is None:
+                self.createWarning(
+                    'Ubiquiti Signal Tracking needs selenium, which is not installed')
+                self.autoUbiquitiSignalTrack.setChecked(False)
+                self.useUbiquitiSignalTrack = False
+                self.ubiquitiSignalTrackStarted = False
+
             else:
                 self.createWarning(
                     'Ubiquiti Signal Tracking will not work when the Ubiquiti Modem is not connected')
@@ -991,13 +980,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
         else:
             # Graphing Arrays - wipe them
-            self.receivedTime = []
-            self.receivedLat = []
-            self.receivedLon = []
-            self.receivedAlt = []
-            self.losLog = []
-            self.elevationLog = []
-            self.bearingLog = []
+            self.flightTrack.clear()
             # Update a nice and pretty status indicator in red
             self.status.setText("Offline")
             self.changeTextColor(self.status, "red")
@@ -1010,9 +993,8 @@ class MainWindow(QMainWindow, Ui_MainWindow):
                 lat = float(self.ManualEntryLatitude.text())
                 lon = float(self.ManualEntryLongitude.text())
                 alt = float(self.ManualEntryAltitude.text())
-                distance = haversine(self.groundLat, self.groundLon, lat, lon)
-                bear = bearing(self.groundLat, self.groundLon, lat, lon)
-                ele = elevationAngle(alt, self.groundAlt, distance)
+                bear, ele, los = getSolver(
+                    self.groundLat, self.groundLon, self.groundAlt).solve(lat, lon, alt)
 
                 self.moveToTarget(bear, ele)		# Move the tracker
                 self.manualRefresh()		# Update the ground station table
@@ -1135,13 +1117,10 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.picCurrentISOValue.setText(str(self.picISOSlider.value()))
 
     def stillImageSystemFinished(self):
-        """ Resume the RFD listen if you were doing it before """
+        """ Give the RFD link back to the listen """
 
         self.stillImageStop()
-        if self.stillImageStall:
-            self.stillImageStall = False
-            print('start')
-            self.rfdListenStart()
+        self.rfdLink.release(self.rfdImageChannel)
 
     def stillImageStart(self):
         self.stillImageOnline = True
@@ -1162,9 +1141,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
         if arg == 'mostRecent':
             self.stillImageStart()
-            if self.rfdListenOnline:
-                self.stillImageStall = True
-                self.rfdListenStop()
+            self.rfdLink.claim(self.rfdImageChannel)
             self.stillImageSystem.mostRecentImageStart.emit(
                 self.requestedImageName.text())
 
@@ -1190,17 +1167,13 @@ class MainWindow(QMainWindow, Ui_MainWindow):
                 self.picSelectionButton.clicked.connect(
                     lambda: self.checkRequestedImage(self.listbox.currentItem()))
 
-            if self.rfdListenOnline:
-                self.stillImageStall = True
-                self.rfdListenStop()
+            self.rfdLink.claim(self.rfdImageChannel)
 
             self.stillImageSystem.imageDataStart.emit()
 
         if arg == 'getPicSettings':
             self.stillImageStart()
-            if self.rfdListenOnline:
-                self.stillImageStall = True
-                self.rfdListenStop()
+            self.rfdLink.claim(self.rfdImageChannel)
             self.stillImageSystem.getSettingsStart.emit()
 
         if arg == 'sendNewSettings':
@@ -1216,30 +1189,22 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             picSettings = [self.picWidth, self.picHeight, self.picSharpness,
                            self.picBrightness, self.picContrast, self.picSaturation, self.picISO]
 
-            if self.rfdListenOnline:
-                self.stillImageStall = True
-                self.rfdListenStop()
+            self.rfdLink.claim(self.rfdImageChannel)
             self.stillImageSystem.sendSettingsStart.emit(picSettings)
 
         if arg == 'HFlip':
             self.stillImageStart()
-            if self.rfdListenOnline:
-                self.stillImageStall = True
-                self.rfdListenStop()
+            self.rfdLink.claim(self.rfdImageChannel)
             self.stillImageSystem.hFlipStart.emit()
 
         if arg == 'VFlip':
             self.stillImageStart()
-            if self.rfdListenOnline:
-                self.stillImageStall = True
-                self.rfdListenStop()
+            self.rfdLink.claim(self.rfdImageChannel)
             self.stillImageSystem.vFlipStart.emit()
 
         if arg == 'timeSync':
             self.stillImageStart()
-            if self.rfdListenOnline:
-                self.stillImageStall = True
-                self.rfdListenStop()
+            self.rfdLink.claim(self.rfdImageChannel)
             self.stillImageSystem.timeSyncStart.emit()
 
     def updateListbox(self, line):
@@ -1249,14 +1214,38 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         """ Updates the still image system picture display to the picture associated with the path """
 
         print("Updating Picture")
-        # Create a pixmap from the default image
-        pm = QPixmap(str(displayPath))
-        scaledPm = pm.scaled(self.picLabel.size(
-        ), QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation)
+        self.displayPhotoPath = str(displayPath)
+        # Decoded on the preview thread, after any partial pictures still
+        # waiting there
+        self.imagePreview.decodeStart.emit(self.displayPhotoPath, 0)
+
+        self.logData('stillImage', 'newPic' + ',' + displayPath)
+
+    def showPicture(self, path, image, final):
+        """ Displays a picture decoded by the preview thread, final or partial """
+
+        self.picImage = image
+        pm = QPixmap.fromImage(image)
+        scaledPm = pm.scaled(self.picLabel.size(), QtCore.Qt.KeepAspectRatio,
+                             QtCore.Qt.SmoothTransformation if final else QtCore.Qt.FastTransformation)
         self.picLabel.setPixmap(scaledPm)			# Set the label to the map
         self.picLabel.show()				# Show the image
 
-        self.logData('stillImage', 'newPic' + ',' + displayPath)
+    def cancelImageDownload(self):
+        """ Stops the picture download in progress, keeping what has arrived """
+
+        if self.rfdStarted:
+            self.stillImageSystem.stillInterrupt.emit()
+
+    def updateTransferSettings(self):
+        """ Gives the still image system the transfer mode chosen in the still image tab, used from the next download on """
+
+        mode = self.TRANSFER_MODES[self.transferModeBox.currentIndex()]
+        # Only the selective repeat payloads can send binary frames
+        self.binaryTransferCheckbox.setEnabled(mode != 'stopAndWait')
+        if self.rfdStarted:
+            self.stillImageSystem.setTransferMode(mode)
+            self.stillImageSystem.setBinaryTransfers(self.binaryTransferCheckbox.isChecked())
 
     def updatePictureProgress(self, progress, maxProgress):
         """ Updates the still image system photo progress bar based on the value and max value passed in as arguments """
@@ -1309,6 +1298,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         except(Exception, e):
             print(str(e))
 
+        self.rfdLink.claim(self.rfdImageChannel)
         self.stillImageSystem.requestedImageStart.emit(data)
 
     def picDefaultSettings(self):
@@ -1361,8 +1351,11 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         return
 
     def resizePicture(self, event):
-        # Create a pixmap from the default image
-        pm = QPixmap(self.displayPhotoPath)
+        # Create a pixmap from the picture on display
+        if self.picImage is not None:
+            pm = QPixmap.fromImage(self.picImage)
+        else:
+            pm = QPixmap(self.displayPhotoPath)
         scaledPm = pm.scaled(self.picLabel.size(
         ), QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation)
         self.picLabel.setPixmap(scaledPm)			# Set the label to the map
@@ -1379,12 +1372,6 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
     def rfdListenStart(self):
         """ Start the RFD Listen """
-        if self.stillImageOnline:
-            print("Still Image System cannot be Online")
-            self.updateRFDBrowser("Still Image System cannot be Online")
-            self.rfdListenOnline = False
-            return
-
         if self.RFDAttached:		# Only try to do things if the RFD is attached
             self.rfdListenOnline = True
             # Update the button text and label color
@@ -1489,11 +1476,11 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             self.updateRFDBrowser("No RFD Attached")
             return
 
-        self.rfdListenStop()
+        self.rfdLink.claim(self.rfdCommandChannel)
         self.rfdCommand.piruntimeStart.emit()
 
     def piruntimeDone(self):
-        self.rfdListenStart()
+        self.rfdLink.release(self.rfdCommandChannel)
 
     def requestDeviceStatus(self):
         """ Check to see if the system is in a state where it can receive the command relay device status """
@@ -1562,7 +1549,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.ubiquitiSignalStrengthLabel_graph.setText(str(strength) + " dB")
 
         # Update the Graphs in the Ubiquiti Tab
-        if self.graphReal.isChecked():  # Check to see if you have the graph checkbox selected
+        if self.graphReal.isChecked() and self.graphsMade:  # Check to see if you have the graph checkbox selected
             if (len(self.signalStrengthTime) >= 200):  # Restrict graph to most recent X number of points (to avoid lag)
                 self.signalStrengthTime = np.delete(self.signalStrengthTime, 0)
                 self.signalStrength = np.delete(self.signalStrength, 0)
@@ -1663,11 +1650,11 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.newGrid.addWidget(self.newPayloadGPSLabel, 0, 1, 1, 1)
         self.newGrid.addWidget(self.newPayloadMessagesBrowser, 1, 0, 1, 1)
 
-        if self.internetAccess:		# Only make the map if you have internet access
+        if self.internetAccess and self.mapMade:		# Only make the map if you have internet access
             # Make the QWebView
             newPayloadWebViewName = 'payloadWebView' + \
                 str(len(self.payloadList) + 1)
-            self.newPayloadWebView = WebView()
+            self.newPayloadWebView = loadSubsystem('maps').WebView()
             self.newPayloadWebView.setObjectName(newPayloadWebViewName)
             self.newPayloadWebView.setSizePolicy(
                 QtGui.QSizePolicy.Ignored, QtGui.QSizePolicy.Expanding)
@@ -1689,7 +1676,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
         newPayload = Payload(name, self.newPayloadMessagesBrowser,
                              self.newPayloadGPSBrowser)		# Create the new payload
-        if self.internetAccess:		# If there's internet, add the webview
+        if self.internetAccess and self.mapMade:		# If there's internet, add the webview
             newPayload.addWebview(self.newPayloadWebView)
 
         newPayload.addMessage(msg)
@@ -1781,7 +1768,10 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             self.ubiquitiCOM.setText(self.ubiquitiIP)
 
             # The ubiquiti modem has been found, now start scraping
-            if not self.ubiquitiSignalScraperStarted:  # Don't start it up again if it's already going
+            ubiquiti = loadSubsystem('ubiquiti')
+            if ubiquiti is None:
+                print("- - - Ubiquiti signal scraping needs selenium - - -")
+            elif not self.ubiquitiSignalScraperStarted:  # Don't start it up again if it's already going
                 # Get the Username and Password for the ubiquiti modem, default to placeholder
                 if self.ubiUsername.text() == "":
                     self.ubiquitiUser = self.ubiUsername.placeholderText()
@@ -1792,7 +1782,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
                 else:
                     self.ubiquitiPass = self.ubiPassword.text()
                 print("Starting Ubiquiti Signal Scraping")
-                self.ubiquitiSignalScraper = UbiquitiSignalScraper(self, self.ubiquitiIP, self.ubiquitiUser,
+                self.ubiquitiSignalScraper = ubiquiti.UbiquitiSignalScraper(self, self.ubiquitiIP, self.ubiquitiUser,
                                                                        self.ubiquitiPass)
                 self.ubiquitiSignalScraper.moveToThread(self.ubiquitiScraperThread)
                 self.ubiquitiSignalScraper.start.connect(self.ubiquitiSignalScraper.run)
@@ -1830,6 +1820,28 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             self.ubiquitiSignalStrengthLabel.setText("Current Strength: n/a")
             self.ubiquitiSignalStrengthLabel_graph.setText("n/a")
 
+    def makeVLCStreamer(self):
+        """ Makes the VLC streamer on its side thread the first time it's used. Returns False if it isn't available """
+
+        if self.vlcStreamer is None:
+            video = loadSubsystem('video')
+            if video is None:
+                self.createWarning('VLC streaming needs paramiko, which is not installed')
+                return False
+            self.vlcStreamer = video.VLCStreamer()
+            self.vlcStreamer.moveToThread(self.VLCStreamerThread)
+            self.vlcStreamer.start.connect(self.vlcStreamer.startVLCStream)
+            self.vlcStreamer.kill.connect(self.vlcStreamer.killVLCStream)
+        return True
+
+    def streamVLC(self):
+        if self.makeVLCStreamer():
+            self.vlcStreamer.start.emit()
+
+    def killVLCStream(self):
+        if self.vlcStreamer is not None:
+            self.vlcStreamer.kill.emit()
+
     # def startVLCStream(self):
     #     """ Executes the streaming command on the pi and then begins stream """
     #     print("Connecting to streaming pi")
@@ -1981,8 +1993,13 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         # Get the altitude to the floor(foot)
         self.groundAlt = int(tempAlt[0])
         self.centerBear = float(tempoffsetDegrees)
-        declination = float(geomag.declination(
-            dlat=self.groundLat, dlon=self.groundLon, h=self.groundAlt))
+        declination = 0
+        geomag = loadSubsystem('declination')
+        if geomag is not None:
+            declination = float(geomag.declination(
+                dlat=self.groundLat, dlon=self.groundLon, h=self.groundAlt))
+        else:
+            print("Center bearing is magnetic, without the declination model")
         self.centerBear = (self.centerBear + declination)
         if self.centerBear > 360:
             self.centerBear -= 360
@@ -2038,45 +2055,13 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.manualRefresh()
 
     def updateGraphingArrays(self, location):
-        if len(self.receivedTime) == 0:
-            self.receivedTime = np.append(
-                self.receivedTime, location.getSeconds())
-            self.receivedLon = np.append(self.receivedLon, location.getLon())
-            self.receivedLat = np.append(self.receivedLat, location.getLat())
-            self.receivedAlt = np.append(self.receivedAlt, location.getAlt())
-            self.bearingLog = np.append(self.bearingLog, location.getBear())
-            self.elevationLog = np.append(self.elevationLog, location.getEle())
-            self.losLog = np.append(self.losLog, location.getLOS())
-        elif self.receivedTime[len(self.receivedTime) - 1] < location.getSeconds():
-            self.receivedTime = np.append(
-                self.receivedTime, location.getSeconds())
-            self.receivedLon = np.append(self.receivedLon, location.getLon())
-            self.receivedLat = np.append(self.receivedLat, location.getLat())
-            self.receivedAlt = np.append(self.receivedAlt, location.getAlt())
-            self.bearingLog = np.append(self.bearingLog, location.getBear())
-            self.elevationLog = np.append(self.elevationLog, location.getEle())
-            self.losLog = np.append(self.losLog, location.getLOS())
+        """ Adds the location to the flight track if it's newer than the last one """
+        if len(self.flightTrack) == 0 or self.flightTrack.lastTime() < location.getSeconds():
+            self.flightTrack.append(location)
 
     def logData(self, type, msg):
         """ Logs the message in the correct file designated in the type argument """
-        if self.saveData:
-            try:
-                if type == "RFD":
-                    f = open(self.rfdLog, 'a')
-                elif type == "stillImage":
-                    f = open(self.stillImageLog, 'a')
-                elif type == "balloonLocation":
-                    f = open(self.balloonLocationLog, 'a')
-                elif type == "pointing":
-                    f = open(self.pointingLog, 'a')
-                f.write(str(datetime.datetime.today().strftime(
-                    "%m/%d/%Y %H:%M:%S")) + ',' + msg + '\n')
-                f.close()
-            except:
-                print("Error logging data: " + type + ',' + msg)
-
-        else:
-            return
+        self.tracker.logData(type, msg)
 
     def pointToMostRecentBalloon(self):
         """ Aims the tracker at the balloon, even if the antenna tracker is offline """
@@ -2095,8 +2080,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             try:
                 #self.servoController.moveTiltServo(5970)
                 #self.servoController.movePanServo(6000)
-                self.servoController.moveTiltServo(6024)
-                self.servoController.movePanServo(6000)
+                self.servoScheduler.submit(6000, 6024)
             except:
                 print("Error moving servos to center position")
 
@@ -2113,94 +2097,9 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
     def moveToTarget(self, bearing, elevation):
         """ Moves servos based on a bearing and elevation angle """
-        # Account for manual offset
-        AdBearing = bearing + self.panOffset
-
-        temp = 0
-        # Uses the center bearing, and makes sure you don't do unnecessary
-        # spinning when you're close to 0/360
-        if (AdBearing > 180) and (self.centerBear == 0):
-            self.centerBear = 360
-        elif ((self.centerBear - AdBearing) > 180) and (self.centerBear >= 270):
-            bearing += 360
-        elif ((self.centerBear - AdBearing) > 180) and (self.centerBear <= 180):
-            temp = self.centerBear
-            self.centerBear = 360 + temp
-
-        print ("\tBearing: %.0f" % (AdBearing))
-        print ("\tElevation Angle: %.0f" % (elevation))
-
-        # Pan Mapping
-        # Mapping is designed for 45 degree increments
-        # If
-        panTo = (AdBearing - self.centerBear)
-        print ("**************************")
-        # print "PanTo Value\n"
-        # print panTo
-
-        if panTo > -1:
-            print("S1")
-            panTo = 180 - panTo
-            if panTo < 0:
-                panTo = panTo + 360
-            #panTo = int((panTo * 2.778 + 1000) * 4) # CHAD STATION NUMBERS
-            panTo = int((panTo * 3.244 + 916) * 4) # VLAD STATION NUMBERS
-
-        elif panTo < 0:
-            print("S2")
-            panTo = 180 - panTo
-            if panTo < 0:
-                panTo = panTo + 360
-            #panTo = int((panTo * 2.8 + 996) * 4) # CHAD STATION NUMBERS
-            panTo = int((panTo * 3.256 + 914) * 4) # VLAD STATION NUMBERS
-
-        else:
-            panTo = 180 - panTo
-            if panTo < 0:
-                panTo = panTo + 360
-            print("Default Mapping")
-            #panTo = int((panTo * 2.789 + 1000) * 4) # CHAD STATION NUMBERS
-            panTo = int((panTo * 3.244 + 916) * 4) # VLAD STATION NUMBERS
-
-        if panTo > 7900:
-            panTo = 7900
-        if panTo < 3800:
-            panTo = 3800
-        # print panTo
-        print("\tServo Degrees:")
-        if self.servosAttached:
-            self.servoController.movePanServo(panTo)
-
-        # Tilt Mapping
-        tiltTo = elevation + self.tiltOffset # keep track of manual offset inputs
-        tiltTo = 180 - tiltTo
-        if tiltTo < 0:
-            tiltTo = tiltTo + 360
-
-        # Update the tilt mapping values here#
-        #tiltTo = int((tiltTo * 4.656 + 668) * 4) # CHAD STATION NUMBERS
-        tiltTo = int((tiltTo * 4.856 + 626) * 4) # VLAD STATION NUMBERS
-
-        if tiltTo > 6300:
-            tiltTo = 6300		# Don't go over the max
-        if tiltTo < 4348:
-            tiltTo = 4348			# Don't go under the min
-        # print tiltTo
-        if self.servosAttached:		# Move the servos to the new locations if they're attached
-            self.servoController.moveTiltServo(tiltTo)
-        if temp != 0:
-            self.centerBear = temp
-
-##TESTING PRINTOUT
-##        print()
-##        print("moveToTarget: (panTo: " + str(panTo) + ") (tiltTo: " + str(tiltTo) + ")")
-##        print()
-        # Write the new pointing location to the log file
-        self.logData("pointing", str(bearing) + ',' + str(elevation))
-
-        # Update pointing values
-        self.antennaBear = bearing
-        self.antennaEle = elevation
+        # The engine maps the angles to servo targets with the station's
+        # calibration tables and submits them to the servo scheduler
+        self.tracker.moveToTarget(bearing, elevation)
         self.manualRefresh()
 
     def sendCutdownCommand(self):
@@ -2276,6 +2175,8 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
 
 if __name__ == "__main__":
+    # Lets QtWebEngine be imported after the QApplication exists, when maps are first enabled
+    QtCore.QCoreApplication.setAttribute(QtCore.Qt.AA_ShareOpenGLContexts)
     #app = QtGui.QApplication.instance()		# checks if QApplication already exists
     app = QtWidgets.QApplication.instance()		# checks if QApplication already exists
     if not app:								# create QApplication if it doesnt exist
@@ -1,12 +1,18 @@
 from PointingMath import *
-import geomag
+from DeclinationCache import *
 
 
 class BalloonUpdate(object):
     """
-    A class to hold all of the information in a new balloon position and pointing update
+    A class to hold all of the information in a new balloon position and pointing update.
+    The pointing values and declination are computed the first time they are asked
+    for, so updates that get rejected never pay for the math.
     """
 
+    # Slotted, since a long flight creates a lot of these
+    __slots__ = ('time', 'seconds', 'lat', 'lon', 'alt', 'trackingMethod',
+                 'groundLat', 'groundLon', 'groundAlt', '_pointing', '_magDec')
+
     def __init__(self, time, seconds, lat, lon, alt, trackingMethod, groundLat, groundLon, groundAlt):
         self.time = time
         self.seconds = seconds
@@ -14,14 +20,41 @@ class BalloonUpdate(object):
         self.lon = lon
         self.alt = alt
         self.trackingMethod = trackingMethod
+        self.groundLat = groundLat
+        self.groundLon = groundLon
+        self.groundAlt = groundAlt
+
+        self._pointing = None		# (bearing, elevation, line of sight) once computed
+        self._magDec = None
+
+    def _getPointing(self):
+        """ Calculate pointing values and distances on first access """
+        if self._pointing is None:
+            # The solver for the ground station is cached, so the station's trig
+            # isn't recomputed for every fix
+            self._pointing = getSolver(self.groundLat, self.groundLon, self.groundAlt).solve(
+                self.lat, self.lon, self.alt)
+        return self._pointing
+
+    @property
+    def bear(self):
+        return self._getPointing()[0]
+
+    @property
+    def ele(self):
+        return self._getPointing()[1]
+
+    @property
+    def los(self):
+        return self._getPointing()[2]
 
-        ### Calculate pointing values and distances ###
-        distanceToTarget = haversine(groundLat, groundLon, self.lat, self.lon)
-        self.bear = bearing(groundLat, groundLon, self.lat, self.lon)
-        self.ele = elevationAngle(self.alt, groundAlt, distanceToTarget)
-        self.los = losDistance(self.alt, groundAlt, distanceToTarget)
-        self.magDec = geomag.declination(
-            dlat=self.lat, dlon=self.lon, h=self.alt)
+    @property
+    def magDec(self):
+        if self._magDec is None:
+            # Declination comes from a bounded cache of quantized positions instead
+            # of a full spherical harmonic evaluation for every fix
+            self._magDec = cachedDeclination(self.lat, self.lon, self.alt)
+        return self._magDec
 
     def getTime(self):
         return self.time
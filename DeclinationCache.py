@@ -0,0 +1,72 @@
+import threading
+from collections import OrderedDict
+
+from Subsystems import loadSubsystem
+
+
+class DeclinationCache(object):
+    """
+    A bounded LRU cache of magnetic declination values, keyed on quantized
+    latitude, longitude and altitude. The declination is evaluated at the center
+    of each cell, so the answer for a cell doesn't depend on which fix filled it.
+    With the default 0.02 degree by 2000 ft cells the error stays under 0.05
+    degrees everywhere outside the polar regions.
+    """
+
+    def __init__(self, maxSize=4096, latLonStep=0.02, altStep=2000):
+        self.maxSize = maxSize
+        self.latLonStep = latLonStep		# Cell size in degrees
+        self.altStep = altStep				# Cell size in feet
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()		# Balloon updates are made in several threads
+        self.hits = 0
+        self.misses = 0
+
+    def declination(self, lat, lon, alt):
+        """ Returns the magnetic declination in degrees for the position (altitude in feet) """
+
+        key = (int(round(lat / self.latLonStep)), int(round(lon / self.latLonStep)),
+               int(round(alt / self.altStep)))
+        with self.lock:
+            value = self.cache.get(key)
+            if value is not None:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return value
+
+        # Evaluate outside of the lock, the spherical harmonics are the slow part.
+        # The model is imported on the first miss rather than at startup, and
+        # without it bearings are left magnetic (the load warns once)
+        geomag = loadSubsystem('declination')
+        if geomag is None:
+            return 0.0
+        value = geomag.declination(dlat=key[0] * self.latLonStep,
+                                   dlon=key[1] * self.latLonStep, h=key[2] * self.altStep)
+
+        with self.lock:
+            self.misses += 1
+            self.cache[key] = value
+            if len(self.cache) > self.maxSize:
+                self.cache.popitem(last=False)		# Evict the least recently used cell
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def getStats(self):
+        """ Returns the number of cache hits and misses """
+
+        return self.hits, self.misses
+
+
+# Shared cache used by every balloon update
+declinationCache = DeclinationCache()
+
+
+def cachedDeclination(lat, lon, alt):
+    """ Magnetic declination from the shared cache """
+
+    return declinationCache.declination(lat, lon, alt)
@@ -0,0 +1,121 @@
+import numpy as np
+
+# Codes stored in the source column of the track
+SOURCE_CODES = {'RFD': 1, 'Iridium': 2, 'APRS': 3}
+SOURCE_NAMES = dict((code, name) for name, code in SOURCE_CODES.items())
+
+
+class FlightTrack(object):
+    """
+    A columnar store for the flight history. Each column is a preallocated numpy
+    array that doubles in capacity when full, so appending is amortized O(1), and
+    the column properties are views of the filled part, so plotting and exporting
+    don't copy anything. Once maxLength rows are held, the oldest quarter is
+    dropped, which keeps memory bounded over long flights.
+    """
+
+    COLUMNS = ('time', 'lat', 'lon', 'alt', 'bear', 'ele', 'los')
+
+    def __init__(self, capacity=1024, maxLength=262144):
+        self.maxLength = maxLength
+        self.length = 0
+        self.allocate(capacity)
+
+    def allocate(self, capacity):
+        """ Moves the columns into new arrays of the given capacity """
+
+        data = np.empty((len(self.COLUMNS), capacity), dtype=np.float64)
+        source = np.zeros(capacity, dtype=np.int8)
+        if self.length > 0:
+            data[:, :self.length] = self.data[:, :self.length]
+            source[:self.length] = self.sourceCodes[:self.length]
+        self.data = data
+        self.sourceCodes = source
+        self.capacity = capacity
+
+    def append(self, update):
+        """ Adds a BalloonUpdate to the end of the track """
+
+        self.appendValues(update.getSeconds(), update.getLat(), update.getLon(), update.getAlt(),
+                          update.getBear(), update.getEle(), update.getLOS(),
+                          SOURCE_CODES.get(update.getTrackingMethod(), 0))
+
+    def appendValues(self, time, lat, lon, alt, bear, ele, los, source=0):
+        """ Adds a row of values to the end of the track """
+
+        if self.maxLength is not None and self.length >= self.maxLength:
+            self.dropOldest(self.maxLength // 4)
+        if self.length == self.capacity:
+            self.allocate(self.capacity * 2)
+        i = self.length
+        column = self.data[:, i]
+        column[0] = time
+        column[1] = lat
+        column[2] = lon
+        column[3] = alt
+        column[4] = bear
+        column[5] = ele
+        column[6] = los
+        self.sourceCodes[i] = source
+        self.length += 1
+
+    def dropOldest(self, count):
+        """ Discards the oldest rows of the track """
+
+        count = min(count, self.length)
+        remaining = self.length - count
+        self.data[:, :remaining] = self.data[:, count:self.length]
+        self.sourceCodes[:remaining] = self.sourceCodes[count:self.length]
+        self.length = remaining
+
+    def clear(self):
+        self.length = 0
+
+    def lastTime(self):
+        return self.data[0, self.length - 1]
+
+    def column(self, name):
+        """ Returns a view of the filled part of a column """
+
+        return self.data[self.COLUMNS.index(name), :self.length]
+
+    @property
+    def time(self):
+        return self.data[0, :self.length]
+
+    @property
+    def lat(self):
+        return self.data[1, :self.length]
+
+    @property
+    def lon(self):
+        return self.data[2, :self.length]
+
+    @property
+    def alt(self):
+        return self.data[3, :self.length]
+
+    @property
+    def bear(self):
+        return self.data[4, :self.length]
+
+    @property
+    def ele(self):
+        return self.data[5, :self.length]
+
+    @property
+    def los(self):
+        return self.data[6, :self.length]
+
+    @property
+    def source(self):
+        return self.sourceCodes[:self.length]
+
+    @property
+    def nbytes(self):
+        """ Memory held by the track's arrays """
+
+        return self.data.nbytes + self.sourceCodes.nbytes
+
+    def __len__(self):
+        return self.length
@@ -3,21 +3,13 @@ from PySide2 import QtCore, QtGui
 from PySide2.QtCore import *
 from PySide2.QtCore import Signal as pyqtSignal
 from BalloonUpdate import *
+from Iridium import *
 from time import sleep
-import MySQLdb
 import datetime
 import serial
 import threading
-import json
 import time
 
-try:
-    # For Python 3.0 and later
-    from urllib.request import urlopen
-except ImportError:
-    # Fall back to Python 2's urllib2
-    from urllib2 import urlopen
-
 
 class GetIridium(QtCore.QObject):
 
@@ -25,7 +17,7 @@ class GetIridium(QtCore.QObject):
     start = pyqtSignal()
     setInterrupt = pyqtSignal()
 
-    def __init__(self, MainWindow, host, user, password, name, IMEI):
+    def __init__(self, MainWindow, host, user, password, name, IMEI, fixInterval=60, fastPoll=1, slowPoll=10, backfill=False):
         super(GetIridium, self).__init__()
         self.mainWindow = MainWindow
         self.dbHost = host
@@ -34,139 +26,53 @@ class GetIridium(QtCore.QObject):
         self.dbName = name
         self.IMEI = IMEI
         self.iridiumInterrupt = False
+        # The web API and database polling is shared with the tracker daemon
+        self.poller = IridiumPoller(host, user, password, name, IMEI,
+                                    fixInterval, fastPoll, slowPoll, backfill)
 
         # Emitted Signals
         self.mainWindow.noIridium.connect(self.mainWindow.iridiumNoConnection)
         self.mainWindow.iridiumNewLocation.connect(
             self.mainWindow.updateBalloonLocation)
 
-    def getApiData(self, imei):
-        url = "http://eclipse.rci.montana.edu/php/antennaTracker.php?imei=%s" % imei
-        try:
-            # Timeout may be redundant, if port 80 is timing out, port 3306
-            # will probably also
-            response = urlopen(url, timeout=5)
-            data = response.read().decode("utf-8")
-            return json.loads(data)
-        except:
-            return {}
+    def setPolling(self, fixInterval, fastPoll, slowPoll):
+        self.poller.setPolling(fixInterval, fastPoll, slowPoll)
 
     def run(self):
         """ Gets tracking information from the Iridium satellite modem by taking the information from the web api OR the SQL database at Montana State University """
         # modified this to use the Web API - pol.llovet@montana.edu
-        #     the modification is crude and should be refactored. :P
 
         self.iridiumInterrupt = False
-        prev = ''
-        connectAttempts = 0
+        self.emitFixes(self.poller.start())		# The track so far, if backfilling
         while(not self.iridiumInterrupt):
-            time.sleep(2)
-            # Fetch the data from the API
-            get_data = self.getApiData(self.IMEI)
-            if get_data:
-                # set the data from the API values
-                dataMethod = "API"
-                remoteTime = get_data['remoteTime']
-                remoteHours = int(get_data['remoteHours'])
-                remoteMinutes = int(get_data['remoteMinutes'])
-                remoteSeconds = int(
-                    get_data['remoteSeconds']) + (60 * remoteMinutes) + (3600 * remoteHours)
-                remoteLat = float(get_data['remoteLat'])
-                remoteLon = float(get_data['remoteLon'])
-                remoteAlt = float(get_data['remoteAlt'])
-                ### Create a new location object ###
-                try:
-                    newLocation = BalloonUpdate(remoteTime, remoteSeconds, remoteLat, remoteLon, remoteAlt,
-                                                "Iridium", self.mainWindow.groundLat, self.mainWindow.groundLon, self.mainWindow.groundAlt)
-                except:
-                    print(
-                        "Error creating a new balloon location object from Iridium Data")
-
-                try:
-                    # Notify the main GUI of the new location
-                    self.mainWindow.iridiumNewLocation.emit(newLocation)
-                except(Exception, e):
-                    print(str(e))
-
-            else:
-                # use the database
-                # Connect to the SQL Database (try 20 times)
-                connected = False
-                while(not connected and not self.iridiumInterrupt):
-                    QtGui.QApplication.processEvents()
-                    if connectAttempts < 20:
-                        try:
-                            # Connect to the database
-                            db_local = MySQLdb.connect(
-                                host=self.dbHost, user=self.dbUser, passwd=self.dbPass, db=self.dbName)
-                            # prepare a cursor object using cursor() method
-                            cursor = db_local.cursor()
-                            sql = "select gps_fltDate,gps_time,gps_lat,gps_long,gps_alt from gps where gps_IMEI = %s order by pri_key DESC LIMIT 1" % (
-                                IMEI)
-                            cursor.execute(sql)
-                            connected = True
-                            if self.iridiumInterrupt:
-                                cursor.close()
-                                db_local.close()
-                                connected = True
-                        except:
-                            print(
-                                "Failed to connect to database, trying again in 1 sec")
-                            connectAttempts += 1
-                    else:
-                        print("Failed to connect to database too many times")
-                        self.interrupt()
-                        self.mainWindow.noIridium.emit()
-                if connected:
-                    ### Fetch a single row using fetchone() method. ###
-                    # POL: Note, there will only ever be one row, since we are
-                    # using "LIMIT 1"
-                    try:
-                        results = cursor.fetchone()
-                        if(results != prev):
-                            prev = results
-                            remoteTime = results[1].split(":")
-                            remoteHours = int(remoteTime[0])
-                            remoteMinutes = int(remoteTime[1])
-                            remoteSeconds = int(remoteTime[2])
-                            remoteTime = results[1]
-                            remoteSeconds = remoteSeconds + \
-                                (60 * remoteMinutes) + (3600 * remoteHours)
-                            # http://stackoverflow.com/questions/379906/parse-string-to-float-or-int
-                            remoteLat = float(results[2])
-                            remoteLon = float(results[3])
-                            # (meters to feet conversion)
-                            remoteAlt = float(results[4]) * 3.280839895
-
-                            ### Create a new location object ###
-                            try:
-                                newLocation = BalloonUpdate(remoteTime, remoteSeconds, remoteLat, remoteLon, remoteAlt,
-                                                            "Iridium", self.mainWindow.groundLat, self.mainWindow.groundLon, self.mainWindow.groundAlt)
-                            except:
-                                print(
-                                    "Error creating a new balloon location object from Iridium Data")
-
-                            try:
-                                # Notify the main GUI of the new location
-                                self.mainWindow.iridiumNewLocation.emit(
-                                    newLocation)
-                            except(Exception, e):
-                                print(str(e))
-                    except:
-                        print(
-                            "ERROR PARSING DATA FROM DATABASE: Cannot parse data or data may not exist, please double check your IMEI number")
-                else:
-                    print("ERROR: Unable to connect to database!")
+            time.sleep(self.poller.pollDelay())
+            self.emitFixes(self.poller.poll())
+
+            if self.poller.failed:
+                self.interrupt()
+                self.mainWindow.noIridium.emit()
 
         ### Clean up ###
-        try:
-            cursor.close()
-            db_local.close()
-        except:
-            print("Error closing database")
+        self.poller.close()
 
         self.iridiumInterrupt = False
 
+    def emitFixes(self, fixes):
+        """ Sends each (remoteTime, seconds, lat, lon, alt) fix to the GUI as an Iridium balloon update """
+
+        for remoteTime, remoteSeconds, remoteLat, remoteLon, remoteAlt in fixes:
+            ### Create a new location object ###
+            try:
+                newLocation = BalloonUpdate(remoteTime, remoteSeconds, remoteLat, remoteLon, remoteAlt,
+                                            "Iridium", self.mainWindow.groundLat, self.mainWindow.groundLon, self.mainWindow.groundAlt)
+            except Exception as e:
+                print(
+                    "Error creating a new balloon location object from Iridium Data: " + str(e))
+                continue
+
+            # Notify the main GUI of the new location
+            self.mainWindow.iridiumNewLocation.emit(newLocation)
+
     def interrupt(self):
         self.iridiumInterrupt = True
 
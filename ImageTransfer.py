@@ -0,0 +1,1211 @@
+"""
+Image transfer protocols for the still image system.
+
+StopAndWaitReceiver is the original protocol: the Pi sends the picture size,
+then for each word an MD5 followed by wordlength base64 characters, and waits
+for a Y or N. Every bad word costs a resync.
+
+SelectiveRepeatReceiver keeps a window of chunks in flight. The ground sends
+    SR<window:2 hex><chunk size:4 hex>\\n
+and the payload answers with an info frame and then data frames addressed by
+their byte offset in the base64 image
+    I<size:8 hex><chunk size:4 hex><crc32:8 hex>
+    D<offset:8 hex><length:4 hex><crc32:8 hex><data>
+while the ground acknowledges with
+    K<base:8 hex><chunk size:4 hex>[<start:8 hex><end:8 hex>]...\\n
+where everything before base has arrived, and up to four [start, end) blocks
+list what has arrived past the first gap. X\n from the ground cancels the
+transfer. Only the missing ranges are sent
+again, cut to the chunk size asked for in the latest ack, so a
+ChunkSizeController on the ground can change the chunk size mid-transfer.
+Frames contain nothing but hex and base64 characters, so GPS lines can still be
+picked out of the stream by the RfdLink. SelectiveRepeatSender is the payload's
+side of the protocol, and is what the stand-in below runs.
+
+Binary mode sends the image bytes themselves, saving the third base64 adds.
+The ground asks for it with
+    SB<window:2 hex><chunk size:4 hex>\n
+and a payload that supports it answers with binary frames, big-endian,
+    I<size:4><chunk size:2><crc32:4>
+    D<offset:4><length:2><data><crc32:4>
+each COBS encoded and followed by a zero byte, so a frame can't contain a zero
+and a damaged frame only costs the frames it touches. The CRC covers
+everything before it. A frame can hold any other byte, so an RfdLink only
+picks GPS lines out right after a frame's zero byte. Acks are the same text as above, with offsets into the
+image bytes. A payload that only knows text mode ignores SB, and after
+binaryTries handshakes go unanswered the ground falls back to SR. The info
+frame that comes back sets the mode.
+
+Both receivers decode the base64 into the output file as it arrives, with
+Base64Decoder, so neither the encoded nor the decoded image is built up as a
+string. Progress is reported as (bytes received, image size), counted as sent.
+
+benchmark() runs the protocols against a stand-in for the Pi on a loopback
+pty, with a simulated baud rate, latency and byte error rate:
+    python ImageTransfer.py [byte error rate] [baud] [latency]
+"""
+
+import os
+import re
+import json
+import mmap
+import binascii
+import sys
+import time
+import zlib
+import random
+import select
+import base64
+import struct
+import hashlib
+import threading
+from SerialReader import MarkerScanner
+
+HEADER = 21		# Length of an info frame and of a data frame's header
+MAX_BLOCKS = 4		# Ranges past the first gap reported in an ack
+FRAME_START = re.compile(br'[ID][0-9a-f]{20}')
+TEXT_INFO = re.compile(br'I[0-9a-f]{20}')
+ACK_FRAME = re.compile(br'K([0-9a-f]{8})([0-9a-f]{4})((?:[0-9a-f]{16}){0,4})\n')
+HANDSHAKE = re.compile(br'S([RB])([0-9a-f]{2})([0-9a-f]{4})\n')
+BINARY_HEADER = struct.Struct('>cIH')		# Type and offset and length, or size and chunk size
+NOT_BASE64 = bytes(c for c in range(256) if c not in b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/=')
+
+
+def crc(data):
+    return zlib.crc32(data) & 0xffffffff
+
+
+def dataFrame(offset, chunk):
+    """ Builds the data frame for a chunk """
+
+    fields = b'%08x%04x' % (offset, len(chunk))
+    return b'D' + fields + b'%08x' % crc(fields + chunk) + chunk
+
+
+def infoFrame(size, chunkSize):
+    fields = b'%08x%04x' % (size, chunkSize)
+    return b'I' + fields + b'%08x' % crc(fields)
+
+
+def cobsEncode(data):
+    """ Consistent overhead byte stuffing: returns data with every zero byte removed """
+
+    data = bytes(data)
+    out = bytearray()
+    for block in data.split(b'\x00'):
+        # Each block is followed by an implied zero, except the last
+        i = 0
+        while len(block) - i >= 254:
+            out.append(255)
+            out += block[i:i + 254]
+            i += 254
+        out.append(len(block) - i + 1)
+        out += block[i:]
+    return bytes(out)
+
+
+def cobsDecode(data):
+    """ Undoes cobsEncode. Raises ValueError if data can't be a COBS encoding """
+
+    data = bytes(data)
+    out = bytearray()
+    i = 0
+    while i < len(data):
+        code = data[i]
+        end = i + code
+        if code == 0 or end > len(data):
+            raise ValueError("bad COBS block")
+        out += data[i + 1:end]
+        i = end
+        if code < 255 and i < len(data):
+            out.append(0)
+    return bytes(out)
+
+
+def binaryDataFrame(offset, chunk):
+    """ Builds the binary mode data frame for a chunk, delimiter included """
+
+    frame = BINARY_HEADER.pack(b'D', offset, len(chunk)) + bytes(chunk)
+    return cobsEncode(frame + struct.pack('>I', crc(frame))) + b'\x00'
+
+
+def binaryInfoFrame(size, chunkSize):
+    frame = BINARY_HEADER.pack(b'I', size, chunkSize)
+    return cobsEncode(frame + struct.pack('>I', crc(frame))) + b'\x00'
+
+
+def parseBinaryFrame(encoded):
+    """
+    Decodes one binary mode frame, without its delimiter, and checks its CRC.
+    Returns ('I', size, chunk size, None), ('D', offset, length, data) or None
+    """
+
+    try:
+        frame = cobsDecode(encoded)
+    except ValueError:
+        return None
+    if len(frame) < BINARY_HEADER.size + 4 or crc(frame[:-4]) != struct.unpack('>I', frame[-4:])[0]:
+        return None
+    kind, first, second = BINARY_HEADER.unpack(frame[:BINARY_HEADER.size])
+    data = frame[BINARY_HEADER.size:-4]
+    if kind == b'I' and not data:
+        return 'I', first, second, None
+    if kind == b'D' and len(data) == second:
+        return 'D', first, second, data
+    return None
+
+
+class Base64Decoder(object):
+    """
+    Decodes a base64 stream into a binary file as it arrives. Whole four
+    character groups are decoded straight from the caller's buffer, and only
+    the zero to three characters left over are held for the next write.
+    """
+
+    def __init__(self, out):
+        self.out = out
+        self.pending = b''		# Start of an incomplete group
+        self.consumed = 0		# Base64 bytes taken so far
+        self.written = 0		# Image bytes written so far
+
+    def decode(self, data):
+        try:
+            decoded = binascii.a2b_base64(data)
+        except binascii.Error:
+            # Stray characters split the groups, so decode what's left of them
+            data = bytes(data).translate(None, NOT_BASE64)
+            data = data[:len(data) - len(data) % 4]
+            decoded = binascii.a2b_base64(data) if data else b''
+        self.out.write(decoded)
+        self.written += len(decoded)
+
+    def write(self, data):
+        view = memoryview(data)
+        self.consumed += len(view)
+        if self.pending:
+            need = 4 - len(self.pending)
+            self.pending += bytes(view[:need])
+            view = view[need:]
+            if len(self.pending) < 4:
+                return
+            self.decode(self.pending)
+            self.pending = b''
+        end = len(view) - len(view) % 4
+        if end:
+            self.decode(view[:end])
+        self.pending = bytes(view[end:])
+
+    def close(self):
+        """ Decodes whatever is left, padding it out if the image was cut short """
+
+        if len(self.pending) > 1:
+            self.decode(self.pending + b'=' * (4 - len(self.pending)))
+        self.pending = b''
+        self.out.flush()
+
+
+class ImageWriter(object):
+    """ Writes binary mode image bytes through unchanged, in the same way Base64Decoder writes base64 """
+
+    def __init__(self, out):
+        self.out = out
+        self.consumed = 0
+        self.written = 0
+
+    def write(self, data):
+        self.out.write(data)
+        self.consumed += len(data)
+        self.written += len(data)
+
+    def close(self):
+        self.out.flush()
+
+
+class ImageReceiver(object):
+    """
+    The hooks and bookkeeping shared by the ground side receivers, which each
+    add receive(ser, out). log, progress, preview, cancelled and framing can
+    be replaced by the caller
+    """
+
+    def __init__(self):
+        self.failures = 0
+        self.received = 0		# Bytes received, as sent (base64 or binary)
+        self.size = None		# Bytes in the whole image as sent, once known
+        self.previewInterval = 0.5		# Seconds between preview calls
+        self.lastPreview = 0
+
+    def log(self, text):
+        print(text)
+
+    def preview(self, written):
+        """
+        Called at most every previewInterval while the image is written, with
+        the number of image bytes in the output file. The file has been
+        flushed, so the partial image can be read back from it
+        """
+        pass
+
+    def cancelled(self):
+        """ Polled during the transfer, which stops if it returns True """
+        return False
+
+    def wrote(self, decoder):
+        """ Calls preview if it's been long enough since the last one """
+
+        now = time.time()
+        if decoder.written and now - self.lastPreview >= self.previewInterval:
+            decoder.out.flush()
+            self.lastPreview = now
+            self.preview(decoder.written)
+
+    def progress(self, received, total):
+        """ Called with the bytes received so far and the image's size, both as sent """
+        pass
+
+    def framing(self, binary):
+        """
+        Called with True when binary frames may be coming, and False when only
+        text is, so a shared link knows where other traffic can be picked out
+        """
+        pass
+
+
+class StopAndWaitReceiver(ImageReceiver):
+    """
+    The original protocol, one word at a time with a resync after every bad
+    word. A word that stops short, because the radio dropped bytes, is taken
+    as bad once the port has been quiet for idleGap, rather than after the
+    port's whole timeout.
+    """
+
+    def __init__(self, wordlength=8000, maxTries=10, startDelay=1, idleGap=0.5, syncTimeout=5, pollTimeout=0.05):
+        super(StopAndWaitReceiver, self).__init__()
+        # Variable to determine spacing of checksum. Ex. wordlength = 1000 will
+        # send one thousand bits before calculating and verifying checksum
+        self.wordlength = wordlength
+        self.maxTries = maxTries
+        self.startDelay = startDelay
+        self.idleGap = idleGap		# A word that stops for this long is cut short
+        self.syncTimeout = syncTimeout
+        self.pollTimeout = pollTimeout		# Port timeout while receiving words
+        self.timeout = 2		# Longest wait for a word to start, the port's own timeout
+        self.scanner = MarkerScanner(b'sync', syncTimeout)
+
+    def read(self, ser, n):
+        """
+        Reads n bytes, starting with any the last resync read past its marker.
+        Waits up to the port's timeout for data to come, and stops once it has
+        been quiet for idleGap
+        """
+
+        data = self.scanner.take(n)
+        last = time.time()
+        while len(data) < n:
+            new = ser.read(min(n - len(data), max(ser.in_waiting, 1)))
+            now = time.time()
+            if new:
+                data += new
+                last = now
+            elif now - last > (self.idleGap if data else self.timeout):
+                break
+        return data
+
+    def receive(self, ser, out):
+        decoder = Base64Decoder(out)
+        self.received = 0
+        self.scanner = MarkerScanner(b'sync', self.syncTimeout)
+
+        try:
+            # The first thing you get is the total picture size so you can make
+            # the progress bar
+            time.sleep(self.startDelay)
+            self.size = int(ser.readline())
+            self.log("Total Picture Size: " + str(self.size))
+        except:
+            self.log("Error retrieving picture size")
+            self.size = 1
+        self.progress(0, self.size)
+
+        # Poll the port, so read and the resync can tell when the data stops
+        self.timeout = ser.timeout
+        ser.timeout = self.pollTimeout
+        try:
+            self.receiveWords(ser, decoder)
+        finally:
+            ser.timeout = self.timeout
+        decoder.close()
+        if self.scanner.scans:
+            self.log("Resyncs: " + str(self.scanner.scans) + ", bytes discarded: " + str(self.scanner.discarded) +
+                     ", markers not found: " + str(self.scanner.misses))
+        return decoder.written
+
+    def receiveWords(self, ser, decoder):
+        trycnt = 0
+
+        ### Retreive Data Loop (Will end when on timeout) ###
+        while True:
+            if self.cancelled():
+                self.log("Transfer cancelled")
+                break
+            self.log("Current Received Position: " + str(self.received))
+            # Asks first for checksum. Checksum is asked for first so that if
+            # data is less than wordlength, it won't error out the checksum
+            # data
+            checktheirs = self.read(ser, 32)
+            # Retreives characters, who's total string length is predetermined
+            # by variable wordlength
+            word = self.read(ser, self.wordlength)
+            # Retreives a checksum based on the received data strings
+            checkours = hashlib.md5(word).hexdigest().encode('ascii')
+
+            # CHECKSUM
+            if checkours != checktheirs:
+                if trycnt < self.maxTries:		# Maximum number of resends before giving up
+                    ser.write(b'N')
+                    trycnt += 1
+                    self.failures += 1
+                    self.log("try number: " + str(trycnt))
+                    self.log("\tresend last")
+                    self.log("\tpos @ " + str(self.received))
+                    self.log("\twordlength " + str(self.wordlength))
+                    self.sync(ser)		# This corrects for bit deficits or excesses ######  THIS IS A MUST FOR DATA TRANSMISSION WITH THE RFD900s!!!! #####
+                else:
+                    # Kind of a worst case, checksum trycnt is reached and so
+                    # we save the image and end the receive, a partial image
+                    # will render if enough data
+                    ser.write(b'N')
+                    decoder.write(word)
+                    self.received += len(word)
+                    break
+            else:							# If everything goes well, reset the try counter, and add the word to the accumulating final wor
+                trycnt = 0
+                ser.write(b'Y')
+                decoder.write(word)
+                self.received += len(word)
+                self.progress(self.received, self.size)
+                self.wrote(decoder)
+            # The words always come in increments of some thousand, so if it's
+            # not evenly divisible, you're probably at the end
+            if self.received % 1000 != 0:
+                break
+
+    def sync(self, ser):
+        """ Ensures both sender and receiver are at that the same point in their data streams """
+
+        # Everything before the sender's sync marker is thrown away, but
+        # nothing after it, so no good data is flushed
+        if self.scanner.scan(ser):
+            self.log("Synced, discarded " + str(self.scanner.lastDiscarded) + " bytes in " +
+                     str(round(self.scanner.lastTime, 2)) + " s")
+        else:
+            self.log("No sync marker in " + str(self.syncTimeout) + " s, discarded " +
+                     str(self.scanner.lastDiscarded) + " bytes")
+
+        # Notifies sender that the receiving end is now synced
+        ser.write(b'S')
+        self.log("System Match")
+
+
+class ChunkSizeController(object):
+    """
+    Additive increase, multiplicative decrease of the chunk size. Each chunk
+    that arrives intact counts toward growing the chunk by step, and a chunk
+    that fails its checksum halves it, so the size settles where the link's
+    error rate makes a bad chunk about as costly as the header overhead saved.
+    The smoothed round trip time paces the acks sent while waiting, and the
+    throughput seen at each size picks the size the next transfer starts at.
+    """
+
+    def __init__(self, size=1000, minSize=200, maxSize=4000, step=200, decrease=0.5, growAfter=8,
+                 minAckInterval=0.05, maxAckInterval=2.0, minSample=0.5, clock=time.monotonic):
+        self.minSize = minSize
+        self.maxSize = maxSize
+        self.step = step
+        self.decrease = decrease
+        self.growAfter = growAfter		# Intact chunks in a row before growing
+        self.minAckInterval = minAckInterval
+        self.maxAckInterval = maxAckInterval
+        self.minSample = minSample		# Seconds at a size before its throughput counts
+        self.clock = clock
+        self.size = max(minSize, min(maxSize, size))
+        self.streak = 0
+        self.rtt = None
+        self.history = [self.size]		# Every size chosen during the transfer
+        self.throughput = {}		# size -> [image bytes, seconds] spent at that size
+        self.sizeStart = None		# When the current size started delivering
+        self.sizeBytes = 0
+
+    def success(self):
+        """ A chunk arrived intact. Returns True if the size changed """
+
+        self.streak += 1
+        if self.streak < self.growAfter or self.size >= self.maxSize:
+            return False
+        self.streak = 0
+        return self.setSize(self.size + self.step)
+
+    def failure(self):
+        """ A chunk failed its checksum. Returns True if the size changed """
+
+        self.streak = 0
+        return self.setSize(int(self.size * self.decrease))
+
+    def setSize(self, size):
+        size = max(self.minSize, min(self.maxSize, size))
+        if size == self.size:
+            return False
+        self.endSample()
+        self.size = size
+        self.history.append(size)
+        return True
+
+    def delivered(self, count):
+        """ count new image bytes arrived at the current size """
+
+        if self.sizeStart is None:
+            self.sizeStart = self.clock()
+        self.sizeBytes += count
+
+    def endSample(self):
+        """ Adds the bytes and time at the current size to its throughput """
+
+        if self.sizeStart is not None:
+            sample = self.throughput.setdefault(self.size, [0, 0.0])
+            sample[0] += self.sizeBytes
+            sample[1] += self.clock() - self.sizeStart
+        self.sizeStart = None
+        self.sizeBytes = 0
+
+    def addRtt(self, sample):
+        self.rtt = sample if self.rtt is None else 0.875 * self.rtt + 0.125 * sample
+
+    def ackInterval(self, default):
+        """ Seconds to wait for new data before acking again: twice the round trip, once there is one """
+
+        if self.rtt is None:
+            return default
+        return max(self.minAckInterval, min(self.maxAckInterval, 2 * self.rtt))
+
+    def bestSize(self):
+        """
+        The size to start the next transfer on this link with: the one that
+        delivered the most bytes a second, out of those used long enough to
+        tell. The size the transfer ended on is often just after a halving
+        """
+
+        self.endSample()
+        rates = [(total / seconds, size) for size, (total, seconds) in self.throughput.items()
+                 if seconds >= self.minSample]
+        if not rates:
+            return self.size
+        return max(rates)[1]
+
+    @staticmethod
+    def load(path, profile, **kwargs):
+        """ A controller starting at the best known size for the link profile """
+
+        controller = ChunkSizeController(**kwargs)
+        try:
+            with open(path) as f:
+                controller.setSize(int(json.load(f)[profile]))
+            controller.history = [controller.size]
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            pass
+        return controller
+
+    def save(self, path, profile):
+        """ Stores the best known size for the link profile """
+
+        try:
+            with open(path) as f:
+                profiles = json.load(f)
+        except (IOError, OSError, ValueError):
+            profiles = {}
+        profiles[profile] = self.bestSize()
+        with open(path, 'w') as f:
+            json.dump(profiles, f, indent=4, sort_keys=True)
+
+
+class PartialImage(object):
+    """
+    A download in progress, kept on disk so that a failed transfer can be
+    resumed. The base64 data goes in a sparse file of the full size, written
+    through a memory map, and the byte ranges received so far go in a JSON
+    file beside it. The data is flushed before the ranges are saved, so the
+    ranges never claim bytes that aren't on disk.
+    """
+
+    def __init__(self, path, flushInterval=1.0):
+        self.path = path
+        self.statePath = path + '.json'
+        self.flushInterval = flushInterval		# Seconds between saves of the ranges
+        self.file = None
+        self.data = None
+        self.size = None
+        self.encoding = None
+        self.ranges = []
+        self.lastSave = 0
+
+    def open(self, size, encoding='base64'):
+        """
+        Opens the partial file for an image of size bytes, sent as base64 or
+        binary, and returns the ranges already held
+        """
+
+        ranges = []
+        try:
+            with open(self.statePath) as f:
+                state = json.load(f)
+            if (state['size'] == size and state.get('encoding', 'base64') == encoding and
+                    os.path.getsize(self.path) == size):
+                ranges = [(int(s), int(e)) for s, e in state['ranges']]
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            pass
+
+        self.file = open(self.path, 'r+b' if ranges else 'w+b')
+        if not ranges:
+            self.file.truncate(size)		# Sparse, blocks are only allocated as chunks arrive
+        self.data = mmap.mmap(self.file.fileno(), size)
+        self.size = size
+        self.encoding = encoding
+        self.ranges = ranges
+        self.save()
+        return ranges
+
+    def update(self, ranges):
+        self.ranges = ranges
+        if time.time() - self.lastSave > self.flushInterval:
+            self.save()
+
+    def save(self):
+        self.data.flush()
+        temp = self.statePath + '.tmp'
+        with open(temp, 'w') as f:
+            json.dump({'size': self.size, 'encoding': self.encoding, 'ranges': self.ranges}, f)
+        os.replace(temp, self.statePath)
+        self.lastSave = time.time()
+
+    def close(self):
+        if self.data is not None:
+            self.save()
+            self.data.close()
+            self.file.close()
+            self.data = None
+            self.file = None
+
+    def remove(self):
+        """ Deletes the partial state once the image is complete """
+
+        self.close()
+        for path in (self.path, self.statePath):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def addRange(ranges, start, end):
+    """ Adds [start, end) to a sorted list of disjoint [start, end) ranges, merging as needed """
+
+    merged = []
+    for s, e in ranges:
+        if e < start or s > end:
+            merged.append((s, e))
+        else:
+            start = min(start, s)
+            end = max(end, e)
+    merged.append((start, end))
+    merged.sort()
+    return merged
+
+
+def isCovered(ranges, start, end):
+    """ True if [start, end) lies inside one of the ranges """
+
+    for s, e in ranges:
+        if s <= start and end <= e:
+            return True
+    return False
+
+
+class SelectiveRepeatReceiver(ImageReceiver):
+    """
+    The ground side of the selective repeat protocol. With a controller, the
+    chunk size is adapted during the transfer and asked for in every ack. With
+    a PartialImage, what has arrived is kept on disk, and a transfer of the
+    same image picks up where the last one stopped: the first ack lists the
+    ranges already held, so the payload only sends the rest. With binary, the
+    payload is asked for binary frames first.
+    """
+
+    def __init__(self, window=16, chunkSize=1000, controller=None, partial=None, binary=False,
+                 binaryTries=2, ackInterval=0.2, handshakeInterval=2, timeout=20, idleGap=0.5, pollTimeout=0.05):
+        super(SelectiveRepeatReceiver, self).__init__()
+        self.window = window		# Chunks the payload may have in flight
+        self.chunkSize = chunkSize
+        self.controller = controller
+        self.partial = partial
+        self.allowBinary = binary
+        self.binaryTries = binaryTries		# Unanswered SB handshakes before falling back to SR
+        self.ackInterval = ackInterval		# Resend the ack this often when idle, until the controller has a round trip
+        self.handshakeInterval = handshakeInterval
+        self.timeout = timeout		# Give up after this long without new data
+        self.idleGap = idleGap		# A frame that stops for this long is cut short
+        self.pollTimeout = pollTimeout		# Port timeout while receiving, so acks go out on time
+
+    def reset(self):
+        self.buffer = bytearray()
+        self.data = None
+        self.ranges = []		# Byte ranges received so far
+        self.recent = []		# Offsets of the last few chunks received
+        self.size = None
+        self.received = 0
+        self.decoder = None
+        self.binary = None		# Mode in use, set by the info frame
+        self.handshakes = 0
+
+    def ackDelay(self):
+        """ Seconds without new data before the ack is sent again """
+
+        if self.controller is not None:
+            return self.controller.ackInterval(self.ackInterval)
+        return self.ackInterval
+
+    def requestedChunk(self):
+        if self.controller is not None:
+            return self.controller.size
+        return self.chunkSize
+
+    def base(self):
+        """ Bytes received without a gap from the start """
+
+        if self.ranges and self.ranges[0][0] == 0:
+            return self.ranges[0][1]
+        return 0
+
+    def isComplete(self):
+        return self.size is not None and self.base() >= self.size
+
+    def openImage(self, size):
+        """ Sets up the storage once the payload has said how big the image is """
+
+        self.size = size
+        self.decoder = ImageWriter(self.out) if self.binary else Base64Decoder(self.out)
+        if self.partial is None:
+            self.data = bytearray(size)
+            return
+        self.ranges = self.partial.open(size, 'binary' if self.binary else 'base64')
+        self.data = self.partial.data
+        self.received = sum(e - s for s, e in self.ranges)
+        if self.ranges:
+            self.log("Resuming with " + str(self.received) + " of " + str(size) + " bytes")
+
+    def handshake(self, ser):
+        binary = self.allowBinary and self.handshakes < self.binaryTries
+        if self.allowBinary and self.handshakes == self.binaryTries:
+            self.log("No answer to the binary handshake, asking for text")
+        self.framing(binary)
+        ser.write(b'S%s%02x%04x\n' % (b'B' if binary else b'R', self.window, self.requestedChunk()))
+        self.handshakes += 1
+
+    def ack(self, ser, everything=False):
+        """
+        Acknowledges what has arrived. The ranges holding the newest chunks are
+        listed first, as the payload remembers what earlier acks told it. With
+        everything, as many acks are sent as it takes to list every range
+        """
+
+        base = self.base()
+        blocks = []
+        for offset in reversed(self.recent):
+            for s, e in self.ranges:
+                if s <= offset < e and s > base and (s, e) not in blocks:
+                    blocks.append((s, e))
+        blocks += [(s, e) for s, e in self.ranges if s > base and (s, e) not in blocks]
+        if not everything:
+            blocks = blocks[:MAX_BLOCKS]
+        header = b'K%08x%04x' % (base, self.requestedChunk())
+        for i in range(0, max(len(blocks), 1), MAX_BLOCKS):
+            ser.write(header + b''.join(b'%08x%08x' % block for block in blocks[i:i + MAX_BLOCKS]) + b'\n')
+
+    def decodeNew(self):
+        """ Decodes anything that has joined the run received without a gap """
+
+        base = self.base()
+        if base > self.decoder.consumed:
+            self.decoder.write(memoryview(self.data)[self.decoder.consumed:base])
+            self.wrote(self.decoder)
+
+    def addData(self, offset, chunk):
+        """ Stores a chunk that passed its checksum. Returns True if any of it was new """
+
+        end = offset + len(chunk)
+        if end > self.size or isCovered(self.ranges, offset, end):
+            return False
+        before = sum(e - s for s, e in self.ranges)
+        self.data[offset:end] = chunk
+        self.ranges = addRange(self.ranges, offset, end)
+        self.received = sum(e - s for s, e in self.ranges)
+        self.recent = self.recent[1 - MAX_BLOCKS:] + [offset]
+        if self.partial is not None:
+            self.partial.update(self.ranges)
+        return self.received > before
+
+    def parseFrames(self, idle):
+        """ Takes every complete frame out of the buffer and returns (new chunks, failed chunks) """
+
+        if self.binary is None:
+            self.findInfo()
+        if self.binary is None:
+            return 0, 0
+        if self.binary:
+            return self.parseBinary()
+        return self.parseText(idle)
+
+    def findInfo(self):
+        """
+        Finds the first info frame in the buffer, text or binary, and drops
+        what comes before it. The info frame's mode is the transfer's mode
+        """
+
+        buf = self.buffer
+        found = None
+        for match in TEXT_INFO.finditer(buf):
+            if crc(bytes(buf[match.start() + 1:match.start() + 13])) == int(buf[match.start() + 13:match.end()], 16):
+                found = (match.start(), False)
+                break
+        start = 0
+        end = buf.find(b'\x00')
+        while end >= 0 and (found is None or start < found[0]):
+            frame = parseBinaryFrame(buf[start:end])
+            if frame is not None and frame[0] == 'I':
+                found = (start, True)
+                break
+            start = end + 1
+            end = buf.find(b'\x00', start)
+        if found is None:
+            # Keep what could be the start of an info frame
+            del buf[:max(0, len(buf) - HEADER)]
+            return
+        del buf[:found[0]]
+        self.binary = found[1]
+        self.framing(self.binary)
+
+    def parseBinary(self):
+        """ parseFrames for binary mode, where every frame ends at a zero byte """
+
+        buf = self.buffer
+        new = 0
+        failed = 0
+        start = 0
+        end = buf.find(b'\x00')
+        while end >= 0:
+            if end > start:
+                frame = parseBinaryFrame(buf[start:end])
+                if frame is None:
+                    failed += 1
+                elif frame[0] == 'I':
+                    if self.size is None:
+                        self.openImage(frame[1])
+                elif self.size is not None and frame[1] + frame[2] <= self.size and frame[2] > 0:
+                    if self.addData(frame[1], frame[3]):
+                        new += 1
+            start = end + 1
+            end = buf.find(b'\x00', start)
+        del buf[:start]
+        return new, failed
+
+    def parseText(self, idle):
+        """ parseFrames for text mode """
+
+        buf = self.buffer
+        new = 0
+        failed = 0
+        while True:
+            match = FRAME_START.search(buf)
+            if match is None:
+                # Keep what could be the start of a header
+                del buf[:max(0, len(buf) - HEADER)]
+                return new, failed
+            del buf[:match.start()]
+
+            if buf[0:1] == b'I':
+                if crc(bytes(buf[1:13])) == int(buf[13:21], 16):
+                    if self.size is None:
+                        self.openImage(int(buf[1:9], 16))
+                    del buf[:HEADER]
+                else:
+                    failed += 1
+                    del buf[:1]
+                continue
+
+            offset = int(buf[1:9], 16)
+            length = int(buf[9:13], 16)
+            if length == 0 or self.size is None or offset + length > self.size:
+                del buf[:1]
+                continue
+            if len(buf) < HEADER + length:
+                if idle:
+                    # Nothing more is coming, so this was never a frame
+                    del buf[:1]
+                    continue
+                return new, failed
+            chunk = bytes(buf[HEADER:HEADER + length])
+            if crc(bytes(buf[1:13]) + chunk) != int(buf[13:21], 16):
+                failed += 1
+                del buf[:1]
+                continue
+            if self.addData(offset, chunk):
+                new += 1
+            del buf[:HEADER + length]
+
+    def receive(self, ser, out):
+        self.reset()
+        self.out = out
+
+        # Poll the port, so the acks and handshakes aren't held up by a read
+        # waiting out the port's whole timeout
+        portTimeout = ser.timeout
+        ser.timeout = self.pollTimeout
+        try:
+            self.receiveFrames(ser)
+        finally:
+            ser.timeout = portTimeout
+
+        if self.decoder is None:
+            return 0
+        # Everything up to the first gap has already been written
+        self.decoder.close()
+        if self.partial is not None:
+            self.data = None
+            self.partial.close()
+        return self.decoder.written
+
+    def receiveFrames(self, ser):
+        self.handshake(ser)
+        lastHandshake = lastAck = lastData = lastByte = time.time()
+        ackSent = None		# When the ack being timed for the round trip went out
+        while True:
+            data = ser.read(ser.in_waiting or 1)
+            self.buffer += data
+            sizeKnown = self.size is not None
+            received = self.received
+            now = time.time()
+            if data:
+                lastByte = now
+            new, failed = self.parseFrames(now - lastByte > self.idleGap)
+            self.failures += failed
+            changed = False
+            if self.controller is not None:
+                if sizeKnown:
+                    self.controller.delivered(self.received - received)
+                for i in range(new):
+                    changed = self.controller.success() or changed
+                for i in range(failed):
+                    changed = self.controller.failure() or changed
+                if changed:
+                    self.log("Chunk size: " + str(self.controller.size))
+            if self.data is not None:
+                self.decodeNew()
+            if new:
+                lastData = now
+                if ackSent is not None and self.controller is not None:
+                    self.controller.addRtt(now - ackSent)
+                ackSent = None
+                self.progress(self.received, self.size)
+
+            if self.size is None:
+                if now - lastHandshake > self.handshakeInterval:
+                    self.handshake(ser)
+                    lastHandshake = now
+                lastAck = now
+            elif self.isComplete():
+                # Send the final ack a few times in case one is lost
+                for i in range(3):
+                    self.ack(ser)
+                break
+            elif new or changed or not sizeKnown or now - lastAck > self.ackDelay():
+                if not new and ackSent is None:
+                    # Time this ack to the next new frame. Acks for new data
+                    # aren't timed, as more frames are already on their way
+                    ackSent = now
+                # The first ack tells a resumed transfer everything already here
+                self.ack(ser, not sizeKnown)
+                lastAck = now
+
+            if self.cancelled():
+                for i in range(3):
+                    ser.write(b'X\n')
+                self.log("Transfer cancelled with " + str(self.base()) + " of " + str(self.size) + " bytes")
+                break
+            if now - lastData > self.timeout:
+                self.log("Transfer timed out with " + str(self.base()) + " of " + str(self.size) + " bytes")
+                break
+
+
+class SimulatedLink(object):
+    """
+    The payload's end of a loopback pty, with the radio link simulated: writes
+    are paced to the baud rate and have bytes corrupted or dropped at the byte
+    error rate, and what the ground sends is only seen after the latency.
+    """
+
+    def __init__(self, fd, baud=38400, latency=0.05, byteErrorRate=0.0, seed=None):
+        self.fd = fd
+        self.bytesPerSecond = baud / 10.0
+        self.latency = latency
+        self.byteErrorRate = byteErrorRate
+        self.random = random.Random(seed)
+        self.incoming = []		# (time it can be seen, bytes)
+        self.lock = threading.Lock()
+        self.closed = False
+        self.reader = threading.Thread(target=self.readLoop)
+        self.reader.daemon = True
+        self.reader.start()
+
+    def readLoop(self):
+        while not self.closed:
+            ready = select.select([self.fd], [], [], 0.05)[0]
+            if ready:
+                try:
+                    data = os.read(self.fd, 4096)
+                except OSError:
+                    break
+                with self.lock:
+                    self.incoming.append((time.time() + self.latency, data))
+
+    def read(self, timeout=0):
+        """ Returns whatever the ground sent that has arrived, waiting up to timeout for something """
+
+        end = time.time() + timeout
+        while True:
+            with self.lock:
+                now = time.time()
+                data = b''.join(d for t, d in self.incoming if t <= now)
+                self.incoming = [(t, d) for t, d in self.incoming if t > now]
+            if data or time.time() >= end:
+                return data
+            time.sleep(0.005)
+
+    def damage(self, data):
+        if self.byteErrorRate <= 0:
+            return data
+        data = bytearray(data)
+        i = 0
+        out = bytearray()
+        while True:
+            # Distance to the next damaged byte
+            step = int(self.random.expovariate(self.byteErrorRate)) if self.byteErrorRate < 1 else 0
+            if i + step >= len(data):
+                out += data[i:]
+                return bytes(out)
+            out += data[i:i + step]
+            if self.random.random() < 0.5:
+                out.append(data[i + step] ^ (1 << self.random.randrange(8)))		# Bit flip
+            i += step + 1		# Otherwise the byte is dropped
+
+    def write(self, data):
+        data = self.damage(data)
+        for i in range(0, len(data), 256):
+            os.write(self.fd, data[i:i + 256])
+            time.sleep(len(data[i:i + 256]) / self.bytesPerSecond)
+
+    def close(self):
+        self.closed = True
+
+
+class StopAndWaitSender(object):
+    """ Stand-in for the Pi side of the original protocol """
+
+    def __init__(self, link, data, wordlength=8000, timeout=30):
+        self.link = link
+        self.data = data
+        self.wordlength = wordlength
+        self.timeout = timeout
+
+    def waitFor(self, byte):
+        end = time.time() + self.timeout
+        received = b''
+        while time.time() < end:
+            received += self.link.read(0.1)
+            for reply in received:
+                if bytes([reply]) in byte:
+                    return bytes([reply])
+            received = b''
+        return None
+
+    def run(self):
+        self.link.write(str(len(self.data)).encode('ascii') + b'\n')
+        pos = 0
+        while pos < len(self.data):
+            word = self.data[pos:pos + self.wordlength]
+            self.link.write(hashlib.md5(word).hexdigest().encode('ascii') + word)
+            reply = self.waitFor(b'YN')
+            if reply == b'Y':
+                pos += self.wordlength
+            elif reply == b'N':
+                # Resync, then send the word again
+                self.link.write(b'sync')
+                if self.waitFor(b'S') is None:
+                    return
+                time.sleep(self.link.latency)
+            else:
+                return
+
+
+class SelectiveRepeatSender(object):
+    """
+    The payload side of the selective repeat protocol, and the reference for
+    the Pi's. image is the picture's bytes; it is sent as they are if the
+    ground asks for binary mode and binary is allowed, and as base64 otherwise
+    """
+
+    def __init__(self, link, image, chunkSize=1000, window=16, timeout=1.0, giveUp=30, binary=True):
+        self.link = link
+        self.image = image
+        self.allowBinary = binary		# False acts like a payload that only knows text mode
+        self.binary = False
+        self.data = None
+        self.chunkSize = chunkSize		# The ground's handshake and acks set this
+        self.window = window		# The ground's handshake can lower this
+        self.timeout = timeout		# Send a chunk again if it isn't acked in this long
+        self.giveUp = giveUp
+
+    def send(self, offset, length):
+        chunk = self.data[offset:offset + length]
+        self.link.write(binaryDataFrame(offset, chunk) if self.binary else dataFrame(offset, chunk))
+        return len(chunk)
+
+    def run(self):
+        size = 0
+        acked = []		# Byte ranges the ground has
+        outstanding = {}		# offset -> (length, time sent)
+        nextOffset = 0
+        received = b''
+        lastHeard = time.time()
+        started = False
+        synced = False		# Heard an ack since the info frame
+        while time.time() - lastHeard < self.giveUp:
+            received += self.link.read(0 if started else 0.1)
+            for match in HANDSHAKE.finditer(received):
+                # (Re)start: the ground hasn't seen the info frame yet
+                if match.group(1) == b'B' and not self.allowBinary:
+                    continue
+                self.binary = match.group(1) == b'B'
+                self.data = self.image if self.binary else base64.b64encode(self.image)
+                size = len(self.data)
+                acked = []
+                outstanding = {}
+                nextOffset = 0
+                self.window = min(self.window, int(match.group(2), 16))
+                self.chunkSize = int(match.group(3), 16)
+                if self.binary:
+                    self.link.write(binaryInfoFrame(size, self.chunkSize))
+                else:
+                    self.link.write(infoFrame(size, self.chunkSize))
+                started = True
+                synced = False
+                lastHeard = time.time()
+            for match in ACK_FRAME.finditer(received):
+                acked = addRange(acked, 0, int(match.group(1), 16))
+                self.chunkSize = int(match.group(2), 16)
+                blocks = match.group(3)
+                for i in range(0, len(blocks), 16):
+                    acked = addRange(acked, int(blocks[i:i + 8], 16), int(blocks[i + 8:i + 16], 16))
+                synced = True
+                lastHeard = time.time()
+            if b'X\n' in received:
+                return		# The ground cancelled
+            if b'\n' in received:
+                received = received[received.rfind(b'\n') + 1:]
+            if not started:
+                continue
+            if not synced and time.time() - lastHeard < self.timeout:
+                # Wait for the first ack, it says what a resumed transfer still needs
+                received += self.link.read(0.02)
+                continue
+            if isCovered(acked, 0, size):
+                break
+
+            for offset in list(outstanding):
+                if isCovered(acked, offset, offset + outstanding[offset][0]):
+                    del outstanding[offset]
+
+            # Send again whatever has gone unacked too long, at the current chunk size
+            now = time.time()
+            sent = False
+            for offset in sorted(outstanding):
+                length, sentAt = outstanding[offset]
+                if now - sentAt > self.timeout:
+                    del outstanding[offset]
+                    for start in range(offset, offset + length, self.chunkSize):
+                        outstanding[start] = (self.send(start, min(self.chunkSize, offset + length - start)), time.time())
+                    sent = True
+
+            # Then new data, skipping anything the ground already has
+            while nextOffset < size and sum(l for l, t in outstanding.values()) < self.window * self.chunkSize:
+                for s, e in acked:
+                    if s <= nextOffset < e:
+                        nextOffset = e
+                if nextOffset >= size:
+                    break
+                length = self.chunkSize
+                for s, e in acked:
+                    if nextOffset < s:
+                        length = min(length, s - nextOffset)
+                        break
+                outstanding[nextOffset] = (self.send(nextOffset, length), time.time())
+                nextOffset += outstanding[nextOffset][0]
+                sent = True
+            if not sent:
+                received += self.link.read(0.02)
+
+
+def benchmark(byteErrorRate=0.0, baud=38400, latency=0.05, size=30001, seed=1):
+    """ Times the protocols over a simulated link and prints the results, in image bytes per second """
+
+    import pty
+    import tty
+    import io
+    import serial
+
+    raw = random.Random(seed).getrandbits(8 * size).to_bytes(size, 'little')
+    data = base64.b64encode(raw)
+    results = {}
+    for name in ('stop and wait', 'selective repeat', 'adaptive', 'binary', 'binary adaptive'):
+        master, slave = pty.openpty()
+        tty.setraw(slave)
+        ground = serial.Serial(os.ttyname(slave), timeout=2)
+        link = SimulatedLink(master, baud, latency, byteErrorRate, seed)
+        if name == 'stop and wait':
+            sender = StopAndWaitSender(link, data)
+            receiver = StopAndWaitReceiver(startDelay=0)
+        else:
+            sender = SelectiveRepeatSender(link, raw)
+            receiver = SelectiveRepeatReceiver(controller=ChunkSizeController() if 'adaptive' in name else None,
+                                               binary=name.startswith('binary'))
+        receiver.log = lambda text: None
+        thread = threading.Thread(target=sender.run)
+        thread.daemon = True
+        thread.start()
+
+        start = time.time()
+        image = io.BytesIO()
+        receiver.receive(ground, image)
+        elapsed = time.time() - start
+        link.close()
+        ground.close()
+        os.close(master)
+        os.close(slave)
+
+        complete = image.getvalue() == raw
+        results[name] = elapsed
+        print("%-17s %7.2f s  %6.0f B/s  %3d bad words/frames  %s" % (
+            name, elapsed, size / elapsed, receiver.failures, "complete" if complete else "INCOMPLETE"))
+    return results
+
+
+if __name__ == "__main__":
+    args = [float(arg) for arg in sys.argv[1:]]
+    benchmark(*args)
@@ -3,8 +3,89 @@ from PySide2 import QtCore, QtGui
 from PySide2.QtCore import *
 from PySide2.QtCore import Signal as pyqtSignal
 import time
+import datetime
 from time import sleep
 from BalloonUpdate import *			# Class to hold balloon info
+from TrajectoryEstimator import *	# Kalman filter for the balloon trajectory
+
+
+class DeadlineScheduler(object):
+    """
+    Ticks at a fixed cadence on the monotonic clock. Every deadline is a whole
+    number of periods after the start, so sleep jitter and the time spent
+    between ticks never accumulate as drift. Deadlines that have already passed
+    are skipped and counted instead of being run back to back.
+    """
+
+    def __init__(self, period):
+        self.period = period
+        self.start()
+
+    def start(self):
+        """ Anchors the schedule to the monotonic and wall clocks at this moment """
+        self.anchorMonotonic = time.monotonic()
+        self.anchorWall = time.time()
+        self.nextDeadline = self.anchorMonotonic + self.period
+        self.ticks = 0
+        self.missed = 0
+
+    def setPeriod(self, period):
+        """ Changes the cadence, starting from the next deadline """
+        self.nextDeadline += period - self.period
+        self.period = period
+
+    def wait(self):
+        """ Sleeps until the next deadline and returns it (monotonic seconds) """
+        now = time.monotonic()
+        if now > self.nextDeadline + self.period:
+            # Skip the deadlines we can no longer make
+            skipped = int((now - self.nextDeadline) / self.period)
+            self.missed += skipped
+            self.nextDeadline += skipped * self.period
+            print("Missed " + str(skipped) + " prediction deadline(s), " + str(self.missed) + " total")
+        if self.nextDeadline > now:
+            time.sleep(self.nextDeadline - now)
+        deadline = self.nextDeadline
+        self.nextDeadline += self.period
+        self.ticks += 1
+        return deadline
+
+    def wallTime(self, deadline):
+        """ The wall clock time (epoch seconds) of a monotonic deadline """
+        return self.anchorWall + (deadline - self.anchorMonotonic)
+
+
+class LocationHistory(object):
+    """
+    A fixed-capacity ring buffer of the most recent BalloonUpdates. Once full,
+    each new fix overwrites the oldest one, so memory stays constant over long
+    flights.
+    """
+
+    def __init__(self, capacity=32):
+        self.capacity = capacity
+        self.clear()
+
+    def clear(self):
+        self.updates = [None] * self.capacity
+        self.head = 0		# Index the next fix is written to
+        self.count = 0
+
+    def append(self, update):
+        self.updates[self.head] = update
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def last(self):
+        """ The newest fix, or None if there are none """
+
+        if self.count == 0:
+            return None
+        return self.updates[self.head - 1]
+
+    def __len__(self):
+        return self.count
+
 
 class InterpolateIridium(QtCore.QObject):
 
@@ -20,15 +101,18 @@ class InterpolateIridium(QtCore.QObject):
 
         self.ready = False
 
-        #List holding all known updates
-        self.balloonLocations = []
+        #The most recent accepted updates
+        self.balloonLocations = LocationHistory()
+
+        #Fuses the fixes from every source into a smoothed trajectory
+        self.estimator = TrajectoryEstimator()
 
         #Panning Characteristics
         self.updateSpeed = 2    #in seconds
         self.latSpeed = 0       #in seconds
         self.lonSpeed = 0       #in seconds
         self.altSpeed = 0       #in seconds
-        self.ticksSinceLastLocation = 0
+        self.scheduler = DeadlineScheduler(self.updateSpeed)
 
         #Emitted Signals
         self.mainWindow.iridiumInterpolateNewLocation.connect(
@@ -37,62 +121,62 @@ class InterpolateIridium(QtCore.QObject):
     def run(self):
         """ Interpolates Iridium tracking information to provide smoother tracking """
         self.interpolateInterrupt = False
+        self.scheduler.start()
         
         while(not self.interpolateInterrupt):
-            time.sleep(self.updateSpeed) #update frequency
+            deadline = self.scheduler.wait() #update frequency
             
             if self.ready:
                 print("Moving at " + "latSpeed: " + str(self.latSpeed) + " lonSpeed: " + str(self.lonSpeed) + " altSpeed: " + str(self.altSpeed))
-                self.ticksSinceLastLocation += 1
-                # Add speeds*ticks to last known location
-                simulatedTime = self.balloonLocations[len(self.balloonLocations)-1].getTime() #keep same timestamp -- meh?
-
-                # Add last known location value + (speed per second) * (update speed in seconds) * ticks
-                simulatedSeconds = self.balloonLocations[len(self.balloonLocations)-1].getSeconds() + (self.updateSpeed * self.ticksSinceLastLocation)#Add updateSpeed * ticks for new seconds
-                simulatedLat = self.balloonLocations[len(self.balloonLocations)-1].getLat() + (self.latSpeed * self.updateSpeed * self.ticksSinceLastLocation)
-                simulatedLon = self.balloonLocations[len(self.balloonLocations)-1].getLon() + (self.lonSpeed * self.updateSpeed * self.ticksSinceLastLocation)
-                simulatedAlt = self.balloonLocations[len(self.balloonLocations)-1].getAlt() + (self.altSpeed * self.updateSpeed * self.ticksSinceLastLocation)
+                # Stamp the prediction with the UTC time of the deadline it was made for
+                target = datetime.datetime.utcfromtimestamp(self.scheduler.wallTime(deadline))
+                simulatedTime = target.strftime('%H:%M:%S')
+                simulatedSeconds = target.hour * 3600 + target.minute * 60 + target.second + target.microsecond / 1000000.0
+
+                # Ask the estimator where the balloon is at that time
+                simulatedLat, simulatedLon, simulatedAlt, self.latSpeed, self.lonSpeed, self.altSpeed = \
+                    self.estimator.predict(simulatedSeconds)
                 # Make new location object
                 print("Simulated Location Update>>> " + "lat: " + str(simulatedLat) + " lon: " + str(simulatedLon) + " alt: " + str(simulatedAlt) + "\n")
                 simulatedLocation = BalloonUpdate(simulatedTime, simulatedSeconds, simulatedLat, simulatedLon, simulatedAlt,
-                                            "Iridium", self.mainWindow.groundLat, self.mainWindow.groundLon, self.mainWindow.groundAlt)
+                                            "Prediction", self.mainWindow.groundLat, self.mainWindow.groundLon, self.mainWindow.groundAlt)
                 # Notify main GUI of new location request
                 self.mainWindow.iridiumInterpolateNewLocation.emit(simulatedLocation)
             QCoreApplication.processEvents()
             
     def addPosition(self, update):
-         # Make sure it's a good location
+        # Only fixes from the tracking methods in use
+        if not self.mainWindow.tracker.usesMethod(update.getTrackingMethod()):
+            return
+
+        # Make sure it's a good location
         # Don't consider updates with bad info to be new updates
         if ((update.getLat() == 0.0) or (update.getLon() == 0.0) or (update.getAlt() == 0.0)):
             return
 
-        # Makes sure it's the newest location
-        if len(self.balloonLocations) >= 1 and update.getSeconds() <= self.balloonLocations[len(self.balloonLocations) - 1].getSeconds():
+        # Fixes from every source go into the estimator, which drops any that
+        # are older than what it already has
+        if not self.estimator.update(update):
             return
 
-        
-        self.ticksSinceLastLocation = 0
-        self.balloonLocations.append(update)
-        if len(self.balloonLocations) >= 2:
+        last = self.balloonLocations.last()
+        if last is None or update.getSeconds() > last.getSeconds():
+            self.balloonLocations.append(update)
+        if self.estimator.isReady():
             self.interpolate()
 
     def interpolate(self):
         print("-------NEW PREDICTION-------")
-        #Simple prediction
-        self.latDiff = self.balloonLocations[len(self.balloonLocations) - 1].getLat() - self.balloonLocations[len(self.balloonLocations) - 2].getLat()
-        self.lonDiff = self.balloonLocations[len(self.balloonLocations) - 1].getLon() - self.balloonLocations[len(self.balloonLocations) - 2].getLon()
-        self.altDiff = self.balloonLocations[len(self.balloonLocations) - 1].getAlt() - self.balloonLocations[len(self.balloonLocations) - 2].getAlt()
-        self.timeDiff = self.balloonLocations[len(self.balloonLocations) - 1].getSeconds() - self.balloonLocations[len(self.balloonLocations) - 2].getSeconds()
-
-        print("latDiff: " + str(self.latDiff))
-        print("lonDiff: " + str(self.lonDiff))
-        print("altDiff: " + str(self.altDiff))
-        print("timeDiff : " + str(self.timeDiff) + "\n")
-        print("----------------------------")
-        self.latSpeed = self.latDiff / self.timeDiff
-        self.lonSpeed = self.lonDiff / self.timeDiff
-        self.altSpeed = self.altDiff / self.timeDiff    
-        
+        #Smoothed position and velocity at the newest fix
+        lastSeconds = self.balloonLocations.last().getSeconds()
+        lat, lon, alt, self.latSpeed, self.lonSpeed, self.altSpeed = self.estimator.predict(lastSeconds)
+
+        print("lat: " + str(lat) + " lon: " + str(lon) + " alt: " + str(alt))
+        print("latSpeed: " + str(self.latSpeed))
+        print("lonSpeed: " + str(self.lonSpeed))
+        print("altSpeed: " + str(self.altSpeed))
+        print("----------------------------\n")
+
         self.ready = True
 
     def interrupt(self):
@@ -101,5 +185,6 @@ class InterpolateIridium(QtCore.QObject):
 
     def setUpdateSpeed(self, speed):
         self.updateSpeed = speed
+        self.scheduler.setPeriod(speed)
         print("Set update speed to: " + str(self.updateSpeed))
 
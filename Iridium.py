@@ -0,0 +1,330 @@
+import json
+import time
+
+try:
+    # For Python 3.0 and later
+    import http.client as httplib
+except ImportError:
+    # Fall back to Python 2's httplib
+    import httplib
+
+FEET_PER_METER = 3.280839895
+
+
+class IridiumApi(object):
+    """
+    Client for the Iridium web API that keeps one TCP connection open between
+    polls. Requests are conditional on the ETag/Last-Modified of the previous
+    response, and a body identical to the last one is treated as unchanged, so
+    a fix that hasn't changed is never parsed twice.
+    """
+
+    def __init__(self, host="eclipse.rci.montana.edu", path="/php/antennaTracker.php", port=80, timeout=5):
+        self.host = host
+        self.path = path
+        self.port = port
+        # Timeout may be redundant, if port 80 is timing out, port 3306 will
+        # probably also
+        self.timeout = timeout
+        self.connection = None
+        self.etag = None
+        self.lastModified = None
+        self.lastBody = None
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def request(self, imei):
+        """ Makes one GET on the kept-alive connection and returns (status, headers, body) """
+
+        if self.connection is None:
+            self.connection = httplib.HTTPConnection(
+                self.host, self.port, timeout=self.timeout)
+        headers = {"Connection": "keep-alive"}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.lastModified:
+            headers["If-Modified-Since"] = self.lastModified
+        self.connection.request("GET", "%s?imei=%s" % (self.path, imei), headers=headers)
+        response = self.connection.getresponse()
+        body = response.read()		# Read it all so the connection can be reused
+        if response.getheader("Connection", "").lower() == "close":
+            self.close()
+        return response.status, response, body
+
+    def fetch(self, imei):
+        """
+        Returns the newest fix as a dict, None if it hasn't changed since the
+        last call, or {} if the API couldn't be reached
+        """
+
+        # A kept-alive connection may have been dropped by the server since the
+        # last poll, so retry once on a fresh one
+        for attempt in range(2):
+            try:
+                status, response, body = self.request(imei)
+                break
+            except Exception:
+                self.close()
+        else:
+            return {}
+
+        if status == 304:
+            return None
+        if status != 200:
+            return {}
+        self.etag = response.getheader("ETag")
+        self.lastModified = response.getheader("Last-Modified")
+        if body == self.lastBody:
+            return None
+        try:
+            data = json.loads(body.decode("utf-8"))
+        except ValueError:
+            return {}
+        if not data:
+            return {}
+        self.lastBody = body
+        return data
+
+
+class IridiumDatabase(object):
+    """
+    One long-lived connection to the Iridium SQL database. The connection is
+    pinged when it has sat idle, reconnected with exponential backoff when it
+    drops, and queried with parameters rather than formatted SQL. Only rows
+    newer than the last pri_key seen are fetched.
+    """
+
+    COLUMNS = "pri_key,gps_fltDate,gps_time,gps_lat,gps_long,gps_alt"
+
+    def __init__(self, host, user, password, name, connector=None, maxAttempts=20, maxBackoff=30, healthInterval=60):
+        self.host = host
+        self.user = user
+        self.password = password
+        self.name = name
+        self.connector = connector		# Makes a DB-API connection, MySQLdb by default
+        self.maxAttempts = maxAttempts
+        self.maxBackoff = maxBackoff
+        self.healthInterval = healthInterval		# Ping after this many idle seconds
+        self.connection = None
+        self.failures = 0
+        self.nextAttempt = 0
+        self.lastUsed = 0
+        self.lastKey = None
+
+    def connect(self):
+        if self.connector is not None:
+            return self.connector()
+        import MySQLdb		# Only needed once the web API has failed
+        return MySQLdb.connect(host=self.host, user=self.user, passwd=self.password, db=self.name)
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except Exception:
+                pass
+            self.connection = None
+
+    def retryDelay(self):
+        """ Seconds until the next reconnect attempt is allowed """
+        return max(0, self.nextAttempt - time.monotonic())
+
+    def ensureConnected(self):
+        """ Returns True once there is a healthy connection, without waiting out the backoff """
+
+        if self.connection is not None and time.monotonic() - self.lastUsed > self.healthInterval:
+            try:
+                cursor = self.connection.cursor()
+                cursor.execute("SELECT 1")
+                cursor.fetchall()
+                cursor.close()
+                self.lastUsed = time.monotonic()
+            except Exception:
+                print("Lost the database connection")
+                self.close()
+        if self.connection is not None:
+            return True
+
+        if time.monotonic() < self.nextAttempt:
+            return False
+        try:
+            self.connection = self.connect()
+        except Exception:
+            self.failures += 1
+            self.nextAttempt = time.monotonic() + min(self.maxBackoff, 2 ** (self.failures - 1))
+            return False
+        self.failures = 0
+        self.lastUsed = time.monotonic()
+        return True
+
+    def query(self, sql, params):
+        try:
+            cursor = self.connection.cursor()
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+            cursor.close()
+            # End the read transaction, otherwise a long-lived InnoDB connection
+            # keeps seeing the snapshot it started with and never a new row
+            self.connection.commit()
+        except Exception:
+            self.close()
+            raise
+        self.lastUsed = time.monotonic()
+        if rows:
+            self.lastKey = rows[-1][0]
+        return rows
+
+    def newRows(self, imei):
+        """ Rows for the IMEI newer than the last one seen, oldest first (just the newest on the first call) """
+
+        if self.lastKey is None:
+            return self.query("SELECT " + self.COLUMNS + " FROM gps WHERE gps_IMEI = %s "
+                              "ORDER BY pri_key DESC LIMIT 1", (imei,))
+        return self.query("SELECT " + self.COLUMNS + " FROM gps WHERE gps_IMEI = %s AND pri_key > %s "
+                          "ORDER BY pri_key ASC", (imei, self.lastKey))
+
+    def backfill(self, imei):
+        """ Every row for the IMEI, oldest first """
+
+        return self.query("SELECT " + self.COLUMNS + " FROM gps WHERE gps_IMEI = %s "
+                          "ORDER BY pri_key ASC", (imei,))
+
+
+def rowToFix(row):
+    """ Makes a (remoteTime, seconds, lat, lon, alt) fix from a row of the gps table, with alt in feet """
+
+    remoteTime = row[2]
+    hours, minutes, seconds = remoteTime.split(":")
+    remoteSeconds = int(seconds) + (60 * int(minutes)) + (3600 * int(hours))
+    return (remoteTime, remoteSeconds, float(row[3]), float(row[4]), float(row[5]) * FEET_PER_METER)
+
+
+def rowsToFixes(rows):
+    """ The fixes from rows of the gps table, skipping any that can't be parsed """
+
+    fixes = []
+    for row in rows:
+        try:
+            fixes.append(rowToFix(row))
+        except (IndexError, ValueError, AttributeError):
+            print(
+                "ERROR PARSING DATA FROM DATABASE: Cannot parse data or data may not exist, please double check your IMEI number")
+    return fixes
+
+
+def apiToFix(data):
+    """ Makes a (remoteTime, seconds, lat, lon, alt) fix from a web API response """
+
+    remoteSeconds = int(data['remoteSeconds']) + (60 * int(data['remoteMinutes'])) + \
+        (3600 * int(data['remoteHours']))
+    return (data['remoteTime'], remoteSeconds, float(data['remoteLat']),
+            float(data['remoteLon']), float(data['remoteAlt']))
+
+
+class IridiumPoller(object):
+    """
+    Polls for new Iridium fixes, from the web API when it answers and from the
+    database when it doesn't. Polling is adaptive: every fastPoll seconds once
+    the next fix is due (fixInterval seconds after the last one arrived), and
+    every slowPoll seconds in between. Without a database password (None) only
+    the web API is used. It doesn't depend on Qt, so the GUI and the tracker
+    daemon both use it.
+    """
+
+    def __init__(self, host, user, password, name, IMEI, fixInterval=60, fastPoll=1, slowPoll=10, backfill=False):
+        self.IMEI = IMEI
+        self.api = IridiumApi()
+        self.database = IridiumDatabase(host, user, password, name) if password is not None else None
+        self.backfill = backfill		# Pull the whole track from the database at startup
+        self.fixInterval = fixInterval
+        self.fastPoll = fastPoll
+        self.slowPoll = slowPoll
+        self.lastFixArrival = None
+        self.failed = False		# Set once the database has failed too many times
+
+    def setPolling(self, fixInterval, fastPoll, slowPoll):
+        self.fixInterval = fixInterval
+        self.fastPoll = fastPoll
+        self.slowPoll = slowPoll
+
+    def start(self):
+        """ Returns the whole track so far from the database if backfilling, oldest first. Call before polling """
+
+        if not self.backfill:
+            return []
+        if self.database is None:
+            print("No Iridium database password, so the track so far can't be loaded")
+            return []
+        if not self.database.ensureConnected():
+            print("ERROR: Unable to connect to database, the track so far wasn't loaded")
+            return []
+        try:
+            # Bring the whole track in with one query
+            rows = self.database.backfill(self.IMEI)
+        except Exception as e:
+            print("ERROR: Database query failed: " + str(e))
+            return []
+        # These are old fixes, so they don't count toward when the next is due
+        fixes = rowsToFixes(rows)
+        print("Loaded " + str(len(fixes)) + " Iridium fixes from the database")
+        return fixes
+
+    def pollDelay(self):
+        """ Seconds to wait before the next poll of the web API """
+
+        if self.lastFixArrival is None:
+            return self.fastPoll
+        untilDue = self.lastFixArrival + self.fixInterval - time.monotonic()
+        if untilDue <= 0:
+            return self.fastPoll
+        # Wake up no later than when the next fix is due
+        return max(self.fastPoll, min(self.slowPoll, untilDue))
+
+    def poll(self):
+        """ Returns any new fixes, oldest first """
+
+        data = self.api.fetch(self.IMEI)
+        if data is None:
+            # Same fix as last time, nothing to do
+            return []
+        if data:
+            self.lastFixArrival = time.monotonic()
+            # The API is up to date, so the next fallback starts from the
+            # newest row, rather than replaying every row stored meanwhile
+            if self.database is not None:
+                self.database.lastKey = None
+            try:
+                return [apiToFix(data)]
+            except (KeyError, ValueError):
+                print("Error parsing Iridium Data from the web API")
+                return []
+
+        # The API is unavailable, so use the database
+        if self.database is None:
+            return []
+        if not self.database.ensureConnected():
+            if self.database.failures >= self.database.maxAttempts:
+                print("Failed to connect to database too many times")
+                self.failed = True
+            else:
+                print("ERROR: Unable to connect to database! Retrying in " +
+                      str(round(self.database.retryDelay(), 1)) + " sec")
+            return []
+
+        try:
+            rows = self.database.newRows(self.IMEI)
+        except Exception as e:
+            print("ERROR: Database query failed: " + str(e))
+            return []
+        fixes = rowsToFixes(rows)
+        if fixes:
+            self.lastFixArrival = time.monotonic()
+        return fixes
+
+    def close(self):
+        self.api.close()
+        if self.database is not None:
+            self.database.close()
@@ -1,4 +1,5 @@
 import math
+import numpy as np
 
 
 def bearing(trackerLat, trackerLon, remoteLat, remoteLon):
@@ -47,3 +48,168 @@ def losDistance(alt, trackerAlt, distance):
     """ The line of sight distance based on ground distance and altitude """
 
     return math.sqrt(math.pow(distance / 3.2808, 2) + math.pow((alt - trackerAlt) / 3.2808, 2)) / 1000
+
+
+### Batch versions of the pointing math, for replaying whole flight logs ###
+# These take numpy arrays of remote positions and return arrays of results,
+# so a log can be re-pointed in one call instead of one BalloonUpdate per fix
+
+def bearingArray(trackerLat, trackerLon, remoteLat, remoteLon):
+    """ great circle bearing for arrays of remote positions, see bearing() """
+
+    trackerLat = np.radians(trackerLat)
+    remoteLat = np.radians(np.asarray(remoteLat, dtype=float))
+    dLon = np.radians(np.asarray(remoteLon, dtype=float) - trackerLon)
+
+    y = np.sin(dLon) * np.cos(remoteLat)
+    x = np.cos(trackerLat) * np.sin(remoteLat) - \
+        np.sin(trackerLat) * np.cos(remoteLat) * np.cos(remoteLat - trackerLat)
+    # returns the bearing from true north, between 0 and 360
+    return np.mod(np.degrees(np.arctan2(y, x)), 360)
+
+
+def elevationAngleArray(skyAlt, trackerAlt, distance):
+    """ elevation angles from arrays of ground distances and altitudes """
+
+    return np.degrees(np.arctan2(np.asarray(skyAlt, dtype=float) - trackerAlt, distance))
+
+
+def haversineArray(trackerLat, trackerLon, remoteLat, remoteLon):
+    """ haversine formula for arrays of remote positions, returns feet """
+
+    R = 6371		# radius of earth in Km
+    remoteLat = np.asarray(remoteLat, dtype=float)
+    dLat = np.radians(remoteLat - trackerLat)
+    dLon = np.radians(np.asarray(remoteLon, dtype=float) - trackerLon)
+
+    a = np.sin(dLat / 2) ** 2 + math.cos(math.radians(trackerLat)) * \
+        np.cos(np.radians(remoteLat)) * np.sin(dLon / 2) ** 2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+    return R * c * 3280.839895  # multiply distance in Km by 3280 for feet
+
+
+def losDistanceArray(alt, trackerAlt, distance):
+    """ line of sight distances (km) from arrays of ground distances and altitudes """
+
+    return np.hypot(np.asarray(distance, dtype=float) / 3.2808,
+                    (np.asarray(alt, dtype=float) - trackerAlt) / 3.2808) / 1000
+
+
+def pointingArrays(trackerLat, trackerLon, trackerAlt, remoteLat, remoteLon, remoteAlt):
+    """ Returns (bearing, elevation, line of sight) arrays for arrays of remote positions """
+
+    distance = haversineArray(trackerLat, trackerLon, remoteLat, remoteLon)
+    bear = bearingArray(trackerLat, trackerLon, remoteLat, remoteLon)
+    ele = elevationAngleArray(remoteAlt, trackerAlt, distance)
+    los = losDistanceArray(remoteAlt, trackerAlt, distance)
+    return bear, ele, los
+
+
+### Ground station anchored pointing ###
+# WGS84 ellipsoid constants
+WGS84_A = 6378137.0			# semi-major axis in meters
+WGS84_E2 = 6.69437999014e-3		# first eccentricity squared
+FEET_PER_METER = 3.280839895
+
+
+def geodeticToEcef(lat, lon, alt):
+    """ Converts latitude and longitude in degrees, and altitude in feet, to ECEF meters """
+
+    lat = math.radians(lat)
+    lon = math.radians(lon)
+    alt = alt / FEET_PER_METER
+    sinLat = math.sin(lat)
+    cosLat = math.cos(lat)
+    N = WGS84_A / math.sqrt(1 - WGS84_E2 * sinLat * sinLat)
+    return ((N + alt) * cosLat * math.cos(lon),
+            (N + alt) * cosLat * math.sin(lon),
+            (N * (1 - WGS84_E2) + alt) * sinLat)
+
+
+class PointingSolver(object):
+    """
+    Pointing math bound to a single ground station. The station's sin/cos, ECEF
+    position and ECEF -> ENU rotation are computed once, so each fix only costs
+    one coordinate conversion and a rotation. Elevation comes from the local
+    east/north/up vector, so it accounts for the curvature of the earth.
+    """
+
+    def __init__(self, groundLat, groundLon, groundAlt):
+        self.groundLat = groundLat
+        self.groundLon = groundLon
+        self.groundAlt = groundAlt
+
+        lat = math.radians(groundLat)
+        lon = math.radians(groundLon)
+        self.sinLat = math.sin(lat)
+        self.cosLat = math.cos(lat)
+        self.sinLon = math.sin(lon)
+        self.cosLon = math.cos(lon)
+        self.x0, self.y0, self.z0 = geodeticToEcef(groundLat, groundLon, groundAlt)
+
+        # Rows of the ECEF -> ENU rotation matrix
+        self.east = (-self.sinLon, self.cosLon, 0.0)
+        self.north = (-self.sinLat * self.cosLon, -self.sinLat * self.sinLon, self.cosLat)
+        self.up = (self.cosLat * self.cosLon, self.cosLat * self.sinLon, self.sinLat)
+        self.rotation = np.array([self.east, self.north, self.up])
+
+    def isStation(self, groundLat, groundLon, groundAlt):
+        """ Returns True if this solver is bound to the given ground station """
+
+        return groundLat == self.groundLat and groundLon == self.groundLon and groundAlt == self.groundAlt
+
+    def enu(self, lat, lon, alt):
+        """ East, north and up offsets in meters from the ground station to the remote position """
+
+        x, y, z = geodeticToEcef(lat, lon, alt)
+        dx = x - self.x0
+        dy = y - self.y0
+        dz = z - self.z0
+        e = self.east[0] * dx + self.east[1] * dy
+        n = self.north[0] * dx + self.north[1] * dy + self.north[2] * dz
+        u = self.up[0] * dx + self.up[1] * dy + self.up[2] * dz
+        return e, n, u
+
+    def solve(self, lat, lon, alt):
+        """ Returns the bearing (degrees from true north), elevation angle (degrees) and slant range (km) """
+
+        e, n, u = self.enu(lat, lon, alt)
+        horizontal = math.sqrt(e * e + n * n)
+        bear = math.degrees(math.atan2(e, n)) % 360
+        ele = math.degrees(math.atan2(u, horizontal))
+        los = math.sqrt(horizontal * horizontal + u * u) / 1000
+        return bear, ele, los
+
+    def solveArrays(self, lats, lons, alts):
+        """ Returns (bearing, elevation, slant range) arrays for arrays of remote positions """
+
+        lats = np.radians(np.asarray(lats, dtype=float))
+        lons = np.radians(np.asarray(lons, dtype=float))
+        alts = np.asarray(alts, dtype=float) / FEET_PER_METER
+        sinLat = np.sin(lats)
+        cosLat = np.cos(lats)
+        N = WGS84_A / np.sqrt(1 - WGS84_E2 * sinLat * sinLat)
+        ecef = np.array([(N + alts) * cosLat * np.cos(lons) - self.x0,
+                         (N + alts) * cosLat * np.sin(lons) - self.y0,
+                         (N * (1 - WGS84_E2) + alts) * sinLat - self.z0])
+        e, n, u = self.rotation.dot(ecef)
+        horizontal = np.hypot(e, n)
+        bear = np.mod(np.degrees(np.arctan2(e, n)), 360)
+        ele = np.degrees(np.arctan2(u, horizontal))
+        los = np.hypot(horizontal, u) / 1000
+        return bear, ele, los
+
+
+currentSolver = None
+
+
+def getSolver(groundLat, groundLon, groundAlt):
+    """ Returns a PointingSolver for the ground station, only rebuilding it when the station moves """
+
+    global currentSolver
+    solver = currentSolver
+    if solver is None or not solver.isStation(groundLat, groundLon, groundAlt):
+        solver = PointingSolver(groundLat, groundLon, groundAlt)
+        currentSolver = solver
+    return solver
@@ -13,7 +13,13 @@ from PySide2.QtCore import *
 from PySide2.QtCore import Signal as pyqtSignal
 
 from BalloonUpdate import *
+from RfdLink import *
+from RfdTelemetry import *
 import threading
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 
 
 class RfdListen(QtCore.QObject):
@@ -25,10 +31,12 @@ class RfdListen(QtCore.QObject):
 
     def __init__(self, MainWindow, RFD):
         super(RfdListen, self).__init__()
-        self.rfdSer = RFD
+        self.rfdLink = RFD		# Telemetry lines are subscribed to on the shared RfdLink
         self.mainWindow = MainWindow
         self.interrupt = False
         self.identifier = ''
+        self.lines = queue.Queue()		# Lines from the serial reader thread
+        self.parser = TelemetryParser()
 
         # Emitted Signals
         self.mainWindow.rfdListenNewText.connect(
@@ -41,56 +49,36 @@ class RfdListen(QtCore.QObject):
         """ Listens to the RFD serial port until interrupted """
 
         ### Loop until interrupted; handle anything received by the RFD ###
-        self.rfdSer.flushInput()
+        self.lines = queue.Queue()
+        self.rfdLink.subscribe(self.lines.put)
         while not self.interrupt:
-            QtGui.QApplication.processEvents()
-            line = str(self.rfdSer.readline())
+            QCoreApplication.processEvents()
+            try:
+                line = self.lines.get(timeout=0.1)
+            except queue.Empty:
+                continue
             # If the line received has the GPS identifier, handle it as a newly
             # received RFD balloon location update
-            if line[0:3] == "GPS" and len(line[4:].split(',')) == 7:
-                lineLst = line.split(',')
-                lineLst[0] = lineLst[0][4:]
-                lineLst[-1] = lineLst[-1][:-1]
-
-                ### Interpret the balloon location list ###
-                try:
-                    hours = lineLst[0]		# Fix taken at this time
-                    minutes = lineLst[1]		# Fix taken at this time
-                    seconds = lineLst[2]		# Fix taken at this time
-                    lat = stringToFloat(lineLst[3])		# Latitude in Degrees
-                    lon = stringToFloat(lineLst[4])		# Longitude in Degrees
-                    # Altitude in meters (sealevel)
-                    alt = stringToFloat(lineLst[5])
-                    # Number of Satellites
-                    sat = stringToFloat(lineLst[6][:-1])
-                except(Exception, e):
-                    print(str(e))
-
-                ### Do some calculations, get some values ###
-                alt = alt * 3.2808  # Convert Altitude to feet
-                gpsTime = hours + ":" + minutes + ":" + seconds.split(".")[0]
-                rfdSeconds = stringToFloat(
-                    hours) * 3600 + stringToFloat(minutes) * 60 + stringToFloat(seconds)
+            fix = self.parser.parse(line)
+            line = line.decode('ascii', 'replace')
+            if fix is not None:
+                gpsTime, rfdSeconds, lat, lon, alt, sat = fix
 
                 ### Create a new location object ###
                 try:
                     newLocation = BalloonUpdate(gpsTime, rfdSeconds, lat, lon, alt, "RFD",
                                                 self.mainWindow.groundLat, self.mainWindow.groundLon, self.mainWindow.groundAlt)
-                except(Exception, e):
-                    print(str(e))
-
-                try:
                     # Notify the main GUI of the new position
                     self.mainWindow.rfdNewLocation.emit(newLocation)
-                except(Exception, e):
+                except Exception as e:
                     print(str(e))
 
                 #self.mainWindow.rfdListenNewText.emit(datetime.datetime.today().strftime('%H:%M:%S') + " || "+line)
 
-            if(line.replace('\n', '') == self.identifier and self.identifier != ''):
+            if(line.rstrip('\r\n') == self.identifier and self.identifier != ''):
                 print('ID Found')
                 self.rfdCommand.foundIdentifier.emit(True)
-                self.identifier = ''
+                self.setIdentifier('')
 
             elif line != '':				# Send the line to the text browser if it's not empty
                 self.mainWindow.rfdListenNewText.emit(
@@ -98,6 +86,7 @@ class RfdListen(QtCore.QObject):
                 # Send it to the payload manager
                 self.mainWindow.payloadUpdate.emit(line)
 
+        self.rfdLink.unsubscribe(self.lines.put)
         self.interrupt = False
 
     def setInterrupt(self, arg):
@@ -105,8 +94,13 @@ class RfdListen(QtCore.QObject):
         self.interrupt = arg
 
     def setIdentifier(self, ID):
+        # The acknowledge is picked out of the stream even during a download
+        if self.identifier:
+            self.rfdLink.unwatchLine(self.identifier.encode('utf-8'))
         self.identifier = ID
-        print("New ID: " + self.identifier)
+        if self.identifier:
+            self.rfdLink.watchLine(self.identifier.encode('utf-8'))
+            print("New ID: " + self.identifier)
 
     def setCommand(self, command):
         self.rfdCommand = command
@@ -160,7 +154,7 @@ class RfdCommand(QtCore.QObject):
         self.mainWindow.rfdCommandNewText.emit(
             "Sending " + toSend)		# Add the message to the browser
         while not self.acknowledged:
-            QtGui.QApplication.processEvents()
+            QCoreApplication.processEvents()
             self.rfdSer.write(toSend)
             if self.interrupt:		# If the stop button is pressed, interrupt the sending
                 self.mainWindow.rfdCommandNewText.emit("Command Interrupted")
@@ -0,0 +1,293 @@
+import re
+import threading
+import itertools
+from SerialReader import *
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+class RfdChannel(object):
+    """
+    One logical channel on the RFD link. It has the read/readline/write calls
+    of a serial port, so code written against the raw port works unchanged,
+    but it only sees the bytes the link routes to it, and its writes are
+    queued on the link at the channel's priority.
+    """
+
+    def __init__(self, link, name, priority, timeout=2):
+        self.link = link
+        self.name = name
+        self.priority = priority
+        self.timeout = timeout
+        self.buffer = bytearray()
+        self.condition = threading.Condition()
+        self.queued = 0		# Writes on the link's queue not yet sent
+        self.generation = 0		# Bumped by reset_output_buffer to drop queued writes
+
+    def feed(self, data):
+        """ Called by the link with bytes routed to this channel """
+
+        with self.condition:
+            self.buffer += data
+            self.condition.notify_all()
+
+    def wait(self, ready):
+        """ Waits up to the timeout for ready() to be true, with the lock held """
+
+        return self.condition.wait_for(ready, self.timeout)
+
+    def take(self, n):
+        data = bytes(self.buffer[:n])
+        del self.buffer[:n]
+        return data
+
+    def read(self, size=1):
+        with self.condition:
+            self.wait(lambda: len(self.buffer) >= size)
+            return self.take(size)
+
+    def readline(self):
+        with self.condition:
+            self.wait(lambda: b'\n' in self.buffer)
+            end = self.buffer.find(b'\n')
+            return self.take(end + 1 if end >= 0 else len(self.buffer))
+
+    def write(self, data):
+        if not isinstance(data, (bytes, bytearray)):
+            data = str(data).encode('utf-8')
+        self.link.send(self, data)
+
+    @property
+    def in_waiting(self):
+        return len(self.buffer)
+
+    def flushInput(self):
+        with self.condition:
+            del self.buffer[:]
+
+    def flushOutput(self):
+        """ Waits until this channel's queued writes have gone out, like a serial port's flush() """
+
+        with self.condition:
+            while self.queued and self.link.writer.is_alive():
+                self.condition.wait(0.1)
+
+    def reset_output_buffer(self):
+        """ Drops this channel's writes that haven't gone out yet """
+
+        self.generation += 1
+
+    def sent(self):
+        """ Called by the link's writer once one of this channel's writes is done with """
+
+        with self.condition:
+            self.queued -= 1
+            self.condition.notify_all()
+
+    flush = flushOutput
+    reset_input_buffer = flushInput
+
+
+class RfdLink(SerialReader):
+    """
+    The single owner of the RFD serial port, shared by the listen, command and
+    still image traffic.
+
+    Received text is split into lines for the telemetry subscribers (RfdListen)
+    until a channel claims the link for an exchange with the payload, such as
+    an image download. While claimed, the raw byte stream goes to that channel,
+    except GPS lines, which are picked out and still go to the telemetry
+    subscribers, so the tracker keeps getting fixes during a transfer. Text
+    mode image data is base64 and checksums are hex, so "GPS" followed by
+    anything else can only be the start of a GPS line. Binary mode frames can
+    hold any byte but zero, which ends each frame, so while a claim is binary
+    a GPS line is only picked out where a frame could start: at the start of
+    the claim, after a zero byte, or after another GPS line. Watched lines,
+    such as the acknowledge a command is waiting for, are picked out the same
+    way, so commands still work during a download.
+
+    Writes from every channel go through one writer thread, highest priority
+    (lowest number) first.
+    """
+
+    COMMAND = 0		# Commands and acknowledges
+    IMAGE = 1		# Still image requests and bulk data
+
+    GPS_START = re.compile(b'GPS[^A-Za-z0-9+/=]')
+
+    def __init__(self, device, timeout=2, maxLine=256):
+        super(RfdLink, self).__init__(device)
+        self.timeout = timeout		# Read timeout given to the channels
+        self.maxLine = maxLine		# Longest run that can still be a GPS line
+        self.channels = {}
+        self.claimant = None
+        self.binary = False		# The claimant may be receiving binary frames
+        self.atBoundary = True		# The next claimed byte could start a frame
+        self.pending = bytearray()		# Claimed bytes not yet routed
+        self.watched = set()		# Lines picked out of a claimed stream along with GPS lines
+        self.linePattern = self.GPS_START
+        self.writeQueue = queue.PriorityQueue()
+        self.sequence = itertools.count()
+        self.writer = threading.Thread(target=self.writeLoop)
+        self.writer.daemon = True
+
+    def start(self):
+        super(RfdLink, self).start()
+        self.writer.start()
+
+    def stop(self):
+        self.writeQueue.put((-1, 0, None, 0, None))
+        super(RfdLink, self).stop()
+        if self.writer.is_alive():
+            self.writer.join()
+
+    def channel(self, name, priority):
+        """ Returns the named channel, making it if needed """
+
+        with self.lock:
+            if name not in self.channels:
+                self.channels[name] = RfdChannel(self, name, priority, self.timeout)
+            return self.channels[name]
+
+    def claim(self, channel, binary=False):
+        """ Sends the received byte stream to the channel until it's released """
+
+        channel.flushInput()
+        with self.lock:
+            self.claimant = channel
+            self.binary = binary
+            self.atBoundary = True
+
+    def watchLine(self, line):
+        """ Sends lines equal to line (bytes, without its newline) to the telemetry subscribers, even while claimed """
+
+        with self.lock:
+            self.watched.add(bytes(line))
+            self.compileLines()
+
+    def unwatchLine(self, line):
+        with self.lock:
+            self.watched.discard(bytes(line))
+            self.compileLines()
+
+    def compileLines(self):
+        patterns = [self.GPS_START.pattern] + [re.escape(line) + b'\r?\n' for line in sorted(self.watched)]
+        self.linePattern = re.compile(b'|'.join(patterns))
+
+    def setBinary(self, channel, binary):
+        """ Tells the link whether the claimant's stream may hold binary frames """
+
+        with self.lock:
+            if self.claimant is channel:
+                self.binary = binary
+
+    def release(self, channel):
+        """ Returns the received stream to the telemetry subscribers """
+
+        with self.lock:
+            if self.claimant is not channel:
+                return
+            self.claimant = None
+            self.binary = False
+            pending = bytes(self.pending)
+            del self.pending[:]
+        if pending:
+            channel.feed(pending)
+
+    def send(self, channel, data):
+        with channel.condition:
+            channel.queued += 1
+        self.writeQueue.put((channel.priority, next(self.sequence), channel, channel.generation, data))
+
+    def writeLoop(self):
+        while True:
+            priority, sequence, channel, generation, data = self.writeQueue.get()
+            if channel is None:
+                break
+            try:
+                if generation == channel.generation:		# Otherwise reset before it was sent
+                    self.device.write(data)
+            except (serial.SerialException, OSError) as e:
+                print("Serial write failed: " + str(e))
+            finally:
+                channel.sent()
+
+    def handleData(self, data):
+        with self.lock:
+            claimant = self.claimant
+            if claimant is not None:
+                self.pending += data
+        if claimant is None:
+            super(RfdLink, self).handleData(data)
+        else:
+            self.demultiplex(claimant, False)
+
+    def handleIdle(self):
+        with self.lock:
+            claimant = self.claimant
+        if claimant is not None and self.pending:
+            self.demultiplex(claimant, True)
+
+    def demultiplex(self, claimant, idle):
+        """
+        Routes the pending claimed bytes. GPS and watched lines go to the
+        telemetry subscribers and everything else to the claimant. Bytes that
+        could be the start of one are held until the line is complete, or
+        until the port goes idle, since the payload may be waiting on them.
+        """
+
+        lines = []
+        with self.lock:
+            pending = self.pending
+            while pending:
+                match = self.findLine(pending)
+                if match is None:
+                    keep = 0 if idle else self.partialStart(pending)
+                    self.route(claimant, len(pending) - keep)
+                    break
+                if match.start() > 0:
+                    self.route(claimant, match.start())
+                end = pending.find(b'\n')
+                if end < 0:
+                    if idle or len(pending) > self.maxLine:
+                        # Not a GPS line after all
+                        self.route(claimant, 3)
+                        continue
+                    break
+                lines.append(bytes(pending[:end + 1]))
+                del pending[:end + 1]
+                self.atBoundary = True
+        for line in lines:
+            self.dispatch(line)
+
+    def findLine(self, pending):
+        """ The first GPS or watched line in the pending bytes, only where a frame could start if the claim is binary """
+
+        match = self.linePattern.search(pending)
+        while match is not None and self.binary:
+            i = match.start()
+            if (pending[i - 1] == 0) if i > 0 else self.atBoundary:
+                break
+            match = self.linePattern.search(pending, i + 1)
+        return match
+
+    def route(self, claimant, n):
+        """ Gives the first n pending bytes to the claimant """
+
+        if n > 0:
+            claimant.feed(self.pending[:n])
+            self.atBoundary = self.pending[n - 1] == 0
+            del self.pending[:n]
+
+    def partialStart(self, data):
+        """ Number of bytes at the end of data that could begin a GPS or watched line """
+
+        keep = 0
+        for start in [b'GPS'] + [line + b'\r' for line in self.watched]:
+            for n in range(len(start), keep, -1):
+                if data.endswith(start[:n]):
+                    keep = n
+                    break
+        return keep
@@ -0,0 +1,97 @@
+import re
+import sys
+import time
+
+# GPS;hh,mm,ss.ss,lat,lon,alt,sats from the payload, with alt in meters
+GPS_FRAME = re.compile(
+    br'GPS[^,\r\n](\d{1,2}),(\d{1,2}),(\d{1,2}(?:\.\d*)?),'
+    br'([-+]?\d{1,3}(?:\.\d*)?),([-+]?\d{1,3}(?:\.\d*)?),([-+]?\d+(?:\.\d*)?),'
+    br'(\d{1,2})(?:\.\d*)?[^\d,\r\n]?\r?\n?\Z')
+
+FEET_PER_METER = 3.2808
+
+
+class TelemetryParser(object):
+    """
+    Parses RFD GPS telemetry frames with one precompiled regex. A frame is
+    matched, range checked and converted in a single pass, and anything that
+    isn't a valid fix is rejected without raising. Frames that start with GPS
+    but don't parse are counted as errors.
+    """
+
+    def __init__(self):
+        self.frames = 0
+        self.errors = 0
+
+    def parse(self, frame, start=0):
+        """
+        Returns (gpsTime, seconds, lat, lon, alt, sats) with alt in feet, or
+        None if the bytes at start aren't a valid GPS frame
+        """
+
+        if frame[start:start + 3] != b'GPS':
+            return None
+        match = GPS_FRAME.match(frame, start)
+        if match is None:
+            self.errors += 1
+            return None
+        hours, minutes, seconds, lat, lon, alt, sats = match.groups()
+        h = int(hours)
+        m = int(minutes)
+        s = float(seconds)
+        lat = float(lat)
+        lon = float(lon)
+        if h > 23 or m > 59 or s >= 61 or abs(lat) > 90 or abs(lon) > 180:
+            self.errors += 1
+            return None
+        self.frames += 1
+        gpsTime = "%s:%s:%s" % (hours.decode('ascii'), minutes.decode('ascii'),
+                                seconds.split(b'.')[0].decode('ascii'))
+        return (gpsTime, h * 3600 + m * 60 + s, lat, lon,
+                float(alt) * FEET_PER_METER, int(sats))
+
+    def getStats(self):
+        """ Returns the number of fixes parsed and frames rejected """
+
+        return self.frames, self.errors
+
+
+def parseLog(path, parser=None):
+    """
+    Parses every GPS frame in a captured RFD log, either raw frames or the
+    listen log's "time || frame" lines, and returns the fixes in order
+    """
+
+    if parser is None:
+        parser = TelemetryParser()
+    fixes = []
+    with open(path, 'rb') as f:
+        for line in f:
+            start = line.find(b'GPS')
+            if start >= 0:
+                fix = parser.parse(line, start)
+                if fix is not None:
+                    fixes.append(fix)
+    return fixes
+
+
+def benchmark(path, repeat=5):
+    """ Parses the GPS frames of a captured log repeat times and prints the rate """
+
+    with open(path, 'rb') as f:
+        frames = [line[line.find(b'GPS'):] for line in f if b'GPS' in line]
+    parser = TelemetryParser()
+    start = time.perf_counter()
+    for i in range(repeat):
+        for frame in frames:
+            parser.parse(frame)
+    elapsed = time.perf_counter() - start
+    count = len(frames) * repeat
+    rate = count / elapsed if elapsed > 0 else 0
+    print("Parsed " + str(count) + " frames in " + str(round(elapsed, 3)) + " s (" +
+          str(int(rate)) + " frames/s), " + str(parser.errors) + " rejected")
+    return rate
+
+
+if __name__ == "__main__":
+    benchmark(sys.argv[1])
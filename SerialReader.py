@@ -0,0 +1,261 @@
+import time
+import threading
+import serial
+
+
+class SerialDevice:
+    """ A class to manage serial devices """
+
+    def __init__(self, port, baud, timeout):
+        self.port = port
+        self.baud = baud
+        self.timeout = timeout
+        self.device = serial.Serial(
+            port=self.port, baudrate=self.baud, timeout=self.timeout)
+
+    def getPort(self):
+        return self.port
+
+    def getBaud(self):
+        return self.baud
+
+    def getTimeout(self):
+        return self.timeout
+
+    def getDevice(self):
+        return self.device
+
+
+class ByteRing(object):
+    """
+    A fixed-size circular byte buffer. Incoming chunks are copied in with at
+    most two slice assignments, and frames are found with bytearray.find over
+    the filled region, so nothing is handled a byte at a time. If the reader
+    falls behind by more than the capacity, the oldest bytes are dropped and
+    counted.
+    """
+
+    def __init__(self, capacity=65536):
+        self.capacity = capacity
+        self.buffer = bytearray(capacity)
+        self.view = memoryview(self.buffer)
+        self.start = 0		# Index of the oldest unread byte
+        self.length = 0		# Number of unread bytes
+        self.scanned = 0	# Unread bytes already searched for a delimiter
+        self.dropped = 0
+
+    def write(self, data):
+        """ Copies a chunk of bytes into the buffer """
+
+        n = len(data)
+        if n >= self.capacity:
+            # Only the newest capacity bytes can be kept
+            self.dropped += self.length + n - self.capacity
+            data = data[n - self.capacity:]
+            n = self.capacity
+            self.start = 0
+            self.length = 0
+            self.scanned = 0
+        overflow = self.length + n - self.capacity
+        if overflow > 0:
+            self.dropped += overflow
+            self.discard(overflow)
+
+        end = (self.start + self.length) % self.capacity
+        first = min(n, self.capacity - end)
+        self.view[end:end + first] = data[:first]
+        if first < n:
+            self.view[:n - first] = data[first:]
+        self.length += n
+
+    def discard(self, n):
+        """ Drops the oldest n unread bytes """
+
+        self.start = (self.start + n) % self.capacity
+        self.length -= n
+        self.scanned = max(0, self.scanned - n)
+
+    def find(self, delimiter):
+        """ Offset of the first delimiter from the oldest unread byte, or -1 """
+
+        begin = self.start + self.scanned
+        end = self.start + self.length
+        if end <= self.capacity:
+            i = self.buffer.find(delimiter, begin, end)
+            return i - self.start if i >= 0 else -1
+        # The unread bytes wrap around the end of the buffer
+        if begin < self.capacity:
+            i = self.buffer.find(delimiter, begin, self.capacity)
+            if i >= 0:
+                return i - self.start
+            begin = self.capacity
+        i = self.buffer.find(delimiter, begin - self.capacity, end - self.capacity)
+        return i + self.capacity - self.start if i >= 0 else -1
+
+    def peek(self, n):
+        """ A copy of the oldest n unread bytes """
+
+        end = self.start + n
+        if end <= self.capacity:
+            return bytes(self.view[self.start:end])
+        return bytes(self.view[self.start:]) + bytes(self.view[:end - self.capacity])
+
+    def readFrame(self, delimiter=b'\n'):
+        """ Removes and returns the oldest complete frame, delimiter included, or None """
+
+        i = self.find(delimiter)
+        if i < 0:
+            self.scanned = self.length		# Don't search these bytes again
+            return None
+        frame = self.peek(i + len(delimiter))
+        self.discard(i + len(delimiter))
+        self.scanned = 0
+        return frame
+
+    def clear(self):
+        self.start = 0
+        self.length = 0
+        self.scanned = 0
+
+    def __len__(self):
+        return self.length
+
+
+class MarkerScanner(object):
+    """
+    Gets a framed protocol back in step after an error by reading up to a
+    marker. It works on a serial port or anything with the same read and
+    in_waiting, such as an RfdChannel. Whatever is waiting is read at once
+    and searched with bytes.find, and only the last len(marker) - 1 bytes
+    of each read are kept, in case the marker is split across reads. The
+    bytes before the marker are discarded and counted. The bytes after it
+    are left in leftover for the caller, rather than flushed.
+    """
+
+    def __init__(self, marker, timeout=5, chunk=4096):
+        self.marker = marker
+        self.timeout = timeout		# Give up if the marker hasn't come in this long
+        self.chunk = chunk		# Most bytes taken in one read
+        self.leftover = b''
+        self.scans = 0
+        self.misses = 0
+        self.discarded = 0		# Bytes thrown away, over every scan
+        self.lastDiscarded = 0
+        self.lastTime = 0
+
+    def scan(self, ser, data=b''):
+        """ Reads up to and past the marker, starting with data already read. Returns True if it was found """
+
+        start = time.time()
+        keep = len(self.marker) - 1
+        window = bytes(data)
+        discarded = 0
+        found = False
+        while True:
+            i = window.find(self.marker)
+            if i >= 0:
+                discarded += i
+                self.leftover = window[i + len(self.marker):]
+                found = True
+                break
+            if len(window) > keep:
+                discarded += len(window) - keep
+                window = window[len(window) - keep:]
+            if time.time() - start > self.timeout:
+                break
+            window += ser.read(min(max(ser.in_waiting, 1), self.chunk))
+        if not found:
+            discarded += len(window)
+            self.leftover = b''
+            self.misses += 1
+
+        self.scans += 1
+        self.discarded += discarded
+        self.lastDiscarded = discarded
+        self.lastTime = time.time() - start
+        return found
+
+    def take(self, n):
+        """ Removes and returns up to n leftover bytes """
+
+        data = self.leftover[:n]
+        self.leftover = self.leftover[n:]
+        return data
+
+
+class SerialReader(threading.Thread):
+    """
+    Reads a serial port on its own thread. Whatever is waiting on the port is
+    pulled in with one read, split into delimited frames in a ByteRing, and
+    each frame is passed to every subscriber. Subscribers are called on the
+    reader thread, so they should hand the frame off (e.g. to a queue or a
+    signal) rather than do slow work.
+    """
+
+    def __init__(self, device, delimiter=b'\n', capacity=65536, pollTimeout=0.05):
+        super(SerialReader, self).__init__()
+        self.daemon = True
+        self.device = device
+        self.delimiter = delimiter
+        self.ring = ByteRing(capacity)
+        self.pollTimeout = pollTimeout		# Longest a read blocks, so stop() is quick
+        self.subscribers = []
+        self.lock = threading.Lock()
+        self.stopEvent = threading.Event()
+
+    def subscribe(self, callback):
+        with self.lock:
+            self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        with self.lock:
+            if callback in self.subscribers:
+                self.subscribers.remove(callback)
+
+    def dispatch(self, frame):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for callback in subscribers:
+            try:
+                callback(frame)
+            except Exception as e:
+                print("Error handling serial frame: " + str(e))
+
+    def handleData(self, data):
+        """ Splits newly read bytes into frames for the subscribers """
+
+        self.ring.write(data)
+        frame = self.ring.readFrame(self.delimiter)
+        while frame is not None:
+            self.dispatch(frame)
+            frame = self.ring.readFrame(self.delimiter)
+
+    def handleIdle(self):
+        """ Called when a read times out with nothing received """
+        pass
+
+    def run(self):
+        timeout = self.device.timeout
+        self.device.timeout = self.pollTimeout
+        try:
+            while not self.stopEvent.is_set():
+                try:
+                    waiting = self.device.in_waiting
+                    # Block for the first byte when nothing is waiting
+                    data = self.device.read(waiting if waiting else 1)
+                except (serial.SerialException, OSError) as e:
+                    print("Serial read failed: " + str(e))
+                    break
+                if data:
+                    self.handleData(data)
+                else:
+                    self.handleIdle()
+        finally:
+            self.device.timeout = timeout
+
+    def stop(self):
+        """ Stops the reader and waits for it to let go of the port """
+
+        self.stopEvent.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join()
@@ -0,0 +1,175 @@
+import json
+import numpy
+
+
+def stationLine(slope, offset, angle):
+    """ The Maestro target from one of the original hard-coded station mappings """
+
+    return 4 * (slope * (180 - angle) + offset)
+
+
+# The mappings moveToTarget used to have written in, as calibration points.
+# The pan mapping had a slightly different line on each side of center.
+DEFAULT_PROFILES = {
+    'VLAD': {
+        'pan': {'points': [[-180, stationLine(3.256, 914, -180)], [0, stationLine(3.244, 916, 0)],
+                           [180, stationLine(3.244, 916, 180)]],
+                'min': 3800, 'max': 7900, 'range': [-180, 180]},
+        'tilt': {'points': [[-90, stationLine(4.856, 626, -90)], [90, stationLine(4.856, 626, 90)]],
+                 'min': 4348, 'max': 6300, 'range': [-90, 90]},
+    },
+    'CHAD': {
+        'pan': {'points': [[-180, stationLine(2.8, 996, -180)], [0, stationLine(2.778, 1000, 0)],
+                           [180, stationLine(2.778, 1000, 180)]],
+                'min': 3800, 'max': 7900, 'range': [-180, 180]},
+        'tilt': {'points': [[-90, stationLine(4.656, 668, -90)], [90, stationLine(4.656, 668, 90)]],
+                 'min': 4348, 'max': 6300, 'range': [-90, 90]},
+    },
+}
+
+
+def naturalSpline(x, y, xs):
+    """
+    Evaluates the natural cubic spline through the points (x, y) at xs.
+    Outside the points it carries on in a straight line along the end slope
+    """
+
+    n = len(x)
+    h = numpy.diff(x)
+    # Second derivatives at the points, zero at both ends
+    a = numpy.zeros((n, n))
+    r = numpy.zeros(n)
+    a[0, 0] = a[-1, -1] = 1
+    for i in range(1, n - 1):
+        a[i, i - 1] = h[i - 1]
+        a[i, i] = 2 * (h[i - 1] + h[i])
+        a[i, i + 1] = h[i]
+        r[i] = 6 * ((y[i + 1] - y[i]) / h[i] - (y[i] - y[i - 1]) / h[i - 1])
+    m = numpy.linalg.solve(a, r)
+
+    i = numpy.clip(numpy.searchsorted(x, xs) - 1, 0, n - 2)
+    t = numpy.clip(xs, x[0], x[-1]) - x[i]
+    hi = h[i]
+    slope = (y[i + 1] - y[i]) / hi - hi * (2 * m[i] + m[i + 1]) / 6
+    ys = y[i] + t * slope + t * t * m[i] / 2 + t * t * t * (m[i + 1] - m[i]) / (6 * hi)
+
+    # Straight on past the ends
+    startSlope = (y[1] - y[0]) / h[0] - h[0] * (2 * m[0] + m[1]) / 6
+    endSlope = (y[-1] - y[-2]) / h[-1] + h[-1] * (m[-2] + 2 * m[-1]) / 6
+    ys = numpy.where(xs < x[0], y[0] + (xs - x[0]) * startSlope, ys)
+    return numpy.where(xs > x[-1], y[-1] + (xs - x[-1]) * endSlope, ys)
+
+
+def piecewiseLinear(x, y, xs):
+    """ Evaluates the straight lines between the points (x, y) at xs, extended past the ends """
+
+    ys = numpy.interp(xs, x, y)
+    ys = numpy.where(xs < x[0], y[0] + (xs - x[0]) * (y[1] - y[0]) / (x[1] - x[0]), ys)
+    return numpy.where(xs > x[-1], y[-1] + (xs - x[-1]) * (y[-1] - y[-2]) / (x[-1] - x[-2]), ys)
+
+
+class AngleMap(object):
+    """
+    Maps an angle in degrees to a Maestro target, in quarter microseconds, for
+    one servo. A curve is fitted through points measured on the tracker. It is
+    piecewise linear, or a natural cubic spline to follow a servo's
+    nonlinearity more smoothly. The curve is then compiled into a table every
+    resolution degrees across the range, so mapping an angle is one index
+    into a list.
+    """
+
+    def __init__(self, points, method='linear', minPwm=3600, maxPwm=8400, angleRange=None, resolution=0.05):
+        # Sort the points and average any measured twice at the same angle
+        merged = {}
+        for angle, pwm in points:
+            merged.setdefault(float(angle), []).append(float(pwm))
+        if len(merged) < 2:
+            raise ValueError("Need at least two calibration angles")
+        self.points = [[angle, sum(pwms) / len(pwms)] for angle, pwms in sorted(merged.items())]
+        self.method = method
+        self.minPwm = minPwm
+        self.maxPwm = maxPwm
+        if angleRange is None:
+            angleRange = [self.points[0][0], self.points[-1][0]]
+        self.angleRange = angleRange
+        self.resolution = resolution
+        self.compile()
+
+    def curve(self, angles):
+        """ The fitted curve at an array of angles, unrounded and unclamped """
+
+        x = numpy.array([p[0] for p in self.points])
+        y = numpy.array([p[1] for p in self.points])
+        if self.method == 'spline' and len(x) > 2:
+            return naturalSpline(x, y, angles)
+        return piecewiseLinear(x, y, angles)
+
+    def compile(self):
+        start, end = self.angleRange
+        count = int(round((end - start) / self.resolution)) + 1
+        angles = start + numpy.arange(count) * self.resolution
+        pwm = numpy.clip(numpy.round(self.curve(angles)), self.minPwm, self.maxPwm)
+        self.table = [int(p) for p in pwm]
+        self.start = start
+        self.scale = 1.0 / self.resolution
+        self.last = count - 1
+
+    def __call__(self, angle):
+        """ The target for an angle, from the nearest table entry. Angles past the range get the end's target """
+
+        i = int((angle - self.start) * self.scale + 0.5)
+        if i < 0:
+            i = 0
+        elif i > self.last:
+            i = self.last
+        return self.table[i]
+
+    def toDict(self):
+        return {'points': self.points, 'method': self.method, 'min': self.minPwm,
+                'max': self.maxPwm, 'range': self.angleRange}
+
+    @staticmethod
+    def fromDict(settings, resolution=0.05):
+        return AngleMap(settings['points'], settings.get('method', 'linear'), settings.get('min', 3600),
+                        settings.get('max', 8400), settings.get('range'), resolution)
+
+
+class StationCalibration(object):
+    """
+    The pan and tilt calibration for one ground station. Pan angles are the
+    bearing relative to the tracker's center bearing, and tilt angles are the
+    elevation, both in degrees. Profiles are kept in a JSON file by station
+    name, and the original hard-coded mappings are there as defaults.
+    """
+
+    def __init__(self, pan, tilt):
+        self.pan = pan
+        self.tilt = tilt
+
+    @staticmethod
+    def load(path, profile, resolution=0.05):
+        """ Loads the named profile from the file, or from the defaults if the file doesn't have it """
+
+        try:
+            with open(path) as f:
+                profiles = json.load(f)
+        except (IOError, OSError, ValueError):
+            profiles = {}
+        settings = profiles.get(profile, DEFAULT_PROFILES.get(profile))
+        if settings is None:
+            print("No servo calibration for " + str(profile) + ", using VLAD")
+            settings = DEFAULT_PROFILES['VLAD']
+        return StationCalibration(AngleMap.fromDict(settings['pan'], resolution),
+                                  AngleMap.fromDict(settings['tilt'], resolution))
+
+    def save(self, path, profile):
+        """ Saves this calibration as the named profile, keeping the file's other profiles """
+
+        try:
+            with open(path) as f:
+                profiles = json.load(f)
+        except (IOError, OSError, ValueError):
+            profiles = {}
+        profiles[profile] = {'pan': self.pan.toDict(), 'tilt': self.tilt.toDict()}
+        with open(path, 'w') as f:
+            json.dump(profiles, f, indent=4, sort_keys=True)
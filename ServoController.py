@@ -1,5 +1,6 @@
-from Antenna_Tracker_Controls_GUI import SerialDevice
-import numpy
+from SerialReader import SerialDevice
+import time
+import threading
 
 
 class ServoController:
@@ -8,6 +9,10 @@ class ServoController:
         self.moveCommand = 0x84
         self.accelCommand = 0x89
         self.speedCommand = 0x87
+        self.multipleTargetsCommand = 0x9F		# Mini Maestro 12/18/24 only
+        # Move every channel with one Set Multiple Targets frame. Turn off
+        # for a Micro Maestro, which doesn't have the command
+        self.useMultipleTargets = True
 
         # change the movement speed etc of ubiquity tilt servo
         self.tiltChannel = 0
@@ -38,6 +43,7 @@ class ServoController:
         # Memory for last position (To account for backlash)
         self.previousPan = 6000
         self.servoController = servoController
+        self.buildTargetsFrame()
 
         # Set the acceleration and speed of the servos
         self.setServoAccel(self.panAccel, self.tiltAccel)
@@ -63,6 +69,7 @@ class ServoController:
         self.tiltSpeed = speed
         self.tiltAngleMin = angleMax
         self.tiltAngleMax = angleMin
+        self.buildTargetsFrame()
 
         self.setServoAccel(self.panAccel, self.tiltAccel)
         self.setServoSpeed(self.panSpeed, self.tiltSpeed)
@@ -73,6 +80,7 @@ class ServoController:
         self.panChannel = channel
         self.panAccel = accel
         self.panSpeed = speed
+        self.buildTargetsFrame()
 
         self.setServoAccel(self.panAccel, self.tiltAccel)
         self.setServoSpeed(self.panSpeed, self.tiltSpeed)
@@ -121,6 +129,53 @@ class ServoController:
         except:
             print("Error, could not set the servo speed, check com ports")
 
+    def buildTargetsFrame(self):
+        """
+        Lays out the Set Multiple Targets frame that moveAll fills in. The
+        command sets a run of consecutive channels, so if the four servo
+        channels aren't one block there's no frame, and moveAll falls back to
+        moving the servos one at a time
+        """
+
+        channels = [self.tiltChannel, self.panChannel, self.rfdtiltChannel, self.rfdpanChannel]
+        first = min(channels)
+        if sorted(channels) != list(range(first, first + len(channels))):
+            self.targetsFrame = None
+            return
+
+        # 0x9F, number of targets, first channel, then each target's low and
+        # high 7 bits in channel order
+        self.targetsFrame = bytearray(3 + 2 * len(channels))
+        self.targetsFrame[0] = self.multipleTargetsCommand
+        self.targetsFrame[1] = len(channels)
+        self.targetsFrame[2] = first
+        self.panIndexes = [3 + 2 * (channel - first) for channel in (self.panChannel, self.rfdpanChannel)]
+        self.tiltIndexes = [3 + 2 * (channel - first) for channel in (self.tiltChannel, self.rfdtiltChannel)]
+
+    def moveAll(self, pan, tilt):
+        """ Moves both pan servos and both tilt servos together, with one serial write """
+
+        pan = int(pan)
+        tilt = int(tilt)
+        frame = self.targetsFrame
+        if frame is None or not self.useMultipleTargets:
+            self.movePanServo(pan)
+            self.moveTiltServo(tilt)
+            return
+
+        try:
+            for i in self.panIndexes:
+                frame[i] = pan & 0x7F
+                frame[i + 1] = (pan >> 7) & 0x7F
+            for i in self.tiltIndexes:
+                frame[i] = tilt & 0x7F
+                frame[i + 1] = (tilt >> 7) & 0x7F
+            self.servoController.write(frame)
+            print("\t\tMove Pan: ", float(pan), " Tilt: ", float(tilt))
+
+        except Exception as e:
+            print(str(e))
+
     def moveTiltServo(self, position):
         """ Takes a single argument, moves the tilt servo to the position specified by the argument """
         position = int(position)
@@ -151,7 +206,7 @@ class ServoController:
             print(moveTilt)
             print("\t\tMove Tilt: ", float(position))
 
-        except(Exception, e):
+        except Exception as e:
             print(str(e))
 
     def movePanServo(self, position):
@@ -175,23 +230,85 @@ class ServoController:
             print("\t\tMove Pan: ", float(position))
             return
 
-        except(Exception, e):
+        except Exception as e:
             print(str(e))
 
-    def mapCalc(angleOne, pwmOne, angleTwo, pwmTwo):
-        angleOne = 180 - angleOne
-        if angleOne < 0:
-            angleOne = angleOne + 360
-
-        angleTwo = 180 - angleTwo
-        if angleTwo < 0:
-            angleTwo = angleTwo + 360
-
-        angleOne = angleOne * 4
-        angleTwo = angleTwo * 4
+class ServoScheduler(object):
+    """
+    Sits between the pointing math and a ServoController, so the Maestro's
+    serial queue can't back up when several tracking methods feed the
+    tracker. A target within the deadband of the last one sent is dropped,
+    and targets are sent from the scheduler's own thread at most maxRate
+    times a second. If several come in between sends, only the latest goes.
+    """
 
-        a = numpy.array([[angleOne, 4], [angleTwo, 4]])
-        b = numpy.array([pwmOne, pwmTwo])
-        x = numpy.linalg.solve(a, b)
-
-        print(x)
+    def __init__(self, servoController, maxRate=10, deadband=1):
+        self.servoController = servoController
+        self.minInterval = 1.0 / maxRate
+        self.deadband = deadband		# In the Maestro's quarter-microsecond steps
+        self.lastSent = None		# (pan, tilt)
+        self.lastSendTime = 0		# Monotonic, so a clock step can't freeze or burst the moves
+        self.pending = None
+        self.sent = 0
+        self.suppressed = 0		# Within the deadband of the last target sent
+        self.coalesced = 0		# Replaced by a newer target before being sent
+        self.condition = threading.Condition()
+        self.stopped = False
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def setMaxRate(self, maxRate):
+        with self.condition:
+            self.minInterval = 1.0 / maxRate
+            self.condition.notify()
+
+    def setDeadband(self, deadband):
+        self.deadband = deadband
+
+    def submit(self, pan, tilt):
+        """ Asks for the servos to move to the pan and tilt targets """
+
+        target = (int(pan), int(tilt))
+        with self.condition:
+            if self.pending is not None:
+                self.pending = None
+                self.coalesced += 1
+            if (self.lastSent is not None and abs(target[0] - self.lastSent[0]) < self.deadband and
+                    abs(target[1] - self.lastSent[1]) < self.deadband):
+                self.suppressed += 1
+                return
+            self.pending = target
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.pending is None and not self.stopped:
+                    self.condition.wait()
+                if self.stopped:
+                    return
+                wait = self.lastSendTime + self.minInterval - time.monotonic()
+                if wait > 0:
+                    # Anything newer that comes in meanwhile replaces the target
+                    self.condition.wait(wait)
+                    continue
+                pan, tilt = self.pending
+                self.pending = None
+                self.lastSent = (pan, tilt)
+                self.lastSendTime = time.monotonic()
+                self.sent += 1
+            self.servoController.moveAll(pan, tilt)
+
+    def getStats(self):
+        """ Returns the number of targets sent, dropped in the deadband, and replaced before sending """
+
+        with self.condition:
+            return self.sent, self.suppressed, self.coalesced
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+        if self.thread.is_alive():
+            self.thread.join()
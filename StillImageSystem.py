@@ -1,5 +1,5 @@
 from PySide2 import *
-from PySide2 import QtCore
+from PySide2 import QtCore, QtGui
 from PySide2.QtCore import *
 from PySide2.QtCore import Signal as pyqtSignal
 import serial
@@ -8,6 +8,7 @@ import datetime
 import sys
 import base64
 import hashlib
+from ImageTransfer import *		# Protocols for receiving pictures
 
 
 class StillImageSystem(QtCore.QObject):
@@ -42,6 +43,15 @@ class StillImageSystem(QtCore.QObject):
         # Variable to determine spacing of checksum. Ex. wordlength = 1000 will
         # send one thousand bits before calculating and verifying checksum
         self.wordlength = 8000
+        # 'stopAndWait' for the original protocol, 'selectiveRepeat', or
+        # 'adaptive' for selective repeat with the chunk size tuned to the link
+        self.transferMode = 'stopAndWait'
+        # Best known chunk size for each link profile, for the adaptive mode
+        self.linkProfile = 'RFD'
+        self.chunkProfilePath = 'chunkSizes.json'
+        # Ask selective repeat payloads for binary frames, falling back to text
+        # if the payload doesn't answer
+        self.binaryTransfers = True
         self.extension = ".jpg"
         # The starting display photo is the logo of the MnSGC
         self.displayPhotoPath = "Images/MnSGC_Logo_highRes.png"
@@ -548,164 +558,73 @@ class StillImageSystem(QtCore.QObject):
         self.mainWindow.stillNewText.emit("Confirmed photo request")
         sys.stdout.flush()
 
+        ### Receive with the selected protocol ###
+        # The selective repeat modes keep what arrives in Images/<name>.part, so
+        # asking for the same picture again after a failure resumes it
+        controller = None
+        partial = None
+        if self.transferMode in ('selectiveRepeat', 'adaptive'):
+            partial = PartialImage("Images/" + str(savepath) + ".part")
+        if self.transferMode == 'adaptive':
+            controller = ChunkSizeController.load(self.chunkProfilePath, self.linkProfile)
+            self.stillLog("Starting chunk size: " + str(controller.size))
+            receiver = SelectiveRepeatReceiver(controller=controller, partial=partial,
+                                               binary=self.binaryTransfers)
+        elif self.transferMode == 'selectiveRepeat':
+            receiver = SelectiveRepeatReceiver(partial=partial, binary=self.binaryTransfers)
+        else:
+            print("starting wordlength: " + str(wordlength))
+            receiver = StopAndWaitReceiver(wordlength)
+        receiver.log = self.stillLog
+        receiver.progress = self.mainWindow.stillNewProgress.emit
+        # Show the picture as it comes in, so a bad one can be cancelled early
+        receiver.preview = lambda written: self.mainWindow.imagePreview.decodeStart.emit(
+            self.displayPhotoPath, written)
+        self.interrupt = False
+        receiver.cancelled = lambda: self.interrupt
+        # Binary frames can contain anything, so the link only picks GPS lines
+        # out from between them
+        receiver.framing = lambda binary: self.rfdSer.link.setBinary(self.rfdSer, binary)
 
-        print("starting wordlength: " + str(wordlength))
-        ### Module Specific Variables ###
-        # Initializes the checksum timeout (timeout value is not set here)
-        scount = 0
-        trycnt = 0
-        failcount = 0
-        totalcnt = 0
-        finalstring = ''		# Initializes the data string so that the += function can be used
-        done = False			# Initializes the end condition
-
-        ### Setup the Progress Bar ###
-        stillProgress = 0
-        try:
-            # The first thing you get is the total picture size so you can make
-            # the progress bar
-            time.sleep(1)
-            photoSize = self.rfdSer.readline()
-            print("Total Picture Size: ", photoSize)
-            self.mainWindow.stillNewText.emit(
-                "Total Picture Size: " + str(int(photoSize)))
-            stillPhotoMax = int(photoSize)
-            print(stillPhotoMax)
-            self.mainWindow.stillNewProgress.emit(stillProgress, stillPhotoMax)
-        except:
-            print("Error retrieving picture size")
-            self.mainWindow.stillNewText.emit("Error retrieving picture size")
-            stillPhotoMax = 1
-
-        ### Retreive Data Loop (Will end when on timeout) ###
-        while not done:
-            print("Current Receive Position: ", str(len(finalstring)))
-            self.mainWindow.stillNewText.emit(
-                "Current Received Position: " + str(len(finalstring)))
-            # Asks first for checksum. Checksum is asked for first so that if
-            # data is less than wordlength, it won't error out the checksum
-            # data
-            checktheirs = self.rfdSer.read(32)
-            print(checktheirs)
-            # Retreives characters, who's total string length is predetermined
-            # by variable wordlength
-            word = self.rfdSer.read(wordlength)
-            # Retreives a checksum based on the received data strings
-            checkours = self.gen_checksum(word).encode('ascii')
-            print(checkours)
-
-            # CHECKSUM
-            if checkours != checktheirs:
-                if trycnt < 10:		# This line sets the maximum number of checksum resends. Ex. trycnt = 5 will attempt to rereceive data 5 times before erroring out											  #I've found that the main cause of checksum errors is a bit drop or add desync, this adds a 2 second delay and resyncs both systems
-                    scount = 0
-                    self.rfdSer.write(b'N')
-                    trycnt += 1
-                    failcount += 1
-                    print("try number:", str(trycnt))
-                    self.mainWindow.stillNewText.emit(
-                        "try number: " + str(trycnt))
-                    print("\tresend last")		# This line is mostly used for troubleshooting, allows user to view that both devices are at the same position when a checksum error occurs
-                    self.mainWindow.stillNewText.emit("\tresent last")
-                    print("\tpos @", str(len(finalstring)))
-                    self.mainWindow.stillNewText.emit(
-                        "\tpos @ " + str(len(finalstring)))
-                    print("\twordlength", str(wordlength))
-                    self.mainWindow.stillNewText.emit(
-                        "\twordlength " + str(wordlength))
-                    sys.stdout.flush()
-##                    if wordlength > 1000:
-##                        wordlength -= 1000
-                    self.sync()		# This corrects for bit deficits or excesses ######  THIS IS A MUST FOR DATA TRANSMISSION WITH THE RFD900s!!!! #####
-                else:
-                    # Kind of a worst case, checksum trycnt is reached and so
-                    # we save the image and end the receive, a partial image
-                    # will render if enough data
-                    self.rfdSer.write(b'N')
-                    finalstring += word.decode('utf-8')
-                    done = True
-                    break
-            else:							# If everything goes well, reset the try counter, and add the word to the accumulating final wor
-                trycnt = 0
-                scount += 1
-                self.rfdSer.write(b'Y')
-                finalstring += word.decode('utf-8')
-                stillProgress += wordlength
-                self.mainWindow.stillNewProgress.emit(
-                    stillProgress, stillPhotoMax)
-##                if(scount > 10 and wordlength < 7000):
-##                    scount = 0
-##                    wordlength += 1000
-##                    print("\nIncreasing Wordsize : +", str(wordlength))
-##                    print("\n")
-##                    self.mainWindow.stillNewText.emit("\nIncreasing Wordsize :" + str(wordlength))
-##                    self.mainWindow.stillNewText.emit("\n")
-##                    self.sync()
-            # The words always come in increments of some thousand, so if it's
-            # not evenly divisible, you're probably at the end
-            if len(finalstring) % 1000 != 0:
-                done = True
-                break
-        # Save the image as the given filename in the Images folder
+        # The image is decoded into the file as it arrives
+        self.displayPhotoPath = "Images/" + str(savepath)
         try:
-            self.b64_to_image(finalstring, "Images/" +
-                              str(savepath))			# Decode the image
-            self.displayPhotoPath = "Images/" + str(savepath)
-            # Send the signal with the new image location to the main GUI
-            self.mainWindow.newPicture.emit(self.displayPhotoPath)
-        except:
+            out = open(self.displayPhotoPath, "wb")
+        except (IOError, OSError):
             print("Error with filename, saved as newimage" + self.extension)
             self.mainWindow.stillNewText.emit(
                 "Error with filename, saved as newimage" + self.extension)
-            self.mainWindow.stillNewText.emit("Test633")
             sys.stdout.flush()
             # Save image as newimage.jpg due to a naming error in the Images
             # folder
-            self.b64_to_image(finalstring, "Images/" +
-                              "newimage" + self.extension)
+            self.displayPhotoPath = "Images/" + "newimage" + self.extension
+            out = open(self.displayPhotoPath, "wb")
+        with out:
+            imageBytes = receiver.receive(self.rfdSer, out)
+        failcount = receiver.failures
+        if controller is not None:
+            self.stillLog("Chunk sizes used: " + str(controller.history))
+            try:
+                controller.save(self.chunkProfilePath, self.linkProfile)
+            except (IOError, OSError):
+                self.stillLog("Error saving the chunk size")
+        if partial is not None:
+            if receiver.isComplete():
+                partial.remove()
+            elif receiver.size is not None:
+                self.stillLog("Transfer incomplete, " + str(receiver.received) + " of " + str(receiver.size) +
+                              " bytes kept. Request " + str(savepath) + " again to resume")
+
+        # Send the signal with the new image location to the main GUI
+        self.mainWindow.newPicture.emit(self.displayPhotoPath)
 
         ### Clean Up ###
         #self.wordlength = 7000			# Reset the wordlength to the original
         print("Image Saved")
-        self.mainWindow.stillNewText.emit("Image Saved")
+        self.mainWindow.stillNewText.emit("Image Saved, " + str(imageBytes) + " bytes")
         self.mainWindow.stillNewText.emit("Number of Packets Lost = " + str(failcount))
         sys.stdout.flush()
 
-    def sync(self):
-        """ Ensures both sender and receiver are at that the same point in their data streams """
-
-        # Prepare to sync by resetting variables
-        print("Attempting to Sync - This should take approx. 2 sec")
-        self.mainWindow.stillNewText.emit(
-            "Attempting to Sync - This should take approx. 2 sec")
-        sync = b""
-        addsync0 = b""
-        addsync1 = b""
-        addsync2 = b""
-        addsync3 = b""
-
-        # Program is held until no data is being sent (timeout) or until the
-        # pattern 's' 'y' 'n' 'c' is found ###
-        while sync != b"sync":
-            addsync0 = self.rfdSer.read()
-            #addsync0 = (addsync0)
-            sync = b""
-            if addsync0 == '':
-                break
-            sync = addsync3 + addsync2 + addsync1 + addsync0
-            #print(sync)
-            addsync3 = addsync2
-            addsync2 = addsync1
-            addsync1 = addsync0
-
-        # Notifies sender that the receiving end is now synced
-        self.rfdSer.write(b'S')
-        print("System Match")
-        self.mainWindow.stillNewText.emit("System Match")
-        self.rfdSer.flushInput()			# Clear the buffers to be ready
-        self.rfdSer.flushOutput()
-        sys.stdout.flush()
-        return
-
     def connectiontest(self, numping):
         """ Determines the ping time between the Pi and the computer """
 
@@ -779,5 +698,54 @@ class StillImageSystem(QtCore.QObject):
         """ Generates a 32 character hash up to 10000 char length String(for checksum). If string is too long I've notice length irregularities in checksum """
         return hashlib.md5(data).hexdigest()
 
+    def stillLog(self, text):
+        print(text)
+        self.mainWindow.stillNewText.emit(text)
+
+    def setTransferMode(self, mode):
+        self.transferMode = mode
+
+    def setLinkProfile(self, profile):
+        self.linkProfile = profile
+
+    def setBinaryTransfers(self, arg):
+        self.binaryTransfers = arg
+
     def setInterrupt(self, arg):
         self.interrupt = arg
+
+
+class ImagePreview(QtCore.QObject):
+    """
+    Decodes pictures for the still image display on its own thread. A picture
+    that is still downloading is decoded from what has been written so far,
+    which Qt fills out in grey: the missing rows of a baseline JPEG, or the
+    missing detail of a progressive one.
+    """
+
+    # Signals
+    decodeStart = pyqtSignal(str, int)
+    newImage = pyqtSignal(str, QtGui.QImage, bool)
+
+    def __init__(self, maxWidth=1600, maxHeight=1200):
+        super(ImagePreview, self).__init__()
+        # Larger pictures are shrunk here rather than on the GUI thread
+        self.maxWidth = maxWidth
+        self.maxHeight = maxHeight
+
+    def decode(self, path, length):
+        """ Decodes the first length bytes of the picture at path, or all of it if length is 0 """
+
+        try:
+            with open(path, 'rb') as f:
+                data = f.read(length) if length > 0 else f.read()
+        except (IOError, OSError) as e:
+            print("Error reading picture: " + str(e))
+            return
+        image = QtGui.QImage.fromData(data)
+        if image.isNull():
+            return		# Not enough of it yet
+        if image.width() > self.maxWidth or image.height() > self.maxHeight:
+            image = image.scaled(self.maxWidth, self.maxHeight,
+                                 QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation)
+        self.newImage.emit(path, image, length <= 0)
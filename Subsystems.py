@@ -0,0 +1,98 @@
+import sys
+import time
+import types
+import importlib
+import subprocess
+
+
+class Subsystem(object):
+    """
+    An optional part of the tracker, such as the graphs or the Ubiquiti
+    signal scraping, whose modules are only imported the first time its
+    feature is enabled. The names it provides are given as
+    name='module:attribute', and load() returns an object with them as
+    attributes. If a dependency is missing, load() returns None and the
+    reason is kept in error, so the feature can be turned off instead of
+    the whole program failing to start.
+    """
+
+    def __init__(self, title, **names):
+        self.title = title
+        self.names = names
+        self.loaded = None
+        self.error = None
+        self.loadTime = 0
+
+    def modules(self):
+        return sorted(set(target.split(':')[0] for target in self.names.values()))
+
+    def load(self):
+        """ Imports the subsystem the first time it's asked for. Returns None if it isn't available """
+
+        if self.loaded is None and self.error is None:
+            start = time.perf_counter()
+            try:
+                loaded = {}
+                for name, target in self.names.items():
+                    module, attribute = target.split(':')
+                    loaded[name] = getattr(importlib.import_module(module), attribute)
+                self.loaded = types.SimpleNamespace(**loaded)
+            except ImportError as e:
+                self.error = str(e)
+                print("The " + self.title + " can't be used: " + self.error)
+            self.loadTime = time.perf_counter() - start
+            if self.loaded is not None:
+                print("Loaded the " + self.title + " in " + str(round(self.loadTime, 2)) + " s")
+        return self.loaded
+
+
+SUBSYSTEMS = {
+    'graphs': Subsystem("tracking graphs", Figure='matplotlib.figure:Figure',
+                        FigureCanvas='matplotlib.backends.backend_qt5agg:FigureCanvasQTAgg'),
+    'maps': Subsystem("maps", QWebView='PySide2.QtWebEngineWidgets:QWebEngineView',
+                      WebView='WebView:WebView'),
+    'ubiquiti': Subsystem("Ubiquiti signal tracking",
+                          UbiquitiSignalTracker='UbiquitiSignalTracker:UbiquitiSignalTracker',
+                          UbiquitiSignalScraper='UbiquitiSignalScraper:UbiquitiSignalScraper'),
+    'video': Subsystem("VLC video streaming", VLCStreamer='VLCStreamer:VLCStreamer'),
+    'declination': Subsystem("magnetic declination model", declination='geomag:declination'),
+}
+
+
+def loadSubsystem(name):
+    """ The named subsystem's names, imported on first use, or None if it isn't available """
+
+    return SUBSYSTEMS[name].load()
+
+
+def importTime(modules):
+    """ Seconds to import the modules in a fresh interpreter, or the error if one is missing """
+
+    code = ("import time\nstart = time.perf_counter()\n" +
+            "".join("import " + module + "\n" for module in modules) +
+            "print(time.perf_counter() - start)")
+    result = subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        return result.stderr.decode().strip().splitlines()[-1]
+    return float(result.stdout.decode().strip().splitlines()[-1])
+
+
+def benchmark(repeat=3):
+    """
+    Prints the cold import time of the GUI and the tracker daemon at startup,
+    and of each subsystem, which is only paid when its feature is enabled
+    """
+
+    entries = [('GUI startup', ['Antenna_Tracker_Controls_GUI']), ('tracker daemon', ['TrackerDaemon'])]
+    entries += [(SUBSYSTEMS[name].title, SUBSYSTEMS[name].modules()) for name in sorted(SUBSYSTEMS)]
+    for title, modules in entries:
+        times = [importTime(modules) for i in range(repeat)]
+        errors = [t for t in times if not isinstance(t, float)]
+        if errors:
+            print(title + ": not available (" + errors[0] + ")")
+        else:
+            print(title + ": " + str(round(min(times), 3)) + " s")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+"""
+
+Headless Antenna Tracker
+
+Runs the tracker without the GUI: balloon updates from the RFD and Iridium
+go through the trajectory estimator and the pointing math to the servos.
+Nothing here imports Qt, so it starts in a fraction of a second and runs on a
+low-power field computer. A status port lets a viewer connect separately and
+follow the tracker as JSON lines.
+
+Usage:
+    python TrackerDaemon.py --ground 45.6673 -111.0447 4920 --servo-port /dev/ttyACM0 --rfd-port /dev/ttyUSB0
+
+"""
+
+import os
+import sys
+import json
+import socket
+import argparse
+import datetime
+import threading
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from TrackerEngine import *			# Tracking logic shared with the GUI
+from ServoController import *			# Module for controlling Mini Maestro
+from ServoCalibration import *			# Angle to servo target calibration tables
+from RfdLink import *				# Shared owner of the RFD serial port
+from RfdTelemetry import *			# RFD GPS frame parser
+from Iridium import *				# Iridium web API and database polling
+from TrajectoryEstimator import *		# Kalman filter for the balloon trajectory
+
+
+class RfdSource(object):
+    """ Turns the GPS lines on an RfdLink into RFD balloon updates """
+
+    def __init__(self, engine, link, updates):
+        self.engine = engine
+        self.link = link
+        self.updates = updates
+        self.parser = TelemetryParser()
+
+    def start(self):
+        self.link.subscribe(self.handleLine)
+        self.link.start()
+
+    def handleLine(self, line):
+        # Called on the link's reader thread, so just queue the update
+        fix = self.parser.parse(line)
+        if fix is not None:
+            gpsTime, seconds, lat, lon, alt, sats = fix
+            self.updates.put(('fix', self.engine.makeUpdate(gpsTime, seconds, lat, lon, alt, "RFD")))
+
+    def stop(self):
+        self.link.unsubscribe(self.handleLine)
+        self.link.stop()
+
+
+class IridiumSource(threading.Thread):
+    """ Polls the Iridium web API (or the database) for balloon updates """
+
+    def __init__(self, engine, poller, updates):
+        super(IridiumSource, self).__init__()
+        self.daemon = True
+        self.engine = engine
+        self.poller = poller
+        self.updates = updates
+        self.stopEvent = threading.Event()
+
+    def run(self):
+        self.queueFixes(self.poller.start())		# The track so far, if backfilling
+        while not self.stopEvent.wait(self.poller.pollDelay()):
+            self.queueFixes(self.poller.poll())
+            if self.poller.failed:
+                print("Iridium tracking stopped")
+                break
+        self.poller.close()
+
+    def queueFixes(self, fixes):
+        for remoteTime, seconds, lat, lon, alt in fixes:
+            self.updates.put(('fix', self.engine.makeUpdate(remoteTime, seconds, lat, lon, alt, "Iridium")))
+
+    def stop(self):
+        self.stopEvent.set()
+
+
+class PredictionSource(threading.Thread):
+    """
+    Fuses every accepted update into a TrajectoryEstimator, and every period
+    seconds predicts where the balloon is now, so the tracker moves smoothly
+    between fixes
+    """
+
+    def __init__(self, engine, updates, period=2):
+        super(PredictionSource, self).__init__()
+        self.daemon = True
+        self.engine = engine
+        self.updates = updates
+        self.period = period
+        self.estimator = TrajectoryEstimator()
+        self.lock = threading.Lock()
+        self.stopEvent = threading.Event()
+        engine.subscribe(self.handleEvent)
+
+    def handleEvent(self, event, update):
+        if event == 'location':
+            with self.lock:
+                self.estimator.update(update)
+
+    def run(self):
+        while not self.stopEvent.wait(self.period):
+            now = datetime.datetime.utcnow()
+            seconds = now.hour * 3600 + now.minute * 60 + now.second + now.microsecond / 1000000.0
+            with self.lock:
+                if not self.estimator.isReady():
+                    continue
+                lat, lon, alt = self.estimator.predict(seconds)[:3]
+            self.updates.put(('prediction', self.engine.makeUpdate(
+                now.strftime('%H:%M:%S'), seconds, lat, lon, alt, "Prediction")))
+
+    def stop(self):
+        self.engine.unsubscribe(self.handleEvent)
+        self.stopEvent.set()
+
+
+class StatusServer(threading.Thread):
+    """
+    Sends every tracker event to the viewers connected on a TCP port, one JSON
+    object per line. Viewers only listen; a slow or closed one is dropped
+    rather than holding up the tracker.
+    """
+
+    def __init__(self, engine, port, host=''):
+        super(StatusServer, self).__init__()
+        self.daemon = True
+        self.engine = engine
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind((host, port))
+        self.server.listen(5)
+        self.clients = []
+        self.lock = threading.Lock()
+        engine.subscribe(self.handleEvent)
+
+    def run(self):
+        while True:
+            try:
+                client, address = self.server.accept()
+            except OSError:
+                break		# Closed by stop()
+            client.settimeout(1)
+            print("Status viewer connected from " + str(address[0]))
+            with self.lock:
+                self.clients.append(client)
+
+    def handleEvent(self, event, update):
+        status = {'event': event, 'bearing': self.engine.antennaBear, 'elevation': self.engine.antennaEle}
+        if update is not None:
+            status.update({'method': update.getTrackingMethod(), 'time': update.getTime(),
+                           'lat': update.getLat(), 'lon': update.getLon(), 'alt': update.getAlt()})
+        line = (json.dumps(status) + '\n').encode('utf-8')
+        with self.lock:
+            for client in list(self.clients):
+                try:
+                    client.sendall(line)
+                except (OSError, socket.timeout):
+                    client.close()
+                    self.clients.remove(client)
+
+    def stop(self):
+        self.engine.unsubscribe(self.handleEvent)
+        self.server.close()
+        with self.lock:
+            for client in self.clients:
+                client.close()
+            self.clients = []
+
+
+def parseArgs(argv):
+    parser = argparse.ArgumentParser(prog='tracker-daemon', description="Runs the antenna tracker without the GUI")
+    parser.add_argument('--ground', nargs=3, type=float, required=True, metavar=('LAT', 'LON', 'ALT'),
+                        help="ground station position, altitude in feet")
+    parser.add_argument('--center', type=float, default=0, help="bearing the tracker faces when centered")
+    parser.add_argument('--pan-offset', type=float, default=0)
+    parser.add_argument('--tilt-offset', type=float, default=0)
+    parser.add_argument('--station', default='VLAD', help="servo calibration profile (see mapCalc.py)")
+    parser.add_argument('--calibration', default='servoCalibration.json')
+    parser.add_argument('--servo-port', help="Mini Maestro serial port; without it the pointing is only logged")
+    parser.add_argument('--rfd-port', help="RFD serial port, for RFD tracking")
+    parser.add_argument('--rfd-baud', type=int, default=38400)
+    parser.add_argument('--imei', help="Iridium modem IMEI, for Iridium tracking")
+    parser.add_argument('--db-host', default="eclipse.rci.montana.edu")
+    parser.add_argument('--db-user', default=os.environ.get('IRIDIUM_DB_USER'),
+                        help="Iridium database user, IRIDIUM_DB_USER by default")
+    parser.add_argument('--db-pass', default=os.environ.get('IRIDIUM_DB_PASS'),
+                        help="Iridium database password, IRIDIUM_DB_PASS by default; "
+                             "without one only the web API is polled")
+    parser.add_argument('--db-name', default="freemanproject")
+    parser.add_argument('--backfill', action='store_true',
+                        help="load the whole Iridium track from the database at startup")
+    parser.add_argument('--predict', type=float, default=0, metavar='SECONDS',
+                        help="move to a predicted position this often between fixes (0 to only track fixes)")
+    parser.add_argument('--status-port', type=int, help="TCP port for status viewers")
+    parser.add_argument('--log', action='store_true', help="save the logs in Logs/")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parseArgs(sys.argv[1:] if argv is None else argv)
+
+    engine = TrackerEngine(StationCalibration.load(args.calibration, args.station))
+    engine.groundLat, engine.groundLon, engine.groundAlt = args.ground
+    engine.centerBear = args.center
+    engine.panOffset = args.pan_offset
+    engine.tiltOffset = args.tilt_offset
+    engine.autotrackOnline = True
+    if args.log:
+        engine.startLogs("Logs/")
+
+    updates = queue.Queue()
+    sources = []
+    servos = None
+    if args.servo_port:
+        servos = SerialDevice(args.servo_port, 9600, 0.5)
+        servoController = ServoController(servos.getDevice())
+        engine.setServoScheduler(ServoScheduler(servoController))
+    if args.rfd_port:
+        rfd = SerialDevice(args.rfd_port, args.rfd_baud, 2)
+        sources.append(RfdSource(engine, RfdLink(rfd.getDevice(), rfd.getTimeout()), updates))
+        engine.useRFD = True
+    if args.imei:
+        if args.db_pass is None:
+            print("No Iridium database password, so there's no fallback if the web API is down")
+        poller = IridiumPoller(args.db_host, args.db_user, args.db_pass, args.db_name, args.imei,
+                               backfill=args.backfill)
+        sources.append(IridiumSource(engine, poller, updates))
+        engine.useIridium = True
+    if args.predict > 0:
+        sources.append(PredictionSource(engine, updates, args.predict))
+    if args.status_port:
+        sources.append(StatusServer(engine, args.status_port))
+    if not (engine.useRFD or engine.useIridium):
+        print("No tracking method, give --rfd-port and/or --imei")
+        return 1
+
+    for source in sources:
+        source.start()
+    print("Tracking" + (" with servos" if servos else " without servos") + ", Ctrl+C to stop")
+
+    # Updates are handled here, one at a time, whichever source they came from
+    try:
+        while True:
+            try:
+                kind, update = updates.get(timeout=0.5)		# Wakes up so Ctrl+C is seen
+            except queue.Empty:
+                continue
+            if kind == 'fix':
+                engine.updateBalloonLocation(update)
+            else:
+                engine.updateBalloonInterpolation(update)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for source in sources:
+            source.stop()
+        if engine.servoScheduler is not None:
+            sent, suppressed, coalesced = engine.servoScheduler.getStats()
+            print("Servo commands sent: " + str(sent) + ", repeats dropped: " + str(suppressed) +
+                  ", replaced by newer targets: " + str(coalesced))
+            engine.servoScheduler.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+import os
+import datetime
+import threading
+from BalloonUpdate import *
+from ServoCalibration import *
+
+
+def relativePan(bearing, centerBear):
+    """ The bearing relative to the tracker's center bearing, in [-180, 180) so the tracker never spins the long way """
+
+    return (bearing - centerBear + 180) % 360 - 180
+
+
+def isGoodFix(update):
+    """ Updates with a zero position are bad info and aren't considered new updates """
+
+    return not ((update.getLat() == 0.0) or (update.getLon() == 0.0) or (update.getAlt() == 0.0))
+
+
+class TrackerEngine(object):
+    """
+    The tracking logic, without any GUI. Balloon updates from every source are
+    filtered by source and freshness, turned into pointing angles and sent to
+    the servos through a ServoScheduler. The GUI and the tracker daemon both
+    drive one of these, and anything else that wants to follow along (a
+    status display, a remote viewer) subscribes to it.
+
+    Subscribers are called with (event, update) on whichever thread made the
+    update: event is 'location' for an accepted balloon update, or 'pointing'
+    when the tracker is moved, with the update it was aimed at (None for a
+    manual aim). Like SerialReader's subscribers, they should hand the work
+    off rather than do it on the caller's thread.
+    """
+
+    LOG_FILES = (('RFD', "RFDLOG.txt"), ('stillImage', "STILLIMAGELOG.txt"),
+                 ('balloonLocation', "BALLOONLOCATIONLOG.txt"), ('pointing', "POINTINGLOG.txt"))
+
+    def __init__(self, calibration=None, scheduler=None):
+        # Tracking methods to take updates from
+        self.useRFD = False
+        self.useIridium = False
+        self.useAPRS = False
+        self.autotrackOnline = False		# Move the servos for every accepted update
+
+        # Ground Station Variables
+        self.groundLat = 0.00
+        self.groundLon = 0.00
+        self.groundAlt = 0.00
+        self.antennaBear = 0.00
+        self.antennaEle = 0.00
+        self.centerBear = 0.00
+        self.panOffset = 0.00
+        self.tiltOffset = 0.00
+
+        # Angle to servo target calibration, and the scheduler that moves the
+        # servos. Without a scheduler the pointing is only computed and logged
+        if calibration is None:
+            calibration = StationCalibration.load('servoCalibration.json', 'VLAD')
+        self.servoCalibration = calibration
+        self.servoScheduler = scheduler
+        self.servosAttached = scheduler is not None
+
+        # Save Data Boolean, and the log file for each type of message
+        self.saveData = False
+        self.logFiles = {}
+
+        self.currentBalloon = BalloonUpdate('', 0, 0, 0, 0, '', 0, 0, 0)
+        self.subscribers = []
+        self.lock = threading.RLock()		# Sources report on their own threads
+
+    def subscribe(self, callback):
+        with self.lock:
+            self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        with self.lock:
+            if callback in self.subscribers:
+                self.subscribers.remove(callback)
+
+    def notify(self, event, update):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for callback in subscribers:
+            try:
+                callback(event, update)
+            except Exception as e:
+                print("Error notifying tracker subscriber: " + str(e))
+
+    def setServoScheduler(self, scheduler):
+        self.servoScheduler = scheduler
+        self.servosAttached = scheduler is not None
+
+    def makeUpdate(self, time, seconds, lat, lon, alt, trackingMethod):
+        """ A BalloonUpdate for a fix, pointed from this ground station """
+
+        return BalloonUpdate(time, seconds, lat, lon, alt, trackingMethod,
+                             self.groundLat, self.groundLon, self.groundAlt)
+
+    def startLogs(self, directory="Logs/"):
+        """ Creates a new set of timestamped log files and starts saving to them """
+
+        timestamp = str(datetime.datetime.today().strftime("%m-%d-%Y %H-%M-%S"))
+        if not os.path.exists(directory):
+            os.mkdir(directory)
+        for type, name in self.LOG_FILES:
+            self.logFiles[type] = os.path.join(directory, timestamp + ' ' + name)
+            f = open(self.logFiles[type], 'w+')
+            f.close()
+        self.saveData = True
+
+    def logData(self, type, msg):
+        """ Logs the message in the correct file designated in the type argument """
+
+        if not self.saveData:
+            return
+        try:
+            with open(self.logFiles[type], 'a') as f:
+                f.write(str(datetime.datetime.today().strftime(
+                    "%m/%d/%Y %H:%M:%S")) + ',' + msg + '\n')
+        except (KeyError, IOError, OSError):
+            print("Error logging data: " + type + ',' + msg)
+
+    def usesMethod(self, method):
+        """ False for fixes from a tracking method that's turned off """
+
+        return not ((method == 'RFD' and not self.useRFD) or (method == 'Iridium' and not self.useIridium) or
+                    (method == 'APRS' and not self.useAPRS))
+
+    def accept(self, update):
+        """
+        Logs the update and decides whether it's the new balloon location. It
+        has to come from a tracking method in use, be a good fix and be newer
+        than the current location. Returns True if it was accepted
+        """
+
+        # Log the balloon location no matter what (only build the line when
+        # saving, so rejected updates never compute their pointing values)
+        if self.saveData:
+            self.logData("balloonLocation", update.getTrackingMethod() + ',' + str(update.getTime()) + ',' + str(update.getLat()) + ',' + str(
+                update.getLon()) + ',' + str(update.getAlt()) + ',' + str(update.getBear()) + ',' + str(update.getEle()) + ',' + str(update.getLOS()))
+
+        if not self.usesMethod(update.getTrackingMethod()):
+            return False
+
+        if not isGoodFix(update):
+            return False
+
+        with self.lock:
+            # Makes sure it's the newest location
+            if update.getSeconds() <= self.currentBalloon.getSeconds():
+                return False
+            self.currentBalloon = update
+        self.notify('location', update)
+        return True
+
+    def acceptInterpolation(self, update):
+        """ Predicted updates only have to be good fixes that aren't older than the current location """
+
+        return isGoodFix(update) and update.getSeconds() >= self.currentBalloon.getSeconds()
+
+    def updateBalloonLocation(self, update):
+        """ Takes an update from a tracking method, and moves the tracker if it's the new location """
+
+        if self.accept(update) and self.autotrackOnline:
+            self.moveToTarget(update.getBear(), update.getEle(), update)
+
+    def updateBalloonInterpolation(self, update):
+        """ Takes a predicted update, which moves the tracker without becoming the current location """
+
+        if self.acceptInterpolation(update) and self.autotrackOnline:
+            self.moveToTarget(update.getBear(), update.getEle(), update)
+
+    def servoTargets(self, bearing, elevation):
+        """ The (pan, tilt) servo targets for a bearing and elevation angle, with the manual offsets """
+
+        panTo = self.servoCalibration.pan(relativePan(bearing + self.panOffset, self.centerBear))
+        tiltTo = self.servoCalibration.tilt(elevation + self.tiltOffset)
+        return panTo, tiltTo
+
+    def moveToTarget(self, bearing, elevation, update=None):
+        """ Moves servos based on a bearing and elevation angle. Returns the (pan, tilt) targets """
+
+        print("\tBearing: %.0f" % (bearing + self.panOffset))
+        print("\tElevation Angle: %.0f" % (elevation))
+        panTo, tiltTo = self.servoTargets(bearing, elevation)
+        if self.servosAttached and self.servoScheduler is not None:
+            # Pan and tilt go in one frame, so they start moving together
+            self.servoScheduler.submit(panTo, tiltTo)
+
+        # Write the new pointing location to the log file
+        self.logData("pointing", str(bearing) + ',' + str(elevation))
+
+        # Update pointing values
+        self.antennaBear = bearing
+        self.antennaEle = elevation
+        self.notify('pointing', update)
+        return panTo, tiltTo
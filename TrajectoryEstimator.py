@@ -0,0 +1,162 @@
+import math
+import numpy as np
+
+R_EARTH = 6371000.0			# radius of earth in meters
+FEET_PER_METER = 3.280839895
+
+# Measurement noise (standard deviation in meters) for each tracking source,
+# as (horizontal, vertical)
+SOURCE_NOISE = {
+    'RFD': (10.0, 15.0),		# GPS straight from the payload
+    'Iridium': (25.0, 30.0),	# GPS relayed through the web API / database, rounded
+    'APRS': (20.0, 30.0),		# Eagle flight computer, minutes rounded by the packet format
+}
+DEFAULT_NOISE = (30.0, 40.0)
+
+
+class TrajectoryEstimator(object):
+    """
+    A constant-acceleration Kalman filter for the balloon's position. Fixes from
+    every source (RFD, Iridium, APRS) are fused with their own noise models, and
+    predict() gives a smoothed position and velocity at any requested time.
+
+    The filter works in a local east/north/up frame in meters around the first
+    fix. The three axes are independent, each with a [position, velocity,
+    acceleration] state driven by white-noise jerk.
+    """
+
+    def __init__(self, horizontalJerk=1e-8, verticalJerk=1e-8, maxGap=900):
+        # Spectral density of the jerk driving each axis (m^2/s^5). Balloons move
+        # smoothly, so this is small; maneuvers like burst are handled by opening
+        # up the covariance when a fix lands far outside the prediction
+        self.jerk = np.array([horizontalJerk, horizontalJerk, verticalJerk])
+        self.maneuverThreshold = 16.0		# Normalized innovation squared (4 sigma)
+        self.maxGap = maxGap		# Restart the filter after this many seconds without a fix
+        self.reset()
+
+    def reset(self):
+        """ Forgets everything the filter knows """
+
+        self.x = None		# State, one [p, v, a] row per axis
+        self.P = None		# Covariance, one 3x3 matrix per axis
+        self.lastSeconds = None
+        self.dayOffset = 0		# Seconds added when the fix clock wraps past midnight
+        self.fixCount = 0
+        self.refLat = 0.0
+        self.refLon = 0.0
+        self.cosRefLat = 1.0
+
+    def isReady(self):
+        """ A velocity estimate needs at least two fixes """
+
+        return self.fixCount >= 2
+
+    def toLocal(self, lat, lon, alt):
+        """ Latitude/longitude in degrees and altitude in feet to local east/north/up meters """
+
+        east = math.radians(lon - self.refLon) * R_EARTH * self.cosRefLat
+        north = math.radians(lat - self.refLat) * R_EARTH
+        return np.array([east, north, alt / FEET_PER_METER])
+
+    def toGeodetic(self, east, north, up):
+        """ Local east/north/up meters back to latitude, longitude and altitude in feet """
+
+        lat = self.refLat + math.degrees(north / R_EARTH)
+        lon = self.refLon + math.degrees(east / (R_EARTH * self.cosRefLat))
+        return lat, lon, up * FEET_PER_METER
+
+    def filterTime(self, seconds):
+        """ Turns a seconds-of-day timestamp into a continuous filter time """
+
+        seconds = seconds + self.dayOffset
+        if self.lastSeconds is not None and seconds < self.lastSeconds - 43200:
+            self.dayOffset += 86400
+            seconds += 86400
+        return seconds
+
+    def transition(self, dt):
+        """ State transition and process noise matrices for a time step """
+
+        F = np.array([[1.0, dt, 0.5 * dt * dt],
+                      [0.0, 1.0, dt],
+                      [0.0, 0.0, 1.0]])
+        dt2 = dt * dt
+        dt3 = dt2 * dt
+        Q = np.array([[dt3 * dt2 / 20, dt2 * dt2 / 8, dt3 / 6],
+                      [dt2 * dt2 / 8, dt3 / 3, dt2 / 2],
+                      [dt3 / 6, dt2 / 2, dt]])
+        return F, Q
+
+    def update(self, update):
+        """ Fuses a BalloonUpdate into the filter. Returns False if the fix was too old to use """
+
+        seconds = self.filterTime(update.getSeconds())
+        horizontal, vertical = SOURCE_NOISE.get(update.getTrackingMethod(), DEFAULT_NOISE)
+        noise = np.array([horizontal, horizontal, vertical]) ** 2
+
+        if self.x is not None and seconds - self.lastSeconds > self.maxGap:
+            self.reset()
+            seconds = update.getSeconds()
+
+        if self.x is None:
+            # Start the filter at the first fix, with no idea of the velocity
+            self.refLat = update.getLat()
+            self.refLon = update.getLon()
+            self.cosRefLat = math.cos(math.radians(self.refLat))
+            z = self.toLocal(update.getLat(), update.getLon(), update.getAlt())
+            self.x = np.zeros((3, 3))
+            self.x[:, 0] = z
+            self.P = np.zeros((3, 3, 3))
+            for axis in range(3):
+                self.P[axis] = np.diag([noise[axis], 50.0 ** 2, 0.01])
+            self.lastSeconds = seconds
+            self.fixCount = 1
+            return True
+
+        dt = seconds - self.lastSeconds
+        if dt < 0:
+            return False
+
+        z = self.toLocal(update.getLat(), update.getLon(), update.getAlt())
+        F, Q = self.transition(dt)
+        for axis in range(3):
+            # Predict
+            x = F.dot(self.x[axis])
+            P = F.dot(self.P[axis]).dot(F.T) + Q * self.jerk[axis]
+            # Update with a position measurement (H = [1, 0, 0])
+            innovation = z[axis] - x[0]
+            S = P[0, 0] + noise[axis]
+            if innovation * innovation / S > self.maneuverThreshold:
+                # The fix doesn't fit the current motion (burst, wind shear), so
+                # allow the velocity and acceleration the miss implies
+                P = P.copy()
+                P[1, 1] += (innovation / max(dt, 1.0)) ** 2
+                P[2, 2] += (2 * innovation / max(dt, 1.0) ** 2) ** 2
+                S = P[0, 0] + noise[axis]
+            K = P[:, 0] / S
+            x = x + K * innovation
+            P = P - np.outer(K, P[0, :])
+            self.x[axis] = x
+            self.P[axis] = P
+
+        self.lastSeconds = seconds
+        self.fixCount += 1
+        return True
+
+    def predict(self, seconds):
+        """
+        Returns the estimated (lat, lon, alt, latSpeed, lonSpeed, altSpeed) at the
+        seconds-of-day time, with speeds in degrees or feet per second
+        """
+
+        seconds = seconds + self.dayOffset
+        if seconds < self.lastSeconds - 43200:
+            seconds += 86400
+        dt = seconds - self.lastSeconds
+        p = self.x[:, 0] + self.x[:, 1] * dt + 0.5 * self.x[:, 2] * dt * dt
+        v = self.x[:, 1] + self.x[:, 2] * dt
+
+        lat, lon, alt = self.toGeodetic(p[0], p[1], p[2])
+        latSpeed = math.degrees(v[1] / R_EARTH)
+        lonSpeed = math.degrees(v[0] / (R_EARTH * self.cosRefLat))
+        return lat, lon, alt, latSpeed, lonSpeed, v[2] * FEET_PER_METER
@@ -0,0 +1,11 @@
+from PySide2.QtWebEngineWidgets import QWebEngineView as QWebView
+
+
+class WebView(QWebView):
+    """ A class that allows messages from JavaScript being run in a QWebView to be printed """
+
+    def javaScriptConsoleMessage(self, message, line, source):
+        if source:
+            print('line(%s) source(%s): %s' % (line, source, message))
+        else:
+            print(message)
@@ -1,25 +1,32 @@
-import numpy
-
-
-def mapCalc(angleOne, pwmOne, angleTwo, pwmTwo):
-    angleOne = 180 - angleOne
-    if angleOne < 0:
-        angleOne = angleOne + 360
-
-    angleTwo = 180 - angleTwo
-    if angleTwo < 0:
-        angleTwo = angleTwo + 360
-
-    angleOne = angleOne * 4
-    angleTwo = angleTwo * 4
-
-    a = numpy.array([[angleOne, 4], [angleTwo, 4]])
-    b = numpy.array([pwmOne, pwmTwo])
-    x = numpy.linalg.solve(a, b)
-
-    print(x)
-
-
-# input values in the order degreesOne, pwmOne, degreesTwo, pwmTwo
-# mapCalc(0, 6000, 90, 5000)
-mapCalc(0, 6000, 90, 5000)
+import sys
+from ServoCalibration import *
+
+
+def mapCalc(profile, servo, points, method='linear', path='servoCalibration.json'):
+    """
+    Fits the named station's pan or tilt calibration to the measured
+    (degrees, servo target) points and saves it. Needs at least two points,
+    and more let a spline follow the servo's nonlinearity
+    """
+
+    calibration = StationCalibration.load(path, profile)
+    old = getattr(calibration, servo)
+    new = AngleMap(points, method, old.minPwm, old.maxPwm, old.angleRange)
+    setattr(calibration, servo, new)
+    calibration.save(path, profile)
+
+    for angle, pwm in new.points:
+        print("%7.2f deg  measured %6.0f  table %5d" % (angle, pwm, new(angle)))
+    print("Saved the " + servo + " calibration for " + profile + " in " + path)
+
+
+# input values in the order profile, pan or tilt, then degreesOne, pwmOne, degreesTwo, pwmTwo, ...
+# and spline as the last argument for a spline fit
+# python mapCalc.py VLAD tilt 0 6000 45 5500 90 5000
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    method = 'linear'
+    if args and args[-1] in ('linear', 'spline'):
+        method = args.pop()
+    values = [float(arg) for arg in args[2:]]
+    mapCalc(args[0], args[1], list(zip(values[0::2], values[1::2])), method)
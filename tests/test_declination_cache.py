@@ -0,0 +1,45 @@
+import types
+import unittest
+
+import Subsystems
+from DeclinationCache import *
+
+
+class DeclinationCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.declination = Subsystems.SUBSYSTEMS['declination']
+        self.addCleanup(Subsystems.SUBSYSTEMS.__setitem__, 'declination', self.declination)
+
+    def test_nearby_fixes_share_a_cell(self):
+        if self.declination.load() is None:
+            self.skipTest("the declination model isn't installed")
+        cache = DeclinationCache()
+        first = cache.declination(45.6, -111.0, 5600)
+        self.assertEqual(cache.declination(45.605, -111.005, 5800), first)
+        self.assertEqual(cache.getStats(), (1, 1))
+        self.assertNotEqual(cache.declination(30.0, -90.0, 5000), first)
+
+    def test_least_recently_used_cell_is_evicted(self):
+        model = Subsystems.Subsystem("test model")
+        model.loaded = types.SimpleNamespace(declination=lambda dlat, dlon, h: dlat)
+        Subsystems.SUBSYSTEMS['declination'] = model
+        cache = DeclinationCache(maxSize=2)
+        cache.declination(1, 0, 0)
+        cache.declination(2, 0, 0)
+        cache.declination(1, 0, 0)
+        cache.declination(3, 0, 0)
+        self.assertEqual(len(cache.cache), 2)
+        self.assertIn((50, 0, 0), cache.cache)
+        self.assertNotIn((100, 0, 0), cache.cache)
+
+    def test_missing_model_leaves_bearings_magnetic(self):
+        Subsystems.SUBSYSTEMS['declination'] = Subsystems.Subsystem("test model", declination='noSuchModule:declination')
+        cache = DeclinationCache()
+        self.assertEqual(cache.declination(45.6, -111.0, 5000), 0.0)
+        self.assertEqual(cache.declination(30.0, -90.0, 5000), 0.0)
+        self.assertEqual(len(cache.cache), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+
+from BalloonUpdate import BalloonUpdate
+from FlightTrack import *
+
+
+def addRows(track, count, start=0):
+    for i in range(start, start + count):
+        track.appendValues(i, 45.0 + i, -111.0, 1000.0 * i, 90.0, 10.0, 5.0, SOURCE_CODES['RFD'])
+
+
+class FlightTrackTest(unittest.TestCase):
+
+    def test_grows_by_doubling(self):
+        track = FlightTrack(capacity=4, maxLength=None)
+        addRows(track, 9)
+        self.assertEqual(len(track), 9)
+        self.assertEqual(track.capacity, 16)
+        self.assertEqual(list(track.time), list(range(9)))
+        self.assertEqual(track.lastTime(), 8)
+
+    def test_columns_are_views(self):
+        track = FlightTrack(capacity=8)
+        addRows(track, 3)
+        alt = track.alt
+        self.assertIs(alt.base, track.data)
+        self.assertEqual(list(alt), [0.0, 1000.0, 2000.0])
+        self.assertEqual(list(track.column('lat')), list(track.lat))
+
+    def test_oldest_quarter_is_dropped_at_max_length(self):
+        track = FlightTrack(capacity=4, maxLength=8)
+        addRows(track, 9)
+        self.assertEqual(len(track), 7)
+        self.assertEqual(list(track.time), list(range(2, 9)))
+        self.assertEqual(track.capacity, 8)
+
+    def test_append_update(self):
+        track = FlightTrack()
+        update = BalloonUpdate('12:00:00', 43200, 45.7, -111.1, 8000, 'Iridium', 45.6, -111.0, 4900)
+        track.append(update)
+        self.assertEqual(track.lastTime(), 43200)
+        self.assertAlmostEqual(track.bear[0], update.getBear())
+        self.assertAlmostEqual(track.ele[0], update.getEle())
+        self.assertEqual(SOURCE_NAMES[track.source[0]], 'Iridium')
+
+    def test_clear(self):
+        track = FlightTrack()
+        addRows(track, 5)
+        track.clear()
+        self.assertEqual(len(track), 0)
+        addRows(track, 1, start=10)
+        self.assertEqual(list(track.time), [10])
+
+
+if __name__ == '__main__':
+    unittest.main()
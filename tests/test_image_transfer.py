@@ -0,0 +1,315 @@
+import io
+import base64
+import os
+import pty
+import tty
+import random
+import struct
+import shutil
+import tempfile
+import threading
+import unittest
+
+import serial
+
+from ImageTransfer import *
+
+
+def transfer(image, receiver, byteErrorRate=0.0, seed=1, **senderArgs):
+    """ Runs receiver against a SelectiveRepeatSender over a fast simulated link and returns the bytes received """
+
+    master, slave = pty.openpty()
+    tty.setraw(slave)
+    ground = serial.Serial(os.ttyname(slave), timeout=2)
+    link = SimulatedLink(master, baud=1000000, latency=0.01, byteErrorRate=byteErrorRate, seed=seed)
+    sender = SelectiveRepeatSender(link, image, timeout=0.3, giveUp=5, **senderArgs)
+    thread = threading.Thread(target=sender.run)
+    thread.daemon = True
+    thread.start()
+    out = io.BytesIO()
+    try:
+        receiver.log = lambda text: None
+        receiver.receive(ground, out)
+        thread.join(5)		# The sender stops once it has seen the final ack
+    finally:
+        link.close()
+        ground.close()
+        os.close(master)
+        os.close(slave)
+    return out.getvalue()
+
+
+def randomImage(size, seed=1):
+    return random.Random(seed).getrandbits(8 * size).to_bytes(size, 'little')
+
+
+class CobsTest(unittest.TestCase):
+
+    def roundTrip(self, data):
+        encoded = cobsEncode(data)
+        self.assertNotIn(b'\x00', encoded)
+        self.assertEqual(cobsDecode(encoded), data)
+
+    def test_round_trips(self):
+        for data in (b'', b'\x00', b'\x00\x00', b'abc', b'a\x00b\x00', b'\x00abc\x00'):
+            self.roundTrip(data)
+
+    def test_long_blocks(self):
+        for length in (253, 254, 255, 508, 1000):
+            self.roundTrip(bytes((i % 255) + 1 for i in range(length)))
+            self.roundTrip(b'\x00' + b'\x01' * length + b'\x00')
+
+    def test_known_encoding(self):
+        self.assertEqual(cobsEncode(b'\x11\x22\x00\x33'), b'\x03\x11\x22\x02\x33')
+
+    def test_rejects_bad_blocks(self):
+        with self.assertRaises(ValueError):
+            cobsDecode(b'\x05ab')
+        with self.assertRaises(ValueError):
+            cobsDecode(b'\x02a\x00')
+
+
+class BinaryFrameTest(unittest.TestCase):
+
+    def test_data_frame_round_trip(self):
+        chunk = bytes(range(256)) * 3
+        frame = binaryDataFrame(4000, chunk)
+        self.assertEqual(frame[-1:], b'\x00')
+        self.assertNotIn(b'\x00', frame[:-1])
+        self.assertEqual(parseBinaryFrame(frame[:-1]), ('D', 4000, len(chunk), chunk))
+
+    def test_info_frame_round_trip(self):
+        self.assertEqual(parseBinaryFrame(binaryInfoFrame(30001, 1000)[:-1]), ('I', 30001, 1000, None))
+
+    def test_damaged_frame_fails_its_crc(self):
+        frame = bytearray(binaryDataFrame(0, b'hello world')[:-1])
+        frame[8] ^= 0x01
+        self.assertIsNone(parseBinaryFrame(bytes(frame)))
+
+    def test_length_must_match(self):
+        frame = BINARY_HEADER.pack(b'D', 0, 5) + b'abc'
+        self.assertIsNone(parseBinaryFrame(cobsEncode(frame + struct.pack('>I', crc(frame)))))
+
+
+class TextFrameTest(unittest.TestCase):
+
+    def test_data_frame_layout(self):
+        frame = dataFrame(0x1234, b'QUJD')
+        self.assertEqual(frame[:13], b'D000012340004')
+        self.assertEqual(len(frame), HEADER + 4)
+        self.assertEqual(int(frame[13:21], 16), crc(frame[1:13] + b'QUJD'))
+        self.assertTrue(FRAME_START.match(frame))
+
+    def test_info_frame_layout(self):
+        frame = infoFrame(30001, 1000)
+        self.assertEqual(len(frame), HEADER)
+        self.assertTrue(TEXT_INFO.match(frame))
+        self.assertEqual(int(frame[21 - 8:], 16), crc(frame[1:13]))
+
+    def test_crc_is_unsigned(self):
+        self.assertEqual(crc(b'123456789'), 0xcbf43926)
+
+
+class Base64DecoderTest(unittest.TestCase):
+
+    def test_decodes_across_uneven_writes(self):
+        image = bytes(range(256)) * 5
+        encoded = base64.b64encode(image)
+        out = io.BytesIO()
+        decoder = Base64Decoder(out)
+        i = 0
+        for size in (1, 2, 3, 5, 7, 11) * 200:
+            decoder.write(encoded[i:i + size])
+            i += size
+        decoder.write(encoded[i:])
+        decoder.close()
+        self.assertEqual(out.getvalue(), image)
+        self.assertEqual(decoder.consumed, len(encoded))
+        self.assertEqual(decoder.written, len(image))
+
+    def test_close_pads_a_cut_short_image(self):
+        out = io.BytesIO()
+        decoder = Base64Decoder(out)
+        decoder.write(base64.b64encode(b'abcdef')[:-2])
+        decoder.close()
+        self.assertEqual(out.getvalue(), b'abcd')
+
+    def test_stray_characters_dont_stop_the_decode(self):
+        out = io.BytesIO()
+        decoder = Base64Decoder(out)
+        decoder.write(b'YWJj\nZGVm\n')
+        decoder.close()
+        self.assertEqual(out.getvalue()[:3], b'abc')
+
+
+class RangeTest(unittest.TestCase):
+
+    def test_add_range_merges(self):
+        ranges = addRange([], 10, 20)
+        ranges = addRange(ranges, 30, 40)
+        self.assertEqual(ranges, [(10, 20), (30, 40)])
+        self.assertEqual(addRange(ranges, 20, 30), [(10, 40)])
+        self.assertEqual(addRange(ranges, 0, 5), [(0, 5), (10, 20), (30, 40)])
+        self.assertEqual(addRange(ranges, 15, 35), [(10, 40)])
+
+    def test_is_covered(self):
+        ranges = [(0, 100), (200, 300)]
+        self.assertTrue(isCovered(ranges, 0, 100))
+        self.assertTrue(isCovered(ranges, 250, 260))
+        self.assertFalse(isCovered(ranges, 90, 210))
+        self.assertFalse(isCovered(ranges, 100, 101))
+
+
+class SelectiveRepeatTest(unittest.TestCase):
+
+    def test_clean_link(self):
+        image = randomImage(6000)
+        receiver = SelectiveRepeatReceiver(window=4, chunkSize=500, timeout=5)
+        self.assertEqual(transfer(image, receiver), image)
+        self.assertEqual(receiver.failures, 0)
+        self.assertEqual(receiver.binary, False)
+
+    def test_binary_mode(self):
+        image = randomImage(6000)
+        receiver = SelectiveRepeatReceiver(window=4, chunkSize=500, timeout=5, binary=True)
+        framing = []
+        receiver.framing = framing.append
+        self.assertEqual(transfer(image, receiver, byteErrorRate=5e-4, seed=3), image)
+        self.assertEqual(receiver.binary, True)
+        self.assertEqual(framing, [True, True])
+
+    def test_falls_back_to_text_for_a_text_only_payload(self):
+        image = randomImage(3000)
+        receiver = SelectiveRepeatReceiver(window=4, chunkSize=500, timeout=5, binary=True,
+                                           binaryTries=1, handshakeInterval=0.2)
+        framing = []
+        receiver.framing = framing.append
+        self.assertEqual(transfer(image, receiver, binary=False), image)
+        self.assertEqual(receiver.binary, False)
+        self.assertEqual(framing[0], True)
+        self.assertEqual(framing[-1], False)
+
+    def test_damaged_and_lost_bytes_are_sent_again(self):
+        image = randomImage(6000)
+        receiver = SelectiveRepeatReceiver(window=4, chunkSize=500, timeout=5)
+        self.assertEqual(transfer(image, receiver, byteErrorRate=5e-4, seed=3), image)
+        self.assertGreater(receiver.failures, 0)
+
+
+
+class ResumeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'image.part')
+
+    def test_picks_up_where_a_cancelled_transfer_stopped(self):
+        image = randomImage(8000)
+        first = SelectiveRepeatReceiver(window=4, chunkSize=500, timeout=5, partial=PartialImage(self.path))
+        first.cancelled = lambda: first.received > len(base64.b64encode(image)) // 2
+        transfer(image, first)
+        held = sum(e - s for s, e in first.ranges)
+        self.assertGreater(held, 0)
+        self.assertLess(held, first.size)
+
+        second = SelectiveRepeatReceiver(window=4, chunkSize=500, timeout=5, partial=PartialImage(self.path))
+        starts = []
+        second.progress = lambda received, total: starts.append(received)
+        self.assertEqual(transfer(image, second), image)
+        self.assertGreater(starts[0], held)
+
+    def test_a_different_image_starts_over(self):
+        partial = PartialImage(self.path)
+        self.assertEqual(partial.open(1000), [])
+        partial.update([(0, 500)])
+        partial.close()
+        for size, held in ((1000, [(0, 500)]), (1200, [])):
+            partial = PartialImage(self.path)
+            self.assertEqual(partial.open(size), held)
+            partial.close()
+
+
+class ChunkSizeControllerTest(unittest.TestCase):
+
+    def test_grows_by_step_after_a_streak(self):
+        controller = ChunkSizeController(size=1000, step=200, growAfter=4)
+        for i in range(3):
+            self.assertFalse(controller.success())
+        self.assertTrue(controller.success())
+        self.assertEqual(controller.size, 1200)
+        self.assertEqual(controller.history, [1000, 1200])
+
+    def test_failure_halves_and_resets_the_streak(self):
+        controller = ChunkSizeController(size=1000, growAfter=4)
+        for i in range(3):
+            controller.success()
+        self.assertTrue(controller.failure())
+        self.assertEqual(controller.size, 500)
+        for i in range(3):
+            self.assertFalse(controller.success())
+        self.assertEqual(controller.size, 500)
+
+    def test_stays_within_the_limits(self):
+        controller = ChunkSizeController(size=300, minSize=200, maxSize=400, step=200, growAfter=1)
+        controller.failure()
+        self.assertEqual(controller.size, 200)
+        self.assertFalse(controller.failure())
+        controller.success()
+        controller.success()
+        self.assertEqual(controller.size, 400)
+        self.assertFalse(controller.success())
+        self.assertEqual(ChunkSizeController(size=10000, maxSize=4000).size, 4000)
+
+    def test_smooths_the_round_trip_time(self):
+        controller = ChunkSizeController()
+        controller.addRtt(1.0)
+        controller.addRtt(2.0)
+        self.assertAlmostEqual(controller.rtt, 1.125)
+
+    def test_paces_the_acks_from_the_round_trip(self):
+        controller = ChunkSizeController(minAckInterval=0.05, maxAckInterval=2.0)
+        self.assertEqual(controller.ackInterval(0.2), 0.2)
+        controller.addRtt(0.3)
+        self.assertAlmostEqual(controller.ackInterval(0.2), 0.6)
+        controller.rtt = 0.001
+        self.assertEqual(controller.ackInterval(0.2), 0.05)
+        controller.rtt = 5
+        self.assertEqual(controller.ackInterval(0.2), 2.0)
+
+    def test_best_size_is_the_fastest_one(self):
+        now = [0.0]
+        controller = ChunkSizeController(size=1000, minSample=0.5, clock=lambda: now[0])
+        controller.delivered(0)
+        now[0] = 1.0
+        controller.delivered(3000)		# 3000 B/s at 1000
+        controller.setSize(2000)
+        controller.delivered(0)
+        now[0] = 2.0
+        controller.delivered(4000)		# 4000 B/s at 2000
+        controller.setSize(1000)
+        controller.delivered(0)
+        now[0] = 2.1
+        controller.delivered(500)		# Not long enough at 1000 to change its rate much
+        self.assertEqual(controller.size, 1000)
+        self.assertEqual(controller.bestSize(), 2000)
+
+    def test_best_size_without_enough_time_is_the_current_one(self):
+        now = [0.0]
+        controller = ChunkSizeController(size=1000, minSample=0.5, clock=lambda: now[0])
+        controller.delivered(100)
+        now[0] = 0.1
+        controller.failure()
+        self.assertEqual(controller.bestSize(), 500)
+
+    def test_an_adaptive_transfer_measures_the_round_trip(self):
+        image = randomImage(6000)
+        controller = ChunkSizeController(size=500, minSize=200)
+        receiver = SelectiveRepeatReceiver(window=4, controller=controller, timeout=5)
+        self.assertEqual(transfer(image, receiver, byteErrorRate=5e-4, seed=3), image)
+        self.assertIsNotNone(controller.rtt)
+        self.assertLess(controller.rtt, 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,233 @@
+import json
+import os
+import shutil
+import socket
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+from Iridium import *
+
+
+class SqliteConnection(object):
+    """ A sqlite3 connection that takes MySQLdb's %s parameters, standing in for the Iridium database """
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+
+    def cursor(self):
+        return SqliteCursor(self.connection.cursor())
+
+    def commit(self):
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+
+class SqliteCursor(object):
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def execute(self, sql, params=()):
+        self.cursor.execute(sql.replace('%s', '?'), params)
+
+    def fetchall(self):
+        return self.cursor.fetchall()
+
+    def close(self):
+        self.cursor.close()
+
+
+def closedPort():
+    """ A local port nothing is listening on """
+
+    s = socket.socket()
+    s.bind(('127.0.0.1', 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    """ Serves the server's body with its ETag, answering 304 when the client already has it """
+
+    protocol_version = 'HTTP/1.1'		# Keep-alive
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        if self.server.status != 200:
+            self.send_response(self.server.status)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        elif self.headers.get('If-None-Match') == self.server.etag:
+            self.send_response(304)
+            self.end_headers()
+        else:
+            self.send_response(200)
+            self.send_header('ETag', self.server.etag)
+            self.send_header('Content-Length', str(len(self.server.body)))
+            self.end_headers()
+            self.wfile.write(self.server.body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+IMEI = '300234064909640'
+
+
+class IridiumDatabaseTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'iridium.db')
+        connection = sqlite3.connect(self.path)
+        connection.execute("CREATE TABLE gps (pri_key INTEGER PRIMARY KEY, gps_IMEI TEXT, gps_fltDate TEXT, "
+                           "gps_time TEXT, gps_lat REAL, gps_long REAL, gps_alt REAL)")
+        connection.commit()
+        connection.close()
+        self.connections = 0
+        self.addRow('12:00:00', 45.60, -111.00, 1500)
+        self.addRow('12:01:00', 45.61, -111.01, 1800)
+        self.addRow('12:00:30', 10.0, 10.0, 10, imei='123')
+
+    def addRow(self, gpsTime, lat, lon, alt, imei=IMEI):
+        connection = sqlite3.connect(self.path)
+        connection.execute("INSERT INTO gps (gps_IMEI, gps_fltDate, gps_time, gps_lat, gps_long, gps_alt) "
+                           "VALUES (?, '2026-10-18', ?, ?, ?, ?)", (imei, gpsTime, lat, lon, alt))
+        connection.commit()
+        connection.close()
+
+    def connect(self):
+        self.connections += 1
+        return SqliteConnection(self.path)
+
+    def makeDatabase(self, **kwargs):
+        database = IridiumDatabase('host', 'user', 'pass', 'name', connector=self.connect, **kwargs)
+        self.addCleanup(database.close)
+        return database
+
+    def makePoller(self, backfill=False):
+        poller = IridiumPoller('host', 'user', 'pass', 'name', IMEI, backfill=backfill)
+        poller.api = IridiumApi('127.0.0.1', port=closedPort(), timeout=1)
+        poller.database = self.makeDatabase()
+        self.addCleanup(poller.close)
+        return poller
+
+    def test_first_query_is_the_newest_row_then_only_new_rows(self):
+        database = self.makeDatabase()
+        self.assertTrue(database.ensureConnected())
+        self.assertEqual(rowsToFixes(database.newRows(IMEI))[0][0], '12:01:00')
+        self.assertEqual(database.newRows(IMEI), [])
+        self.addRow('12:02:00', 45.62, -111.02, 2100)
+        self.assertEqual([fix[0] for fix in rowsToFixes(database.newRows(IMEI))], ['12:02:00'])
+        self.assertEqual(self.connections, 1)
+
+    def test_fix_units(self):
+        database = self.makeDatabase()
+        database.ensureConnected()
+        remoteTime, seconds, lat, lon, alt = rowsToFixes(database.newRows(IMEI))[0]
+        self.assertEqual(seconds, 12 * 3600 + 60)
+        self.assertEqual((lat, lon), (45.61, -111.01))
+        self.assertAlmostEqual(alt, 1800 * FEET_PER_METER)
+
+    def test_reconnects_with_backoff(self):
+        def refuse():
+            raise IOError("refused")
+        database = IridiumDatabase('host', 'user', 'pass', 'name', connector=refuse, maxBackoff=30)
+        self.assertFalse(database.ensureConnected())
+        self.assertFalse(database.ensureConnected())		# Still backing off, so no new attempt
+        self.assertEqual(database.failures, 1)
+        self.assertGreater(database.retryDelay(), 0)
+
+    def test_poller_falls_back_to_the_database(self):
+        poller = self.makePoller()
+        self.assertEqual([fix[0] for fix in poller.poll()], ['12:01:00'])
+        self.addRow('12:02:00', 45.62, -111.02, 2100)
+        self.assertEqual([fix[0] for fix in poller.poll()], ['12:02:00'])
+
+    def test_backfill_loads_the_whole_track_at_startup(self):
+        poller = self.makePoller(backfill=True)
+        self.assertEqual([fix[0] for fix in poller.start()], ['12:00:00', '12:01:00'])
+        self.assertIsNone(poller.lastFixArrival)		# Old fixes don't say when the next is due
+        self.assertEqual(poller.poll(), [])
+        self.addRow('12:02:00', 45.62, -111.02, 2100)
+        self.assertEqual([fix[0] for fix in poller.poll()], ['12:02:00'])
+
+    def test_no_backfill_without_asking_or_without_a_database(self):
+        self.assertEqual(self.makePoller().start(), [])
+        poller = IridiumPoller('host', 'user', None, 'name', IMEI, backfill=True)
+        self.addCleanup(poller.close)
+        self.assertIsNone(poller.database)
+        self.assertEqual(poller.start(), [])
+
+
+class IridiumApiTest(unittest.TestCase):
+
+    FIX = {'remoteTime': '12:01:00', 'remoteHours': '12', 'remoteMinutes': '1', 'remoteSeconds': '0',
+           'remoteLat': '45.61', 'remoteLon': '-111.01', 'remoteAlt': '5905.5'}
+
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), ApiHandler)
+        self.server.connections = 0
+        self.server.requests = []
+        self.server.status = 200
+        self.setFix(self.FIX, '"1"')
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.api = IridiumApi('127.0.0.1', port=self.server.server_address[1], timeout=2)
+        self.addCleanup(self.api.close)
+
+    def setFix(self, fix, etag):
+        self.server.body = json.dumps(fix).encode('utf-8')
+        self.server.etag = etag
+
+    def test_fix_then_not_modified_on_one_connection(self):
+        data = self.api.fetch(IMEI)
+        self.assertEqual(apiToFix(data), ('12:01:00', 12 * 3600 + 60, 45.61, -111.01, 5905.5))
+        self.assertIsNone(self.api.fetch(IMEI))
+        self.assertIsNone(self.api.fetch(IMEI))
+        self.assertEqual(self.server.requests, ['/php/antennaTracker.php?imei=' + IMEI] * 3)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_same_body_under_a_new_etag_is_unchanged(self):
+        self.api.fetch(IMEI)
+        self.server.etag = '"2"'
+        self.assertIsNone(self.api.fetch(IMEI))
+        fix = dict(self.FIX, remoteTime='12:02:00', remoteMinutes='2')
+        self.setFix(fix, '"3"')
+        self.assertEqual(self.api.fetch(IMEI)['remoteTime'], '12:02:00')
+
+    def test_errors_are_empty(self):
+        self.server.status = 500
+        self.assertEqual(self.api.fetch(IMEI), {})
+        self.server.status = 200
+        self.server.body = b'not json'
+        self.assertEqual(self.api.fetch(IMEI), {})
+        self.assertEqual(IridiumApi('127.0.0.1', port=closedPort(), timeout=1).fetch(IMEI), {})
+
+    def test_reconnects_when_the_server_drops_the_connection(self):
+        self.api.fetch(IMEI)
+        self.api.connection.sock.close()		# As if the server timed the idle connection out
+        self.assertIsNone(self.api.fetch(IMEI))
+        self.assertEqual(self.server.connections, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
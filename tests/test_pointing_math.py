@@ -0,0 +1,91 @@
+import unittest
+
+import numpy as np
+
+import PointingMath
+from PointingMath import *
+
+
+class PointingArraysTest(unittest.TestCase):
+
+    def test_batch_flat_math_matches_single_fixes(self):
+        lats = np.array([45.70, 46.10])
+        lons = np.array([-111.00, -110.50])
+        alts = np.array([6000, 50000])
+        bears, eles, loss = pointingArrays(45.6673, -111.0447, 4920, lats, lons, alts)
+        for i in range(len(lats)):
+            distance = haversine(45.6673, -111.0447, lats[i], lons[i])
+            self.assertAlmostEqual(bears[i], bearing(45.6673, -111.0447, lats[i], lons[i]), places=6)
+            self.assertAlmostEqual(eles[i], elevationAngle(alts[i], 4920, distance), places=6)
+            self.assertAlmostEqual(loss[i], losDistance(alts[i], 4920, distance), places=6)
+
+    def test_bearings_are_between_0_and_360(self):
+        bears = bearingArray(45.6673, -111.0447, [45.70, 45.60, 45.60], [-111.10, -111.10, -110.90])
+        self.assertTrue(((bears >= 0) & (bears < 360)).all())
+        self.assertGreater(bears[0], 270)
+
+
+def angleBetween(a, b):
+    return abs((a - b + 180) % 360 - 180)
+
+
+class PointingSolverTest(unittest.TestCase):
+
+    def setUp(self):
+        self.solver = PointingSolver(45.6673, -111.0447, 4920)
+
+    def test_bearing_points_along_the_compass(self):
+        self.assertAlmostEqual(angleBetween(self.solver.solve(45.7673, -111.0447, 4920)[0], 0), 0, places=3)
+        self.assertAlmostEqual(self.solver.solve(45.6673, -110.9447, 4920)[0], 90, delta=0.1)
+        self.assertAlmostEqual(self.solver.solve(45.5673, -111.0447, 4920)[0], 180, places=3)
+        self.assertAlmostEqual(self.solver.solve(45.6673, -111.1447, 4920)[0], 270, delta=0.1)
+
+    def test_straight_up(self):
+        bear, ele, los = self.solver.solve(45.6673, -111.0447, 4920 + 10000 * FEET_PER_METER)
+        self.assertAlmostEqual(ele, 90, places=3)
+        self.assertAlmostEqual(los, 10, places=3)
+
+    def test_matches_the_flat_math_nearby(self):
+        lat, lon, alt = 45.70, -111.00, 30000
+        bear, ele, los = self.solver.solve(lat, lon, alt)
+        distance = haversine(45.6673, -111.0447, lat, lon)
+        self.assertAlmostEqual(bear, bearing(45.6673, -111.0447, lat, lon), delta=0.1)
+        self.assertAlmostEqual(ele, elevationAngle(alt, 4920, distance), delta=0.2)
+        self.assertAlmostEqual(los, losDistance(alt, 4920, distance), delta=0.05)
+
+    def test_curvature_lowers_distant_targets(self):
+        # 200 km away at the ground station's altitude is below the horizon
+        lat = 45.6673 + 200 / 111.2
+        self.assertLess(self.solver.solve(lat, -111.0447, 4920)[1], -0.5)
+
+    def test_arrays_match_single_fixes(self):
+        lats = [45.70, 46.10, 45.20]
+        lons = [-111.00, -110.50, -111.90]
+        alts = [6000, 50000, 90000]
+        bears, eles, loss = self.solver.solveArrays(lats, lons, alts)
+        for i in range(len(lats)):
+            bear, ele, los = self.solver.solve(lats[i], lons[i], alts[i])
+            self.assertAlmostEqual(bears[i], bear, places=6)
+            self.assertAlmostEqual(eles[i], ele, places=6)
+            self.assertAlmostEqual(loss[i], los, places=6)
+
+
+class SolverCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        PointingMath.currentSolver = None
+
+    def test_reuses_the_solver_for_the_same_station(self):
+        solver = getSolver(45.6673, -111.0447, 4920)
+        self.assertIs(getSolver(45.6673, -111.0447, 4920), solver)
+
+    def test_rebuilds_when_the_station_moves(self):
+        solver = getSolver(45.6673, -111.0447, 4920)
+        moved = getSolver(45.6673, -111.0447, 4921)
+        self.assertIsNot(moved, solver)
+        self.assertTrue(moved.isStation(45.6673, -111.0447, 4921))
+        self.assertIs(getSolver(45.6673, -111.0447, 4921), moved)
+
+
+if __name__ == '__main__':
+    unittest.main()
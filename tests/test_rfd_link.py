@@ -0,0 +1,189 @@
+import time
+import threading
+import unittest
+
+from RfdLink import *
+from ImageTransfer import binaryDataFrame, parseBinaryFrame
+
+
+class FakeDevice(object):
+    """ Stands in for the RFD's serial port: bytes put in come out of read, and writes are recorded """
+
+    def __init__(self, writeDelay=0):
+        self.timeout = 2
+        self.incoming = bytearray()
+        self.written = []
+        self.writeDelay = writeDelay
+        self.condition = threading.Condition()
+
+    def put(self, data):
+        with self.condition:
+            self.incoming += data
+            self.condition.notify_all()
+
+    @property
+    def in_waiting(self):
+        return len(self.incoming)
+
+    def read(self, size=1):
+        with self.condition:
+            self.condition.wait_for(lambda: self.incoming, self.timeout)
+            data = bytes(self.incoming[:size])
+            del self.incoming[:size]
+            return data
+
+    def write(self, data):
+        time.sleep(self.writeDelay)
+        self.written.append(bytes(data))
+
+
+def waitFor(condition, timeout=2):
+    end = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > end:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+class RfdLinkWriteTest(unittest.TestCase):
+
+    def setUp(self):
+        self.device = FakeDevice(writeDelay=0.01)
+        self.link = RfdLink(self.device)
+        self.command = self.link.channel('command', RfdLink.COMMAND)
+        self.image = self.link.channel('image', RfdLink.IMAGE)
+        self.link.start()
+        self.addCleanup(self.link.stop)
+
+    def test_flush_waits_for_the_writes_to_go_out(self):
+        for i in range(5):
+            self.image.write(b'A/settings' + str(i).encode() + b'\n')
+            self.image.flushOutput()
+            self.assertEqual(len(self.device.written), i + 1)
+        self.assertEqual(self.device.written[-1], b'A/settings4\n')
+
+    def test_reset_drops_the_queued_writes(self):
+        self.command.write(b'first')		# Keeps the writer busy
+        for i in range(5):
+            self.image.write(b'image')
+        self.image.reset_output_buffer()
+        self.command.flushOutput()
+        self.image.flushOutput()
+        self.assertNotIn(b'image', self.device.written)
+
+    def test_commands_go_ahead_of_image_traffic(self):
+        self.image.write(b'busy')
+        for i in range(5):
+            self.image.write(b'image')
+        self.command.write(b'command')
+        self.image.flushOutput()
+        self.assertLess(self.device.written.index(b'command'), 5)
+
+
+class RfdLinkReadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.device = FakeDevice()
+        self.link = RfdLink(self.device, timeout=0.5)
+        self.image = self.link.channel('image', RfdLink.IMAGE)
+        self.lines = []
+        self.link.subscribe(self.lines.append)
+        self.link.start()
+        self.addCleanup(self.link.stop)
+
+    def test_lines_go_to_the_subscribers(self):
+        self.device.put(b'GPS;12,34,56,45.6,-111.0,1500,9\nhello\n')
+        self.assertTrue(waitFor(lambda: len(self.lines) == 2))
+        self.assertEqual(self.lines, [b'GPS;12,34,56,45.6,-111.0,1500,9\n', b'hello\n'])
+
+    def test_gps_lines_are_picked_out_of_a_claimed_stream(self):
+        self.link.claim(self.image)
+        self.device.put(b'D0000abcd+/QUJD')
+        self.device.put(b'GPS;12,34,56,45.6,-111.0,1500,9\n')
+        self.device.put(b'RUZH\nGPS')
+        self.assertTrue(waitFor(lambda: self.lines))
+        self.assertEqual(self.lines, [b'GPS;12,34,56,45.6,-111.0,1500,9\n'])
+        # "GPS" followed by base64 is image data
+        self.device.put(b'QUJD')
+        self.assertTrue(waitFor(lambda: self.image.in_waiting == 27))
+        self.assertEqual(self.image.read(27), b'D0000abcd+/QUJDRUZH\nGPSQUJD')
+        self.link.release(self.image)
+        self.device.put(b'after\n')
+        self.assertTrue(waitFor(lambda: len(self.lines) == 2))
+        self.assertEqual(self.lines[1], b'after\n')
+
+    def test_release_hands_over_held_bytes(self):
+        self.link.claim(self.image)
+        self.device.put(b'QUJDGP')
+        time.sleep(0.1)
+        self.link.release(self.image)
+        self.assertEqual(self.image.read(6), b'QUJDGP')
+
+    def test_binary_frames_that_look_like_gps_lines_are_left_alone(self):
+        chunk = b'\x01GPS;12,34,56,45.6,-111.0,1500,9\n\x02'
+        frame = binaryDataFrame(0, chunk)
+        gps = b'GPS;10,00,01,45.6,-111.0,2000,8\n'
+        self.link.claim(self.image, binary=True)
+        for i in range(3):
+            self.device.put(frame + gps)
+        self.assertTrue(waitFor(lambda: len(self.lines) == 3))
+        self.assertEqual(self.lines, [gps] * 3)
+        self.assertTrue(waitFor(lambda: self.image.in_waiting == 3 * len(frame)))
+        data = self.image.read(3 * len(frame))
+        for encoded in data.split(b'\x00')[:3]:
+            self.assertEqual(parseBinaryFrame(encoded), ('D', 0, len(chunk), chunk))
+
+    def test_gps_lines_at_the_start_of_a_binary_claim(self):
+        self.link.claim(self.image, binary=True)
+        self.device.put(b'GPS;10,00,01,45.6,-111.0,2000,8\nabc')
+        self.assertTrue(waitFor(lambda: self.lines))
+        self.assertTrue(waitFor(lambda: self.image.in_waiting == 3))
+
+    def test_watched_lines_are_picked_out_of_a_claimed_stream(self):
+        self.link.watchLine(b'IMAGE')
+        self.link.claim(self.image)
+        self.device.put(b'D0000abcd+/QUJDIMA')
+        self.device.put(b'GE\r\nRUZH')
+        self.assertTrue(waitFor(lambda: self.lines))
+        self.assertEqual(self.lines, [b'IMAGE\r\n'])
+        self.assertTrue(waitFor(lambda: self.image.in_waiting == 19))
+        self.assertEqual(self.image.read(19), b'D0000abcd+/QUJDRUZH')
+
+        # Once the acknowledge has come in, the same text is image data again
+        self.link.unwatchLine(b'IMAGE')
+        self.device.put(b'IMAGE\n')
+        self.assertTrue(waitFor(lambda: self.image.in_waiting == 6))
+        self.assertEqual(self.lines, [b'IMAGE\r\n'])
+
+    def test_holds_what_could_start_a_line(self):
+        self.link.watchLine(b'IMAGE')
+        self.assertEqual(self.link.partialStart(b'QUJDGP'), 2)
+        self.assertEqual(self.link.partialStart(b'QUJDGPS'), 3)
+        self.assertEqual(self.link.partialStart(b'QUJDIMA'), 3)
+        self.assertEqual(self.link.partialStart(b'QUJDIMAGE\r'), 6)
+        self.assertEqual(self.link.partialStart(b'QUJD'), 0)
+
+    def test_watched_lines_between_binary_frames(self):
+        self.link.watchLine(b'ID')
+        self.link.claim(self.image, binary=True)
+        frame = binaryDataFrame(0, b'\x01ID\n\x02')
+        self.device.put(frame + b'ID\n' + frame)
+        self.assertTrue(waitFor(lambda: self.lines))
+        self.assertEqual(self.lines, [b'ID\n'])
+        self.assertTrue(waitFor(lambda: self.image.in_waiting == 2 * len(frame)))
+        self.assertEqual(self.image.read(2 * len(frame)), frame * 2)
+
+    def test_binary_is_only_set_by_the_claimant(self):
+        other = self.link.channel('command', RfdLink.COMMAND)
+        self.link.claim(self.image)
+        self.link.setBinary(other, True)
+        self.assertFalse(self.link.binary)
+        self.link.setBinary(self.image, True)
+        self.assertTrue(self.link.binary)
+        self.link.release(self.image)
+        self.assertFalse(self.link.binary)
+
+
+if __name__ == '__main__':
+    unittest.main()
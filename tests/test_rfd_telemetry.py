@@ -0,0 +1,49 @@
+import unittest
+
+from RfdTelemetry import *
+
+
+class TelemetryParserTest(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = TelemetryParser()
+
+    def test_parses_a_fix(self):
+        fix = self.parser.parse(b'GPS;12,34,56.78,45.6673,-111.0447,1500.5,9\n')
+        gpsTime, seconds, lat, lon, alt, sats = fix
+        self.assertEqual(gpsTime, '12:34:56')
+        self.assertAlmostEqual(seconds, 12 * 3600 + 34 * 60 + 56.78)
+        self.assertEqual((lat, lon, sats), (45.6673, -111.0447, 9))
+        self.assertAlmostEqual(alt, 1500.5 * FEET_PER_METER)
+        self.assertEqual(self.parser.getStats(), (1, 0))
+
+    def test_frame_variations(self):
+        for frame in (b'GPS:1,2,3,45.1,-111.2,1500,9', b'GPS;01,02,03.,+45.1,-111.2,1500.25,12.0\r\n',
+                      b'GPS;23,59,60.9,-90,180,-10,0!\n'):
+            self.assertIsNotNone(self.parser.parse(frame), frame)
+
+    def test_parses_from_an_offset(self):
+        line = b'10:00:01 || GPS;10,00,01,45.6,-111.0,2000,8\n'
+        fix = self.parser.parse(line, line.find(b'GPS'))
+        self.assertEqual(fix[0], '10:00:01')
+
+    def test_other_frames_are_ignored(self):
+        self.assertIsNone(self.parser.parse(b'IMU;1,2,3\n'))
+        self.assertIsNone(self.parser.parse(b''))
+        self.assertEqual(self.parser.getStats(), (0, 0))
+
+    def test_bad_gps_frames_are_errors(self):
+        for frame in (b'GPS;12,34,56,45.6,-111.0\n',			# cut short
+                      b'GPS;12,34,56,45.6,-111.0,1500,9,extra\n',
+                      b'GPS;12,34,56,4a.6,-111.0,1500,9\n',
+                      b'GPS;24,00,00,45.6,-111.0,1500,9\n',			# out of range
+                      b'GPS;12,60,00,45.6,-111.0,1500,9\n',
+                      b'GPS;12,34,56,95.0,-111.0,1500,9\n',
+                      b'GPS;12,34,56,45.6,-181.0,1500,9\n',
+                      b'GPS;12,34,56,45.6,-111.0,1500,9\nGPS;12'):		# two frames run together
+            self.assertIsNone(self.parser.parse(frame), frame)
+        self.assertEqual(self.parser.getStats(), (0, 8))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from ServoCalibration import *
+
+
+class AngleMapTest(unittest.TestCase):
+
+    def test_linear_fit(self):
+        angleMap = AngleMap([[0, 4000], [90, 6000]])
+        self.assertEqual(angleMap(0), 4000)
+        self.assertEqual(angleMap(45), 5000)
+        self.assertEqual(angleMap(90), 6000)
+        self.assertEqual(angleMap(22.5), 4500)
+
+    def test_points_are_sorted_and_repeats_averaged(self):
+        angleMap = AngleMap([[90, 6000], [0, 4100], [0, 3900]])
+        self.assertEqual(angleMap.points, [[0.0, 4000.0], [90.0, 6000.0]])
+
+    def test_needs_two_angles(self):
+        with self.assertRaises(ValueError):
+            AngleMap([[0, 4000], [0, 4100]])
+
+    def test_angles_past_the_range_get_the_ends(self):
+        angleMap = AngleMap([[-90, 4000], [90, 6000]])
+        self.assertEqual(angleMap(-120), 4000)
+        self.assertEqual(angleMap(400), 6000)
+
+    def test_targets_are_clamped_to_the_servo_limits(self):
+        angleMap = AngleMap([[0, 4000], [90, 6000]], minPwm=4500, maxPwm=5500)
+        self.assertEqual(angleMap(0), 4500)
+        self.assertEqual(angleMap(45), 5000)
+        self.assertEqual(angleMap(90), 5500)
+
+    def test_range_wider_than_the_points_extends_the_end_lines(self):
+        angleMap = AngleMap([[0, 5000], [90, 6000]], angleRange=[-45, 135])
+        self.assertEqual(angleMap(-45), 4500)
+        self.assertEqual(angleMap(135), 6500)
+
+    def test_spline_passes_through_the_points(self):
+        points = [[-90, 4400], [-30, 5000], [20, 5300], [90, 6200]]
+        angleMap = AngleMap(points, method='spline')
+        for angle, pwm in points:
+            self.assertEqual(angleMap(angle), pwm)
+        # Smooth between the points, unlike the straight lines
+        linear = AngleMap(points)
+        self.assertNotEqual(angleMap(-60), linear(-60))
+
+    def test_spline_of_a_straight_line_is_the_line(self):
+        points = [[0, 4000], [30, 4600], [60, 5200], [90, 5800]]
+        spline = AngleMap(points, method='spline')
+        linear = AngleMap(points)
+        for angle in range(0, 91, 5):
+            self.assertEqual(spline(angle), linear(angle))
+
+    def test_dict_round_trip(self):
+        angleMap = AngleMap([[0, 4000], [45, 5100], [90, 6000]], method='spline', minPwm=3900, maxPwm=6100)
+        copy = AngleMap.fromDict(angleMap.toDict())
+        self.assertEqual(copy.table, angleMap.table)
+
+
+class StationCalibrationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'servoCalibration.json')
+
+    def test_defaults_match_the_original_mappings(self):
+        calibration = StationCalibration.load(self.path, 'VLAD')
+        self.assertEqual(calibration.tilt(30), round(stationLine(4.856, 626, 30)))
+        self.assertEqual(calibration.pan(90), round(stationLine(3.244, 916, 90)))
+
+    def test_save_and_load(self):
+        calibration = StationCalibration(AngleMap([[-180, 4000], [180, 7600]]), AngleMap([[-90, 4400], [90, 6200]]))
+        calibration.save(self.path, 'TEST')
+        loaded = StationCalibration.load(self.path, 'TEST')
+        self.assertEqual(loaded.pan(0), 5800)
+        self.assertEqual(loaded.tilt(0), 5300)
+        # Other stations still come from the defaults
+        self.assertEqual(StationCalibration.load(self.path, 'CHAD').tilt(0),
+                         StationCalibration.load(os.path.join(self.directory, 'missing.json'), 'CHAD').tilt(0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import time
+import unittest
+
+from ServoController import ServoScheduler
+
+
+class FakeController(object):
+    """ Records the moves a ServoScheduler sends, instead of writing to a Maestro """
+
+    def __init__(self):
+        self.moves = []
+
+    def moveAll(self, pan, tilt):
+        self.moves.append((pan, tilt))
+
+
+def waitFor(condition, timeout=2):
+    end = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > end:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+class ServoSchedulerTest(unittest.TestCase):
+
+    def makeScheduler(self, **kwargs):
+        self.controller = FakeController()
+        scheduler = ServoScheduler(self.controller, **kwargs)
+        self.addCleanup(scheduler.stop)
+        return scheduler
+
+    def test_sends_a_target(self):
+        scheduler = self.makeScheduler()
+        scheduler.submit(6000.7, 5000.2)
+        self.assertTrue(waitFor(lambda: self.controller.moves))
+        self.assertEqual(self.controller.moves, [(6000, 5000)])
+        self.assertEqual(scheduler.getStats(), (1, 0, 0))
+
+    def test_drops_targets_within_the_deadband(self):
+        scheduler = self.makeScheduler(maxRate=100, deadband=10)
+        scheduler.submit(6000, 5000)
+        self.assertTrue(waitFor(lambda: scheduler.getStats()[0] == 1))
+        scheduler.submit(6009, 4991)
+        self.assertEqual(scheduler.getStats(), (1, 1, 0))
+
+        # Far enough on either axis is a move
+        scheduler.submit(6000, 5010)
+        self.assertTrue(waitFor(lambda: scheduler.getStats()[0] == 2))
+        self.assertEqual(self.controller.moves, [(6000, 5000), (6000, 5010)])
+
+    def test_only_the_latest_target_goes_between_sends(self):
+        scheduler = self.makeScheduler(maxRate=2)
+        scheduler.submit(6000, 5000)
+        self.assertTrue(waitFor(lambda: scheduler.getStats()[0] == 1))
+        for pan in (6100, 6200, 6300):
+            scheduler.submit(pan, 5000)
+        self.assertEqual(scheduler.getStats()[2], 2)
+        self.assertTrue(waitFor(lambda: scheduler.getStats()[0] == 2))
+        self.assertEqual(self.controller.moves, [(6000, 5000), (6300, 5000)])
+
+    def test_rate_limits_the_sends(self):
+        scheduler = self.makeScheduler(maxRate=5)
+        start = time.monotonic()
+        scheduler.submit(6000, 5000)
+        self.assertTrue(waitFor(lambda: scheduler.getStats()[0] == 1))
+        scheduler.submit(6500, 5000)
+        self.assertTrue(waitFor(lambda: scheduler.getStats()[0] == 2))
+        self.assertGreaterEqual(time.monotonic() - start, 0.19)
+
+    def test_a_target_back_inside_the_deadband_cancels_the_pending_one(self):
+        scheduler = self.makeScheduler(maxRate=2, deadband=10)
+        scheduler.submit(6000, 5000)
+        self.assertTrue(waitFor(lambda: scheduler.getStats()[0] == 1))
+        scheduler.submit(6500, 5000)
+        scheduler.submit(6002, 5000)
+        time.sleep(0.6)
+        self.assertEqual(self.controller.moves, [(6000, 5000)])
+        self.assertEqual(scheduler.getStats(), (1, 1, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import math
+import unittest
+
+from BalloonUpdate import BalloonUpdate
+from TrajectoryEstimator import *
+
+GROUND = (45.6, -111.0, 4900)
+METERS_PER_DEGREE = math.radians(1) * R_EARTH
+
+
+def fix(seconds, lat, lon, alt, method='RFD'):
+    return BalloonUpdate('', seconds, lat, lon, alt, method, *GROUND)
+
+
+def climbingFixes(start=36000, count=30, step=10, north=5.0, climb=5.0):
+    """ Fixes from a balloon drifting north and climbing at steady rates in meters per second, on the seconds-of-day clock """
+
+    return [fix((start + i * step) % 86400, 45.6 + north * i * step / METERS_PER_DEGREE, -111.0,
+                (1500 + climb * i * step) * FEET_PER_METER) for i in range(count)]
+
+
+class TrajectoryEstimatorTest(unittest.TestCase):
+
+    def test_needs_two_fixes_for_a_velocity(self):
+        estimator = TrajectoryEstimator()
+        self.assertFalse(estimator.isReady())
+        updates = climbingFixes(count=2)
+        estimator.update(updates[0])
+        self.assertFalse(estimator.isReady())
+        estimator.update(updates[1])
+        self.assertTrue(estimator.isReady())
+
+    def test_tracks_a_steady_climb(self):
+        estimator = TrajectoryEstimator()
+        updates = climbingFixes()
+        for update in updates:
+            self.assertTrue(estimator.update(update))
+        last = updates[-1]
+        lat, lon, alt, latSpeed, lonSpeed, altSpeed = estimator.predict(last.getSeconds() + 30)
+        self.assertAlmostEqual(latSpeed * METERS_PER_DEGREE, 5.0, delta=0.2)
+        self.assertAlmostEqual(lonSpeed, 0.0, delta=1e-6)
+        self.assertAlmostEqual(altSpeed / FEET_PER_METER, 5.0, delta=0.2)
+        self.assertAlmostEqual((lat - last.getLat()) * METERS_PER_DEGREE, 150, delta=10)
+        self.assertAlmostEqual((alt - last.getAlt()) / FEET_PER_METER, 150, delta=10)
+
+    def test_old_fixes_are_rejected(self):
+        estimator = TrajectoryEstimator()
+        updates = climbingFixes(count=3)
+        estimator.update(updates[0])
+        estimator.update(updates[2])
+        self.assertFalse(estimator.update(updates[1]))
+        self.assertEqual(estimator.fixCount, 2)
+
+    def test_fixes_across_midnight(self):
+        estimator = TrajectoryEstimator()
+        for update in climbingFixes(start=86400 - 100, count=20):
+            self.assertTrue(estimator.update(update))
+        self.assertEqual(estimator.fixCount, 20)
+        self.assertAlmostEqual(estimator.predict(95)[5] / FEET_PER_METER, 5.0, delta=0.5)
+
+    def test_restarts_after_a_long_gap(self):
+        estimator = TrajectoryEstimator(maxGap=600)
+        updates = climbingFixes(count=3)
+        estimator.update(updates[0])
+        estimator.update(updates[1])
+        estimator.update(fix(updates[1].getSeconds() + 1200, 46.0, -110.0, 20000))
+        self.assertEqual(estimator.fixCount, 1)
+        self.assertFalse(estimator.isReady())
+        self.assertAlmostEqual(estimator.predict(updates[1].getSeconds() + 1200)[0], 46.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
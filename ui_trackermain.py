@@ -502,6 +502,9 @@ class Ui_MainWindow(object):
         self.iridiumIMEI = QtWidgets.QLineEdit(self.connectionControlsFrame)
         self.iridiumIMEI.setObjectName("iridiumIMEI")
         self.gridLayout_13.addWidget(self.iridiumIMEI, 10, 1, 1, 2)
+        self.iridiumBackfill = QtWidgets.QCheckBox(self.connectionControlsFrame)
+        self.iridiumBackfill.setObjectName("iridiumBackfill")
+        self.gridLayout_13.addWidget(self.iridiumBackfill, 10, 3, 1, 2)
         self.verticalLayout_3.addWidget(self.connectionControlsFrame)
         self.gridLayout_4.addWidget(self.connectionFrame, 1, 0, 1, 1)
         self.frame = QtWidgets.QFrame(self.Settings)
@@ -968,6 +971,25 @@ class Ui_MainWindow(object):
         self.imageDataTxtButton.setFlat(False)
         self.imageDataTxtButton.setObjectName("imageDataTxtButton")
         self.gridLayout_19.addWidget(self.imageDataTxtButton, 2, 0, 1, 2)
+        self.cancelImageButton = QtWidgets.QPushButton(self.stillImageStartPictureFrame)
+        sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Minimum, QtWidgets.QSizePolicy.Expanding)
+        sizePolicy.setHorizontalStretch(0)
+        sizePolicy.setVerticalStretch(0)
+        sizePolicy.setHeightForWidth(self.cancelImageButton.sizePolicy().hasHeightForWidth())
+        self.cancelImageButton.setSizePolicy(sizePolicy)
+        self.cancelImageButton.setFlat(False)
+        self.cancelImageButton.setObjectName("cancelImageButton")
+        self.gridLayout_19.addWidget(self.cancelImageButton, 3, 0, 1, 2)
+        self.transferModeBox = QtWidgets.QComboBox(self.stillImageStartPictureFrame)
+        self.transferModeBox.setObjectName("transferModeBox")
+        self.transferModeBox.addItem("")
+        self.transferModeBox.addItem("")
+        self.transferModeBox.addItem("")
+        self.gridLayout_19.addWidget(self.transferModeBox, 4, 0, 1, 1)
+        self.binaryTransferCheckbox = QtWidgets.QCheckBox(self.stillImageStartPictureFrame)
+        self.binaryTransferCheckbox.setChecked(True)
+        self.binaryTransferCheckbox.setObjectName("binaryTransferCheckbox")
+        self.gridLayout_19.addWidget(self.binaryTransferCheckbox, 4, 1, 1, 1)
         self.stillImageOnlineLabel = QtWidgets.QLabel(self.stillImageStartPictureFrame)
         palette = QtGui.QPalette()
         brush = QtGui.QBrush(QtGui.QColor(243, 0, 0))
@@ -1623,6 +1645,7 @@ class Ui_MainWindow(object):
         self.IMEILabel.setText(QtWidgets.QApplication.translate("MainWindow", "Iridium IMEI", None, -1))
         self.aprsCallsign.setPlaceholderText(QtWidgets.QApplication.translate("MainWindow", "KD0AWK-8", None, -1))
         self.iridiumIMEI.setPlaceholderText(QtWidgets.QApplication.translate("MainWindow", "300234064909640", None, -1))
+        self.iridiumBackfill.setText(QtWidgets.QApplication.translate("MainWindow", "Load Whole Track", None, -1))
         self.graphingLoggingLabel.setText(QtWidgets.QApplication.translate("MainWindow", "Graphing and Logging:", None, -1))
         self.saveDataCheckbox.setText(QtWidgets.QApplication.translate("MainWindow", "Save Data", None, -1))
         self.graphReal.setText(QtWidgets.QApplication.translate("MainWindow", "Graph Runtime", None, -1))
@@ -1663,6 +1686,11 @@ class Ui_MainWindow(object):
         self.mostRecentImageButton.setText(QtWidgets.QApplication.translate("MainWindow", "Most Recent Image", None, -1))
         self.requestedImageName.setPlaceholderText(QtWidgets.QApplication.translate("MainWindow", "image_XXXX_b.jpg", None, -1))
         self.imageDataTxtButton.setText(QtWidgets.QApplication.translate("MainWindow", "Select Image", None, -1))
+        self.cancelImageButton.setText(QtWidgets.QApplication.translate("MainWindow", "Cancel Download", None, -1))
+        self.transferModeBox.setItemText(0, QtWidgets.QApplication.translate("MainWindow", "Stop and Wait", None, -1))
+        self.transferModeBox.setItemText(1, QtWidgets.QApplication.translate("MainWindow", "Selective Repeat", None, -1))
+        self.transferModeBox.setItemText(2, QtWidgets.QApplication.translate("MainWindow", "Adaptive", None, -1))
+        self.binaryTransferCheckbox.setText(QtWidgets.QApplication.translate("MainWindow", "Binary", None, -1))
         self.stillImageOnlineLabel.setText(QtWidgets.QApplication.translate("MainWindow", "OFF", None, -1))
         self.picWidthLabel.setText(QtWidgets.QApplication.translate("MainWindow", "Width", None, -1))
         self.picCurrentWidthValue.setText(QtWidgets.QApplication.translate("MainWindow", "650", None, -1))